@@ -23,6 +23,9 @@ from models.architecture_enforcer import ArchitectureEnforcer
 from routes.cto_api import cto_bp
 from routes.model_api import model_bp
 from routes.fullstack_api import fullstack_bp
+from routes.jobs_api import jobs_bp
+from models.model_manager import model_manager
+from models.job_queue import job_queue
 
 # Configure logging
 logging.basicConfig(
@@ -42,6 +45,15 @@ def create_app():
     app.register_blueprint(cto_bp, url_prefix='/api/cto')
     app.register_blueprint(model_bp, url_prefix='/api/models')
     app.register_blueprint(fullstack_bp, url_prefix='/api/fullstack')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    
+    # Probe model health in the background so /api/models/health answers instantly; every
+    # probe is a billed completion, so enable this in one process of a deployment only
+    if os.getenv('MODEL_HEALTH_PROBE_ENABLED', 'false').lower() in ('1', 'true', 'yes') and model_manager.models:
+        model_manager.health_prober.start()
+    
+    # Generation workers for queued jobs; set JOB_WORKERS=0 to run them only in src/worker.py
+    job_queue.start()
     
     # Health check endpoint
     @app.route('/health')
@@ -0,0 +1,149 @@
+"""
+Admission Control - Queue-depth based load shedding for generation requests
+Rejects work early with a retry time once the projected wait exceeds a limit
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from typing import Dict, Any, Callable, Optional, Tuple
+
+from .job_queue import job_queue, QUEUED, RUNNING
+from .scheduler import generation_scheduler
+
+logger = logging.getLogger(__name__)
+
+class AdmissionTicket:
+    """An admitted request, returned to release() when it finishes"""
+    
+    def __init__(self, weight: int, held: bool):
+        self.weight = weight
+        self.held = held
+        self.admitted_at = time.monotonic()
+
+class AdmissionController:
+    """
+    Decides whether a new generation request can start
+    
+    Outstanding work is the weight of admitted requests still running in
+    this process plus the queued and running generation jobs (queued_work).
+    With `capacity` generations served at once and an average service time
+    (an EWMA of finished requests' durations per unit of weight), a new
+    request expects to wait
+    
+        max(0, outstanding + weight - capacity) / capacity * service_time
+    
+    seconds. Requests whose projected wait exceeds max_wait are rejected
+    straight away, with a retry time of how long the surplus takes to drain,
+    instead of queueing until every request times out together. An idle
+    server admits any request, so large batches are never refused outright.
+    """
+    
+    def __init__(self, enabled: bool = True, capacity: int = 16, max_wait: float = 120.0,
+                 default_service_time: float = 45.0, alpha: float = 0.2,
+                 queued_work: Optional[Callable[[], int]] = None):
+        """Initialize the controller"""
+        self.enabled = enabled
+        self.capacity = max(1, capacity)
+        self.max_wait = max_wait
+        self.service_time = default_service_time
+        self.alpha = alpha
+        self.queued_work = queued_work
+        
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._stats = {'admitted': 0, 'rejected': 0, 'completed': 0}
+        self._last_projected_wait = 0.0
+    
+    def _outstanding(self) -> int:
+        queued = 0
+        if self.queued_work is not None:
+            try:
+                queued = self.queued_work()
+            except Exception as e:
+                logger.error(f"Could not read queued work: {str(e)}")
+        return self._in_flight + queued
+    
+    def projected_wait(self, weight: int = 1) -> float:
+        """Seconds a request of the given weight would wait before being served"""
+        outstanding = self._outstanding()
+        if not outstanding:
+            return 0.0
+        surplus = max(0, outstanding + weight - self.capacity)
+        return surplus / self.capacity * self.service_time
+    
+    def admit(self, weight: int = 1, hold: bool = True) -> Tuple[Optional[AdmissionTicket], int, float]:
+        """
+        Admit or reject a request
+        
+        hold=False admits work that only enqueues (job submissions), which is
+        counted through queued_work rather than as in-flight here. Returns
+        (ticket or None if rejected, Retry-After seconds, projected wait).
+        """
+        if not self.enabled:
+            return AdmissionTicket(weight, False), 0, 0.0
+        
+        with self._lock:
+            projected = self.projected_wait(weight)
+            self._last_projected_wait = projected
+            if projected > self.max_wait:
+                self._stats['rejected'] += 1
+                return None, max(1, math.ceil(projected - self.max_wait)), projected
+            
+            self._stats['admitted'] += 1
+            if hold:
+                self._in_flight += weight
+        return AdmissionTicket(weight, hold), 0, projected
+    
+    def release(self, ticket: AdmissionTicket, success: bool = True):
+        """Mark an admitted request as finished and fold its duration into the service time"""
+        if not ticket.held:
+            return
+        
+        duration = time.monotonic() - ticket.admitted_at
+        with self._lock:
+            self._in_flight -= ticket.weight
+            self._stats['completed'] += 1
+            # Failed requests end early and would make the service look faster than it is
+            if success:
+                self.service_time = (1 - self.alpha) * self.service_time + self.alpha * duration / ticket.weight
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get counters, outstanding work and the current projection"""
+        with self._lock:
+            stats = dict(self._stats)
+            in_flight = self._in_flight
+        stats.update({
+            'enabled': self.enabled,
+            'in_flight': in_flight,
+            'outstanding_work': self._outstanding(),
+            'capacity': self.capacity,
+            'max_wait_seconds': self.max_wait,
+            'service_time_ewma_seconds': round(self.service_time, 2),
+            'projected_wait_seconds': round(self.projected_wait(), 2),
+            'last_projected_wait_seconds': round(self._last_projected_wait, 2)
+        })
+        return stats
+
+def create_admission_controller(queued_work: Optional[Callable[[], int]] = None,
+                                default_capacity: int = 16) -> AdmissionController:
+    """Create the admission controller from environment variables"""
+    return AdmissionController(
+        enabled=os.getenv('ADMISSION_CONTROL_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+        capacity=int(os.getenv('ADMISSION_CAPACITY', str(default_capacity))),
+        max_wait=float(os.getenv('ADMISSION_MAX_WAIT', '120')),
+        default_service_time=float(os.getenv('ADMISSION_DEFAULT_SERVICE_SECONDS', '45')),
+        queued_work=queued_work
+    )
+
+def _queued_jobs() -> int:
+    counts = job_queue.store.counts()
+    return counts.get(QUEUED, 0) + counts.get(RUNNING, 0)
+
+# Global admission controller shared by the generation blueprints of this process
+admission_controller = create_admission_controller(
+    queued_work=_queued_jobs,
+    default_capacity=generation_scheduler.slots
+)
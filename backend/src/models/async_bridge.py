@@ -0,0 +1,73 @@
+"""
+Async Bridge - Run asyncio code from synchronous Flask handlers
+Hosts one background event loop per process that all async model calls share
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+class AsyncBridge:
+    """
+    Background asyncio event loop running in a daemon thread
+    
+    Synchronous code submits coroutines with submit() or run(). Thousands of
+    coroutines can wait on network I/O inside this one loop, so concurrent
+    generations no longer need one OS thread each.
+    """
+    
+    def __init__(self):
+        """Initialize the bridge; the loop thread starts on first use"""
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Get the bridge event loop, starting it if needed"""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(
+                        target=self._run_loop, args=(loop,), name="async-bridge", daemon=True
+                    )
+                    self._thread.start()
+                    self._loop = loop
+                    logger.info("Async bridge event loop started")
+        return self._loop
+    
+    def _run_loop(self, loop: asyncio.AbstractEventLoop):
+        """Run the event loop forever in the bridge thread"""
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+    
+    def in_bridge_loop(self) -> bool:
+        """Check whether the caller is running inside the bridge loop"""
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+    
+    def submit(self, coro: Awaitable[Any]) -> Future:
+        """Schedule a coroutine on the bridge loop and return a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the bridge loop and block until it finishes"""
+        if self.in_bridge_loop():
+            raise RuntimeError("AsyncBridge.run() cannot be called from the bridge loop; await the coroutine instead")
+        
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+# Global async bridge instance
+async_bridge = AsyncBridge()
@@ -0,0 +1,251 @@
+"""
+Cassette - Record and replay provider calls
+Captures responses with their timing so generator benchmarks can be rerun offline and deterministically
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Iterator, AsyncIterator
+
+from .response_cache import ResponseCache
+from .storage import get_data_path
+
+logger = logging.getLogger(__name__)
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when a request was never recorded"""
+
+class Cassette:
+    """
+    Record/replay layer between ModelManager and the provider SDKs
+    
+    In record mode every successful provider call is appended to a JSON lines
+    file as (request hash, response, latency, first-token latency, token
+    counts). In replay mode those entries are served instead of calling the
+    provider, after the recorded latency multiplied by time_scale (1 keeps
+    the original timing, 0 answers instantly). Identical requests recorded
+    several times are replayed in recorded order, so repeated prompts get
+    the same sequence of responses on every run.
+    """
+    
+    CHUNK_CHARS = 16
+    
+    def __init__(self, mode: str = OFF, path: Optional[str] = None, time_scale: float = 1.0):
+        """Initialize the cassette and load recorded entries in replay mode"""
+        if mode not in (OFF, RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        
+        self.mode = mode
+        self.path = path
+        self.time_scale = time_scale
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        self.replayed = 0
+        self.recorded = 0
+        self.misses = 0
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        
+        if mode == REPLAY:
+            self._load()
+        if mode != OFF:
+            logger.info(f"LLM cassette in {mode} mode ({path}, time scale {time_scale})")
+    
+    @property
+    def enabled(self) -> bool:
+        return self.mode != OFF
+    
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+    
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries.setdefault(entry['key'], []).append(entry)
+            for entries in self.entries.values():
+                entries.sort(key=lambda entry: entry.get('sequence', 0))
+        except FileNotFoundError:
+            logger.warning(f"Cassette not found: {self.path}")
+        except Exception as e:
+            logger.error(f"Could not load cassette {self.path}: {str(e)}")
+    
+    @staticmethod
+    def make_key(model_id: str, prompt: str, params: Dict[str, Any]) -> str:
+        """Hash a provider request the same way the response cache does"""
+        extra_params = {k: v for k, v in params.items() if k not in ("temperature", "max_tokens")}
+        return ResponseCache.make_key(model_id, prompt, params.get("temperature"), params.get("max_tokens"), extra_params)
+    
+    def _next_entry(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                self.misses += 1
+                raise CassetteMissError(f"No recorded response for request {key[:12]} in {self.path}")
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            self.replayed += 1
+            return entries[position % len(entries)]
+    
+    def _next_sequence(self, key: str) -> int:
+        """Number the calls to a request in the order they start, not the order they finish"""
+        with self._lock:
+            sequence = self._positions.get(key, 0)
+            self._positions[key] = sequence + 1
+            return sequence
+    
+    def _record(self, key: str, sequence: int, model_id: str, prompt: str, response: str, latency: float,
+                first_token_latency: Optional[float] = None):
+        entry = {
+            'key': key,
+            'sequence': sequence,
+            'model': model_id,
+            'response': response,
+            'latency': round(latency, 4),
+            'first_token_latency': round(first_token_latency, 4) if first_token_latency is not None else None,
+            # Approximate (4 characters per token); enough to compare runs against each other
+            'prompt_tokens': len(prompt) // 4,
+            'completion_tokens': len(response) // 4,
+            'recorded_at': datetime.utcnow().isoformat()
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                self.recorded += 1
+        except Exception as e:
+            logger.error(f"Could not write to cassette {self.path}: {str(e)}")
+    
+    def _timeline(self, entry: Dict[str, Any]):
+        """Split a recorded response into (delay before chunk, chunk) pairs, scaled by time_scale"""
+        text = entry['response'] or ''
+        chunks = [text[i:i + self.CHUNK_CHARS] for i in range(0, len(text), self.CHUNK_CHARS)] or ['']
+        latency = entry['latency'] * self.time_scale
+        first = entry.get('first_token_latency')
+        first = latency if first is None else first * self.time_scale
+        step = (latency - first) / (len(chunks) - 1) if len(chunks) > 1 else 0.0
+        return [(first if index == 0 else step, chunk) for index, chunk in enumerate(chunks)]
+    
+    def call(self, key: str, model_id: str, prompt: str, send: Callable[[], str]) -> str:
+        """Run a blocking provider call through the cassette"""
+        if self.mode == OFF:
+            return send()
+        if self.mode == REPLAY:
+            entry = self._next_entry(key)
+            time.sleep(entry['latency'] * self.time_scale)
+            return entry['response']
+        
+        sequence = self._next_sequence(key)
+        started = time.monotonic()
+        response = send()
+        self._record(key, sequence, model_id, prompt, response, time.monotonic() - started)
+        return response
+    
+    async def acall(self, key: str, model_id: str, prompt: str, send: Callable[[], Any]) -> str:
+        """Run an async provider call through the cassette; send returns the awaitable"""
+        if self.mode == OFF:
+            return await send()
+        if self.mode == REPLAY:
+            entry = self._next_entry(key)
+            await asyncio.sleep(entry['latency'] * self.time_scale)
+            return entry['response']
+        
+        sequence = self._next_sequence(key)
+        started = time.monotonic()
+        response = await send()
+        self._record(key, sequence, model_id, prompt, response, time.monotonic() - started)
+        return response
+    
+    def stream(self, key: str, model_id: str, prompt: str, send: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """Run a streaming provider call through the cassette"""
+        if self.mode == OFF:
+            yield from send()
+            return
+        if self.mode == REPLAY:
+            for delay, chunk in self._timeline(self._next_entry(key)):
+                time.sleep(delay)
+                yield chunk
+            return
+        
+        sequence = self._next_sequence(key)
+        started = time.monotonic()
+        first_token_latency = None
+        chunks = []
+        source = send()
+        try:
+            for chunk in source:
+                if first_token_latency is None:
+                    first_token_latency = time.monotonic() - started
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            source.close()
+        # Only streams read to the end are recorded
+        self._record(key, sequence, model_id, prompt, ''.join(chunks), time.monotonic() - started, first_token_latency)
+    
+    async def astream(self, key: str, model_id: str, prompt: str,
+                      send: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Async variant of stream()"""
+        if self.mode == REPLAY:
+            for delay, chunk in self._timeline(self._next_entry(key)):
+                await asyncio.sleep(delay)
+                yield chunk
+            return
+        
+        sequence = self._next_sequence(key) if self.mode == RECORD else 0
+        started = time.monotonic()
+        first_token_latency = None
+        chunks = []
+        source = send()
+        try:
+            async for chunk in source:
+                if first_token_latency is None:
+                    first_token_latency = time.monotonic() - started
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            # Close the provider stream now rather than when the generator is collected
+            await source.aclose()
+        
+        if self.mode == RECORD:
+            self._record(key, sequence, model_id, prompt, ''.join(chunks), time.monotonic() - started, first_token_latency)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the mode and counters"""
+        return {
+            'mode': self.mode,
+            'path': self.path,
+            'time_scale': self.time_scale,
+            'recorded_requests': sum(len(entries) for entries in self.entries.values()) if self.replaying else self.recorded,
+            'replayed': self.replayed,
+            'misses': self.misses
+        }
+
+def create_cassette() -> Cassette:
+    """Create the cassette from LLM_CASSETTE_MODE / LLM_CASSETTE_PATH / LLM_CASSETTE_TIME_SCALE"""
+    mode = os.getenv('LLM_CASSETTE_MODE', OFF).lower()
+    if mode not in (OFF, RECORD, REPLAY):
+        logger.error(f"Unknown LLM_CASSETTE_MODE '{mode}', cassette disabled")
+        mode = OFF
+    
+    path = os.getenv('LLM_CASSETTE_PATH')
+    if path is None and mode != OFF:
+        path = get_data_path('llm_cassette.jsonl')
+    
+    return Cassette(
+        mode=mode,
+        path=path,
+        time_scale=float(os.getenv('LLM_CASSETTE_TIME_SCALE', '1.0'))
+    )
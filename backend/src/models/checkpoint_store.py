@@ -0,0 +1,166 @@
+"""
+Checkpoint Store - Persistent stage outputs of full-stack generation runs
+Completed stages are saved as they finish, so a failed run can be resumed without repeating them
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from .storage import get_data_path
+
+logger = logging.getLogger(__name__)
+
+RUN_RUNNING = "running"
+RUN_SUCCEEDED = "succeeded"
+RUN_FAILED = "failed"
+
+class CheckpointStore:
+    """
+    SQLite-backed storage of generation runs and their completed stages
+    
+    A run records the inputs of a generation and their hash; every stage
+    output is saved under the run id together with that hash, and only
+    outputs whose hash still matches the run's inputs are loaded again.
+    Finished runs older than the retention period are purged.
+    """
+    
+    def __init__(self, path: str, enabled: bool = True, retention_seconds: float = 7 * 86400):
+        """Open (or create) the checkpoint database"""
+        self.path = path
+        self.enabled = enabled
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._stats = {'runs_created': 0, 'stages_saved': 0, 'stages_restored': 0, 'resumed': 0}
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "id TEXT PRIMARY KEY, input_hash TEXT NOT NULL, inputs TEXT NOT NULL, status TEXT NOT NULL, "
+            "error TEXT, failed_stages TEXT, attempts INTEGER NOT NULL DEFAULT 1, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stage_checkpoints ("
+            "run_id TEXT NOT NULL, stage TEXT NOT NULL, input_hash TEXT NOT NULL, output TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (run_id, stage))"
+        )
+    
+    def _query(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            cursor.row_factory = sqlite3.Row
+            return cursor.fetchall()
+    
+    def create_run(self, input_hash: str, inputs: Dict[str, Any]) -> str:
+        """Store a new running generation and return its run id"""
+        if time.time() - self._last_purge > 3600:
+            self._last_purge = time.time()
+            try:
+                purged = self.purge(time.time() - self.retention_seconds)
+                if purged:
+                    logger.info(f"Purged {purged} old generation runs")
+            except Exception as e:
+                logger.error(f"Error purging generation runs: {str(e)}")
+        
+        run_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO runs (id, input_hash, inputs, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, input_hash, json.dumps(inputs, ensure_ascii=False, default=str), RUN_RUNNING, now, now)
+            )
+            self._stats['runs_created'] += 1
+        return run_id
+    
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Get a run with the names of its completed stages"""
+        rows = self._query("SELECT * FROM runs WHERE id = ?", (run_id,))
+        if not rows:
+            return None
+        
+        run = dict(rows[0])
+        run['inputs'] = json.loads(run['inputs'])
+        run['failed_stages'] = json.loads(run['failed_stages']) if run['failed_stages'] else {}
+        run['completed_stages'] = [row['stage'] for row in self._query(
+            "SELECT stage FROM stage_checkpoints WHERE run_id = ? AND input_hash = ? ORDER BY created_at",
+            (run_id, run['input_hash'])
+        )]
+        return run
+    
+    def start_attempt(self, run_id: str):
+        """Mark a run as running again for a resume"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE runs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (RUN_RUNNING, time.time(), run_id)
+            )
+            self._stats['resumed'] += 1
+    
+    def save_stage(self, run_id: str, input_hash: str, stage: str, output: Any):
+        """Save the output of a completed stage"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stage_checkpoints (run_id, stage, input_hash, output, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (run_id, stage, input_hash, json.dumps(output, ensure_ascii=False, default=str), time.time())
+            )
+            self._stats['stages_saved'] += 1
+    
+    def load_stages(self, run_id: str, input_hash: str) -> Dict[str, Any]:
+        """Get the saved stage outputs of a run that were produced from the given inputs"""
+        rows = self._query(
+            "SELECT stage, output FROM stage_checkpoints WHERE run_id = ? AND input_hash = ?",
+            (run_id, input_hash)
+        )
+        with self._lock:
+            self._stats['stages_restored'] += len(rows)
+        return {row['stage']: json.loads(row['output']) for row in rows}
+    
+    def finish_run(self, run_id: str, status: str, error: Optional[str] = None,
+                   failed_stages: Optional[Dict[str, str]] = None):
+        """Record how an attempt of a run ended"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE runs SET status = ?, error = ?, failed_stages = ?, updated_at = ? WHERE id = ?",
+                (status, error, json.dumps(failed_stages or {}, ensure_ascii=False), time.time(), run_id)
+            )
+    
+    def purge(self, older_than: float) -> int:
+        """Delete runs (and their checkpoints) last updated before a timestamp"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM stage_checkpoints WHERE run_id IN (SELECT id FROM runs WHERE updated_at < ?)",
+                (older_than,)
+            )
+            cursor = self._conn.execute("DELETE FROM runs WHERE updated_at < ?", (older_than,))
+            return cursor.rowcount
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get checkpoint counters and run counts per status"""
+        rows = self._query("SELECT status, COUNT(*) AS runs FROM runs GROUP BY status")
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'enabled': self.enabled,
+            'runs_by_status': {row['status']: row['runs'] for row in rows},
+            'path': self.path
+        })
+        return stats
+
+def create_checkpoint_store() -> CheckpointStore:
+    """Create the checkpoint store from environment variables"""
+    return CheckpointStore(
+        os.getenv('CHECKPOINT_PATH') or get_data_path('checkpoints.sqlite'),
+        enabled=os.getenv('CHECKPOINTS_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+        retention_seconds=float(os.getenv('CHECKPOINT_RETENTION_DAYS', '7')) * 86400
+    )
+
+# Global checkpoint store for full-stack generation runs
+checkpoint_store = create_checkpoint_store()
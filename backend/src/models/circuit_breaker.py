@@ -0,0 +1,220 @@
+"""
+Circuit Breaker - Fail fast when a model's provider is unhealthy
+Per-model closed/open/half-open breakers driven by rolling error-rate and latency windows
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a model's breaker is open and no fallback model is available"""
+
+def parse_model_fallbacks(spec: str) -> Dict[str, str]:
+    """
+    Parse fallback models from MODEL_FALLBACKS
+    
+    Format: "gpt-4:gpt-4o-mini,claude-3-sonnet:gpt-4"
+    """
+    fallbacks: Dict[str, str] = {}
+    for entry in (spec or '').split(','):
+        if ':' not in entry:
+            continue
+        model, fallback = entry.split(':', 1)
+        if model.strip() and fallback.strip():
+            fallbacks[model.strip()] = fallback.strip()
+    return fallbacks
+
+class CircuitBreaker:
+    """
+    Breaker for one model
+    
+    While closed, every call is allowed and its outcome is kept for
+    window_seconds. Once the window holds at least min_calls calls and either
+    the error rate or the share of calls slower than slow_call_seconds reaches
+    its threshold, the breaker opens and rejects calls for open_seconds. It
+    then goes half-open and lets half_open_probes calls through: if they all
+    succeed quickly the breaker closes, otherwise it opens again.
+    """
+    
+    def __init__(self, window_seconds: float = 60.0, min_calls: int = 5,
+                 error_threshold: float = 0.5, slow_call_seconds: float = 120.0,
+                 slow_call_threshold: float = 0.8, open_seconds: float = 30.0,
+                 half_open_probes: int = 1):
+        """Initialize a closed breaker"""
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_threshold = slow_call_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._calls: deque = deque()  # (timestamp, success, slow)
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        self._lock = threading.Lock()
+    
+    def _prune(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+    
+    def _open(self, now: float, reason: str):
+        self.state = OPEN
+        self.opened_at = now
+        self._calls.clear()
+        logger.warning(f"Circuit opened: {reason}")
+    
+    def _update_state(self, now: float):
+        """Move from open to half-open once the cool-down has passed"""
+        if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self.opened_at = now
+            self._probes_started = 0
+            self._probes_succeeded = 0
+        elif self.state == HALF_OPEN and now - self.opened_at >= self.open_seconds:
+            # Probes that never reported back (e.g. cancelled calls) must not wedge the breaker
+            self.opened_at = now
+            self._probes_started = self._probes_succeeded
+    
+    def is_available(self) -> bool:
+        """Check whether a call could be allowed, without reserving a probe"""
+        with self._lock:
+            self._update_state(time.monotonic())
+            return self.state == CLOSED or (
+                self.state == HALF_OPEN and self._probes_started < self.half_open_probes
+            )
+    
+    def allow(self) -> bool:
+        """Ask to make a call; in half-open state this reserves one of the probes"""
+        with self._lock:
+            self._update_state(time.monotonic())
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes_started < self.half_open_probes:
+                self._probes_started += 1
+                return True
+            self.rejected += 1
+            return False
+    
+    def record(self, latency: float, success: bool):
+        """Record the outcome of a call"""
+        now = time.monotonic()
+        slow = latency >= self.slow_call_seconds
+        
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if not success or slow:
+                    self._open(now, f"half-open probe {'failed' if not success else 'was slow'}")
+                    return
+                self._probes_succeeded += 1
+                if self._probes_succeeded >= self.half_open_probes:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    logger.info("Circuit closed after successful probes")
+                return
+            
+            if self.state == OPEN:
+                return
+            
+            self._calls.append((now, success, slow))
+            self._prune(now)
+            
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            
+            error_rate = sum(1 for _, ok, _ in self._calls if not ok) / total
+            slow_rate = sum(1 for _, _, is_slow in self._calls if is_slow) / total
+            if error_rate >= self.error_threshold:
+                self._open(now, f"error rate {error_rate:.0%} over {total} calls")
+            elif slow_rate >= self.slow_call_threshold:
+                self._open(now, f"{slow_rate:.0%} of {total} calls slower than {self.slow_call_seconds}s")
+    
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._update_state(now)
+            self._prune(now)
+            total = len(self._calls)
+            return {
+                'state': self.state,
+                'window_calls': total,
+                'window_error_rate': round(sum(1 for _, ok, _ in self._calls if not ok) / total, 4) if total else 0.0,
+                'window_slow_rate': round(sum(1 for _, _, slow in self._calls if slow) / total, 4) if total else 0.0,
+                'retry_in_seconds': round(max(0.0, self.open_seconds - (now - self.opened_at)), 1) if self.state == OPEN else 0.0,
+                'rejected': self.rejected
+            }
+
+class CircuitBreakerRegistry:
+    """Lazily created breakers, one per model name, sharing the same settings"""
+    
+    def __init__(self, enabled: bool = True, **settings):
+        """Initialize the registry"""
+        self.enabled = enabled
+        self.settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, model_name: str) -> CircuitBreaker:
+        """Get the breaker of a model"""
+        breaker = self._breakers.get(model_name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(model_name)
+                if breaker is None:
+                    breaker = CircuitBreaker(**self.settings)
+                    self._breakers[model_name] = breaker
+        return breaker
+    
+    def allow(self, model_name: str) -> bool:
+        """Ask to make a call to a model"""
+        return not self.enabled or self.get(model_name).allow()
+    
+    def is_available(self, model_name: str) -> bool:
+        """Check whether a model currently accepts calls"""
+        return not self.enabled or self.get(model_name).is_available()
+    
+    def record(self, model_name: str, latency: float, success: bool):
+        """Record the outcome of a call to a model"""
+        if self.enabled:
+            self.get(model_name).record(latency, success)
+    
+    def get_state(self, model_name: str) -> Dict[str, Any]:
+        """Get the breaker state of a model"""
+        if not self.enabled:
+            return {'state': 'disabled'}
+        return self.get(model_name).to_dict()
+    
+    def reset(self, model_name: Optional[str] = None):
+        """Close the breaker of a model (or all breakers)"""
+        with self._lock:
+            if model_name is None:
+                self._breakers.clear()
+            else:
+                self._breakers.pop(model_name, None)
+
+def create_circuit_breakers() -> CircuitBreakerRegistry:
+    """Create the breaker registry from environment variables"""
+    return CircuitBreakerRegistry(
+        enabled=os.getenv('CIRCUIT_BREAKER_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+        window_seconds=float(os.getenv('CIRCUIT_WINDOW_SECONDS', '60')),
+        min_calls=int(os.getenv('CIRCUIT_MIN_CALLS', '5')),
+        error_threshold=float(os.getenv('CIRCUIT_ERROR_THRESHOLD', '0.5')),
+        slow_call_seconds=float(os.getenv('CIRCUIT_SLOW_CALL_SECONDS', '120')),
+        slow_call_threshold=float(os.getenv('CIRCUIT_SLOW_CALL_THRESHOLD', '0.8')),
+        open_seconds=float(os.getenv('CIRCUIT_OPEN_SECONDS', '30')),
+        half_open_probes=int(os.getenv('CIRCUIT_HALF_OPEN_PROBES', '1'))
+    )
@@ -5,14 +5,86 @@ Generates production-ready Flutter code following Google's official best practic
 
 import json
 import logging
-from typing import Dict, List, Any, Optional
+from dataclasses import replace
+from typing import Dict, List, Any, Optional, Callable
 from datetime import datetime
 
 from .production_code_generator import ProductionCodeGenerator
-from .model_manager import model_manager
+from .model_manager import model_manager, GenerationContext
+from .deadline import Deadline, DeadlineExceeded
+from .single_flight import SingleFlight, make_request_key
+from .prompt_registry import prompt_registry
+from .scheduler import generation_scheduler
 
 logger = logging.getLogger(__name__)
 
+# Per-request generation prompt; slots are filled by the prompt registry
+SPECIALIZED_PROMPT = """
+طلب المستخدم: {user_request}
+
+نوع التطبيق: {app_type}
+
+المطلوب إنشاء تطبيق Flutter كامل يتضمن:
+
+1. MAIN.DART:
+   - تكوين التطبيق الأساسي
+   - Dependency injection setup
+   - Theme configuration
+   - Route configuration
+
+2. MODELS:
+   - Data models مع freezed/json_annotation
+   - Immutable classes
+   - Proper serialization
+
+3. REPOSITORIES:
+   - Abstract repository interfaces
+   - Concrete implementations
+   - Error handling
+   - Caching strategies
+
+4. SERVICES:
+   - API services
+   - Local storage services
+   - Authentication services
+   - Notification services
+
+5. VIEWMODELS:
+   - State management
+   - Business logic
+   - Command pattern implementation
+   - Error handling
+
+6. VIEWS/SCREENS:
+   - Responsive UI
+   - Proper widget composition
+   - Performance optimizations
+   - Accessibility support
+
+7. WIDGETS:
+   - Reusable components
+   - Custom widgets
+   - Optimized rendering
+
+8. UTILS:
+   - Helper functions
+   - Constants
+   - Extensions
+   - Validators
+
+9. TESTS:
+   - Unit tests للـ repositories
+   - Unit tests للـ viewmodels
+   - Widget tests للـ screens
+
+10. PUBSPEC.YAML:
+    - أحدث إصدارات الحزم
+    - Dependencies المطلوبة
+    - Dev dependencies للاختبار
+
+اكتب الكود بأعلى معايير الجودة مع التوثيق الكامل والتنظيم المثالي.
+"""
+
 class CTOFlutterGenerator:
     """
     CTO Expert Level Flutter Code Generator
@@ -34,6 +106,12 @@ class CTOFlutterGenerator:
         # Initialize production code generator
         self.production_generator = ProductionCodeGenerator()
         
+        # Identical requests that arrive while one is running share its result
+        self.in_flight = SingleFlight()
+        
+        prompt_registry.register_static('cto.system', self._build_cto_system_prompt)
+        prompt_registry.register('cto.specialized', SPECIALIZED_PROMPT)
+        
         logger.info("CTO Flutter Generator initialized with multi-model support")
         logger.info(f"Available models: {[m['name'] for m in self.model_manager.get_available_models()]}")
     
@@ -46,7 +124,11 @@ class CTOFlutterGenerator:
         return self.model_manager.get_available_models()
     
     def generate_flutter_app(self, user_request: str, app_type: str = "general", 
-                           model_name: Optional[str] = None) -> Dict[str, Any]:
+                           model_name: Optional[str] = None,
+                           on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                           deadline: Optional[Deadline] = None,
+                           priority: Optional[str] = None,
+                           tenant: Optional[str] = None) -> Dict[str, Any]:
         """
         Generate a complete Flutter application with CTO-level expertise
         
@@ -54,42 +136,88 @@ class CTOFlutterGenerator:
             user_request: User's description of the desired app
             app_type: Type of application (e.g., 'ecommerce', 'social', 'productivity')
             model_name: Optional specific model to use
+            on_event: Optional callback receiving streamed 'token' and 'file' events
+            deadline: Optional time budget that bounds and can cancel generation
+            priority: Scheduling class (interactive, standard, batch) of the request
+            tenant: Tenant whose fair share of generation slots the request uses
             
         Returns:
             Dictionary containing the complete Flutter project structure
         """
         try:
-            logger.info(f"Generating CTO-level Flutter app: {app_type}")
+            context = self.model_manager.create_context(model_name, fallback=True, deadline=deadline,
+                                                        priority=priority, tenant=tenant)
+        except Exception as e:
+            logger.error(f"Error generating Flutter app: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'model_used': {},
+                'fallback_project': self._get_fallback_project(user_request)
+            }
             
-            # Switch model if specified
-            if model_name:
-                if not self.model_manager.switch_model(model_name):
-                    logger.warning(f"Failed to switch to model {model_name}, using current model")
+        if on_event is not None:
+            # Streaming callers need their own token events, so they are not coalesced
+            return self._generate_flutter_app(user_request, app_type, context, on_event)
+            
+        request_key = make_request_key(user_request, app_type, context.model_name)
+        try:
+            # Identical requests share one run under a deadline none of them owns alone
+            return self.in_flight.do(request_key, lambda deadline: self._generate_flutter_app(
+                user_request, app_type, replace(context, deadline=deadline)), deadline=context.deadline)
+        except DeadlineExceeded as e:
+            logger.warning(f"Flutter app generation stopped: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'deadline_exceeded': True,
+                'model_used': self.model_manager.get_model_info(context=context)
+            }
+    
+    def _generate_flutter_app(self, user_request: str, app_type: str, context: GenerationContext,
+                            on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Run a single Flutter app generation"""
+        try:
+            logger.info(f"Generating CTO-level Flutter app: {app_type} with {context.model_name}")
             
-            # Use the production code generator with model manager
-            result = self.production_generator.generate_production_flutter_app(
-                user_request=user_request,
-                app_type=app_type,
-                model_name=model_name
-            )
+            # Use the production code generator with model manager, in a scheduler slot
+            with generation_scheduler.slot(context, 'generation'):
+                result = self.production_generator.generate_production_flutter_app(
+                    user_request=user_request,
+                    app_type=app_type,
+                    on_event=on_event,
+                    context=context
+                )
             
             # Add model information to result
-            current_model = self.model_manager.get_model_info()
-            result['model_used'] = current_model
+            result['model_used'] = self.model_manager.get_model_info(context=context)
             
             return result
+        
+        except DeadlineExceeded as e:
+            logger.warning(f"Flutter app generation stopped: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'deadline_exceeded': True,
+                'model_used': self.model_manager.get_model_info(context=context)
+            }
             
         except Exception as e:
             logger.error(f"Error generating Flutter app: {str(e)}")
             return {
                 'success': False,
                 'error': str(e),
-                'model_used': self.model_manager.get_model_info(),
+                'model_used': self.model_manager.get_model_info(context=context),
                 'fallback_project': self._get_fallback_project(user_request)
             }
     
     def _get_cto_system_prompt(self, app_type: str) -> str:
-        """Get the CTO-level system prompt"""
+        """Get the CTO-level system prompt (built once per app type by the prompt registry)"""
+        return prompt_registry.static('cto.system', app_type)
+    
+    def _build_cto_system_prompt(self, app_type: str) -> str:
+        """Build the CTO-level system prompt text for an app type"""
         base_prompt = """
 أنت CTO خبير في Flutter مع أكثر من 50 سنة خبرة في تطوير التطبيقات على مستوى الإنتاج.
 تتبع جميع أفضل الممارسات الرسمية من Google Flutter Team وتطبق معايير الكود الاحترافية.
@@ -157,71 +285,7 @@ class CTOFlutterGenerator:
     
     def _get_specialized_prompt(self, user_request: str, app_type: str) -> str:
         """Get specialized prompt based on app type"""
-        return f"""
-طلب المستخدم: {user_request}
-
-نوع التطبيق: {app_type}
-
-المطلوب إنشاء تطبيق Flutter كامل يتضمن:
-
-1. MAIN.DART:
-   - تكوين التطبيق الأساسي
-   - Dependency injection setup
-   - Theme configuration
-   - Route configuration
-
-2. MODELS:
-   - Data models مع freezed/json_annotation
-   - Immutable classes
-   - Proper serialization
-
-3. REPOSITORIES:
-   - Abstract repository interfaces
-   - Concrete implementations
-   - Error handling
-   - Caching strategies
-
-4. SERVICES:
-   - API services
-   - Local storage services
-   - Authentication services
-   - Notification services
-
-5. VIEWMODELS:
-   - State management
-   - Business logic
-   - Command pattern implementation
-   - Error handling
-
-6. VIEWS/SCREENS:
-   - Responsive UI
-   - Proper widget composition
-   - Performance optimizations
-   - Accessibility support
-
-7. WIDGETS:
-   - Reusable components
-   - Custom widgets
-   - Optimized rendering
-
-8. UTILS:
-   - Helper functions
-   - Constants
-   - Extensions
-   - Validators
-
-9. TESTS:
-   - Unit tests للـ repositories
-   - Unit tests للـ viewmodels
-   - Widget tests للـ screens
-
-10. PUBSPEC.YAML:
-    - أحدث إصدارات الحزم
-    - Dependencies المطلوبة
-    - Dev dependencies للاختبار
-
-اكتب الكود بأعلى معايير الجودة مع التوثيق الكامل والتنظيم المثالي.
-"""
+        return prompt_registry.render('cto.specialized', user_request=user_request, app_type=app_type)
     
     def _get_ecommerce_guidelines(self) -> str:
         """Get e-commerce specific guidelines"""
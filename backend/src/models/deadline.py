@@ -0,0 +1,103 @@
+"""
+Deadline - Time budget and cancellation for one generation request
+Created at the route layer and carried through every pipeline stage and provider call
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request's time budget has run out or the request was cancelled"""
+
+class Deadline:
+    """
+    Absolute deadline plus a cancellation flag
+    
+    remaining() gives the budget left for the next provider call, check()
+    raises DeadlineExceeded once it is gone, and cancel() ends the request
+    early (e.g. when the client disconnects), running the registered
+    callbacks so in-flight provider requests are aborted.
+    """
+    
+    def __init__(self, timeout: Optional[float] = None):
+        """Start the clock; timeout=None means no time limit (cancellation only)"""
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout if timeout is not None else None
+        self.cancel_reason: Optional[str] = None
+        self._cancelled = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+    
+    def remaining(self) -> Optional[float]:
+        """Seconds left (0 once expired or cancelled), or None without a time limit"""
+        if self.cancelled:
+            return 0.0
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+    
+    def check(self, stage: Optional[str] = None):
+        """Raise DeadlineExceeded if the request should stop"""
+        if self.cancelled:
+            raise DeadlineExceeded(f"Request cancelled ({self.cancel_reason})"
+                                   + (f" before stage {stage}" if stage else ""))
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline of {self.timeout}s exceeded"
+                                   + (f" before stage {stage}" if stage else ""))
+    
+    def cancel(self, reason: str = "cancelled"):
+        """Cancel the request and abort its in-flight calls"""
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancel_reason = reason
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        
+        logger.info(f"Generation request cancelled: {reason}")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in cancellation callback: {str(e)}")
+    
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Run callback when the request is cancelled (immediately if it already is)
+        
+        Returns a function that unregisters the callback.
+        """
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+    
+    def _remove_callback(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+def create_deadline(timeout: Optional[float] = None) -> Deadline:
+    """Create a request deadline (GENERATION_TIMEOUT seconds by default, capped at GENERATION_MAX_TIMEOUT)"""
+    default_timeout = float(os.getenv('GENERATION_TIMEOUT', '600'))
+    max_timeout = float(os.getenv('GENERATION_MAX_TIMEOUT', '1800'))
+    
+    if timeout is None:
+        timeout = default_timeout
+    return Deadline(max(1.0, min(float(timeout), max_timeout)))
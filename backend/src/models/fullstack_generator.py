@@ -5,117 +5,29 @@ Generates complete full-stack applications with Flutter frontend and backend API
 
 import json
 import logging
-from typing import Dict, List, Any, Optional
+from dataclasses import replace
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Callable
 from datetime import datetime
 
-from .model_manager import model_manager
+from .model_manager import model_manager, GenerationContext
+from .deadline import Deadline, DeadlineExceeded
+from .single_flight import SingleFlight, make_request_key
+from .prompt_registry import prompt_registry
+from .scheduler import generation_scheduler, generation_executor
+from .stage_graph import Stage, StageGraph
+from .checkpoint_store import checkpoint_store, RUN_SUCCEEDED, RUN_FAILED
 
 logger = logging.getLogger(__name__)
 
-class FullStackGenerator:
-    """
-    Full Stack Application Generator
-    
-    Generates complete applications including:
-    - Flutter frontend with all screens and logic
-    - Backend APIs (Node.js/Express or Python/Flask)
-    - Database schemas and models
-    - Authentication system
-    - File upload/download functionality
-    - Real-time features (WebSockets)
-    - Deployment configurations
-    """
-    
-    def __init__(self):
-        """Initialize the Full Stack Generator"""
-        self.model_manager = model_manager
-        logger.info("Full Stack Generator initialized")
+# Receives (event_name, data) progress events while an app is generated
+EventCallback = Callable[[str, Dict[str, Any]], None]
     
-    def generate_fullstack_app(self, user_request: str, app_type: str = "general",
-                             backend_type: str = "flask", database_type: str = "sqlite",
-                             model_name: Optional[str] = None) -> Dict[str, Any]:
-        """
-        Generate a complete full-stack application
-        
-        Args:
-            user_request: User's description of the desired app
-            app_type: Type of application (ecommerce, social, productivity, etc.)
-            backend_type: Backend framework (flask, express, fastapi)
-            database_type: Database type (sqlite, postgresql, mongodb)
-            model_name: Optional specific AI model to use
-            
-        Returns:
-            Dictionary containing the complete full-stack project
-        """
-        try:
-            logger.info(f"Generating full-stack {app_type} app with {backend_type} backend")
-            
-            # Switch model if specified
-            if model_name:
-                self.model_manager.switch_model(model_name)
-            
-            # Generate project structure
-            project_structure = self._analyze_requirements(user_request, app_type)
-            
-            # Generate Flutter frontend
-            frontend = self._generate_flutter_frontend(project_structure, user_request)
-            
-            # Generate backend API
-            backend = self._generate_backend_api(project_structure, backend_type, database_type)
-            
-            # Generate database schema
-            database = self._generate_database_schema(project_structure, database_type)
-            
-            # Generate authentication system
-            auth_system = self._generate_auth_system(backend_type)
-            
-            # Generate deployment configs
-            deployment = self._generate_deployment_configs(backend_type)
-            
-            # Combine all components
-            result = {
-                'success': True,
-                'project': {
-                    'name': project_structure['name'],
-                    'description': project_structure['description'],
-                    'type': app_type,
-                    'architecture': 'full_stack',
-                    'components': {
-                        'frontend': frontend,
-                        'backend': backend,
-                        'database': database,
-                        'authentication': auth_system,
-                        'deployment': deployment
-                    },
-                    'features': project_structure['features'],
-                    'tech_stack': {
-                        'frontend': 'Flutter',
-                        'backend': backend_type,
-                        'database': database_type,
-                        'authentication': 'JWT + OAuth2',
-                        'real_time': 'WebSockets',
-                        'file_storage': 'Local/Cloud'
-                    }
-                },
-                'model_used': self.model_manager.get_model_info(),
-                'generation_time': datetime.utcnow().isoformat(),
-                'quality_score': 95
-            }
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error generating full-stack app: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e),
-                'model_used': self.model_manager.get_model_info()
-            }
+# Generated components, in the order they appear in a project
+COMPONENTS = ('frontend', 'backend', 'database', 'authentication', 'deployment')
     
-    def _analyze_requirements(self, user_request: str, app_type: str) -> Dict[str, Any]:
-        """Analyze user requirements and extract project structure"""
-        
-        analysis_prompt = f"""
+# Stage prompts; slots are filled per request by the prompt registry
+ANALYSIS_PROMPT = """
 تحليل متطلبات المشروع التالي وإنشاء هيكل مشروع متكامل:
 
 طلب المستخدم: {user_request}
@@ -146,33 +58,13 @@ class FullStackGenerator:
 }}
 """
         
-        try:
-            response = self.model_manager.generate_completion(analysis_prompt)
-            # Extract JSON from response
-            json_start = response.find('{')
-            json_end = response.rfind('}') + 1
-            if json_start != -1 and json_end != -1:
-                json_str = response[json_start:json_end]
-                return json.loads(json_str)
-            else:
-                # Fallback structure
-                return self._get_fallback_structure(user_request, app_type)
-                
-        except Exception as e:
-            logger.error(f"Error analyzing requirements: {str(e)}")
-            return self._get_fallback_structure(user_request, app_type)
-    
-    def _generate_flutter_frontend(self, project_structure: Dict[str, Any], 
-                                 user_request: str) -> Dict[str, str]:
-        """Generate complete Flutter frontend"""
-        
-        frontend_prompt = f"""
+FRONTEND_PROMPT = """
 أنت خبير Flutter مع خبرة 50+ سنة. أنشئ تطبيق Flutter متكامل بناءً على:
 
-المشروع: {project_structure['name']}
-الوصف: {project_structure['description']}
-الميزات: {project_structure['features']}
-الشاشات: {project_structure['screens']}
+المشروع: {name}
+الوصف: {description}
+الميزات: {features}
+الشاشات: {screens}
 
 يجب أن يتضمن:
 1. main.dart - نقطة البداية
@@ -198,37 +90,13 @@ class FullStackGenerator:
 أنشئ كود كامل وجاهز للتشغيل.
 """
         
-        try:
-            response = self.model_manager.generate_completion(frontend_prompt)
-            return self._extract_flutter_files(response)
-        except Exception as e:
-            logger.error(f"Error generating Flutter frontend: {str(e)}")
-            return self._get_fallback_flutter_files()
-    
-    def _generate_backend_api(self, project_structure: Dict[str, Any], 
-                            backend_type: str, database_type: str) -> Dict[str, str]:
-        """Generate backend API"""
-        
-        if backend_type == "flask":
-            return self._generate_flask_backend(project_structure, database_type)
-        elif backend_type == "express":
-            return self._generate_express_backend(project_structure, database_type)
-        elif backend_type == "fastapi":
-            return self._generate_fastapi_backend(project_structure, database_type)
-        else:
-            return self._generate_flask_backend(project_structure, database_type)
-    
-    def _generate_flask_backend(self, project_structure: Dict[str, Any], 
-                              database_type: str) -> Dict[str, str]:
-        """Generate Flask backend with APIs"""
-        
-        flask_prompt = f"""
+FLASK_PROMPT = """
 أنشئ Flask backend متكامل للمشروع:
 
-المشروع: {project_structure['name']}
-الميزات: {project_structure['features']}
-نماذج البيانات: {project_structure.get('data_models', [])}
-APIs المطلوبة: {project_structure.get('apis', [])}
+المشروع: {name}
+الميزات: {features}
+نماذج البيانات: {data_models}
+APIs المطلوبة: {apis}
 قاعدة البيانات: {database_type}
 
 يجب أن يتضمن:
@@ -263,22 +131,11 @@ APIs المطلوبة: {project_structure.get('apis', [])}
 أنشئ كود كامل وجاهز للإنتاج.
 """
         
-        try:
-            response = self.model_manager.generate_completion(flask_prompt)
-            return self._extract_backend_files(response, "flask")
-        except Exception as e:
-            logger.error(f"Error generating Flask backend: {str(e)}")
-            return self._get_fallback_flask_files()
-    
-    def _generate_database_schema(self, project_structure: Dict[str, Any], 
-                                database_type: str) -> Dict[str, str]:
-        """Generate database schema and migrations"""
-        
-        db_prompt = f"""
+DATABASE_PROMPT = """
 أنشئ database schema متكامل للمشروع:
 
-المشروع: {project_structure['name']}
-نماذج البيانات: {project_structure.get('data_models', [])}
+المشروع: {name}
+نماذج البيانات: {data_models}
 نوع قاعدة البيانات: {database_type}
 
 يجب أن يتضمن:
@@ -296,17 +153,8 @@ APIs المطلوبة: {project_structure.get('apis', [])}
 - Database configuration
 """
         
-        try:
-            response = self.model_manager.generate_completion(db_prompt)
-            return self._extract_database_files(response, database_type)
-        except Exception as e:
-            logger.error(f"Error generating database schema: {str(e)}")
-            return self._get_fallback_database_files()
-    
-    def _generate_auth_system(self, backend_type: str) -> Dict[str, str]:
-        """Generate authentication system"""
-        
-        auth_prompt = f"""
+# Depend only on the backend type, so they are rendered once per backend
+AUTH_PROMPT = """
 أنشئ نظام مصادقة متكامل للـ {backend_type} backend:
 
 يجب أن يتضمن:
@@ -329,17 +177,7 @@ APIs المطلوبة: {project_structure.get('apis', [])}
 - Audit logging
 """
         
-        try:
-            response = self.model_manager.generate_completion(auth_prompt)
-            return self._extract_auth_files(response)
-        except Exception as e:
-            logger.error(f"Error generating auth system: {str(e)}")
-            return self._get_fallback_auth_files()
-    
-    def _generate_deployment_configs(self, backend_type: str) -> Dict[str, str]:
-        """Generate deployment configurations"""
-        
-        deployment_prompt = f"""
+DEPLOYMENT_PROMPT = """
 أنشئ ملفات deployment متكاملة للمشروع:
 
 Backend: {backend_type}
@@ -360,12 +198,489 @@ Frontend: Flutter
 أنشئ ملفات جاهزة للإنتاج.
 """
         
+class FullStackGenerator:
+    """
+    Full Stack Application Generator
+    
+    Generates complete applications including:
+    - Flutter frontend with all screens and logic
+    - Backend APIs (Node.js/Express or Python/Flask)
+    - Database schemas and models
+    - Authentication system
+    - File upload/download functionality
+    - Real-time features (WebSockets)
+    - Deployment configurations
+    """
+    
+    def __init__(self):
+        """Initialize the Full Stack Generator"""
+        self.model_manager = model_manager
+        
+        # Identical requests that arrive while one is running share its result
+        self.in_flight = SingleFlight()
+        
+        prompt_registry.register('fullstack.analysis', ANALYSIS_PROMPT)
+        prompt_registry.register('fullstack.frontend', FRONTEND_PROMPT)
+        prompt_registry.register('fullstack.flask', FLASK_PROMPT)
+        prompt_registry.register('fullstack.database', DATABASE_PROMPT)
+        prompt_registry.register_static('fullstack.auth', lambda backend_type: AUTH_PROMPT.format(backend_type=backend_type))
+        prompt_registry.register_static('fullstack.deployment', lambda backend_type: DEPLOYMENT_PROMPT.format(backend_type=backend_type))
+        
+        logger.info("Full Stack Generator initialized")
+    
+    def generate_fullstack_app(self, user_request: str, app_type: str = "general",
+                             backend_type: str = "flask", database_type: str = "sqlite",
+                             model_name: Optional[str] = None,
+                             on_event: Optional[EventCallback] = None,
+                             deadline: Optional[Deadline] = None,
+                             priority: Optional[str] = None,
+                             tenant: Optional[str] = None,
+                             allow_partial: bool = False) -> Dict[str, Any]:
+        """
+        Generate a complete full-stack application
+        
+        Args:
+            user_request: User's description of the desired app
+            app_type: Type of application (ecommerce, social, productivity, etc.)
+            backend_type: Backend framework (only flask is supported)
+            database_type: Database type (sqlite, postgresql, mongodb)
+            model_name: Optional specific AI model to use
+            on_event: Optional callback receiving progress events (stage, token,
+                project_structure, component) while the app is generated
+            deadline: Optional time budget; remaining stages are skipped once it
+                runs out or is cancelled
+            priority: Scheduling class (interactive, standard, batch) of the stages
+            tenant: Tenant whose fair share of generation slots the stages use
+            allow_partial: Keep generating the other components when a stage
+                fails, emitting a 'component_error' event for it (and for the
+                stages that needed its output); the result then holds the
+                components that succeeded plus 'failed_components'. Otherwise a
+                failed stage gets placeholder output, listed with its error in
+                'fallback_components', and the run is recorded as failed
+        
+        Returns:
+            Dictionary containing the complete full-stack project, with the
+            'run_id' to pass to resume_fullstack_app() if it failed
+        """
+        try:
+            context = self.model_manager.create_context(model_name, fallback=True, deadline=deadline,
+                                                        priority=priority, tenant=tenant)
+        except Exception as e:
+            logger.error(f"Error generating full-stack app: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'model_used': {}
+            }
+        
+        if on_event is not None:
+            # Streaming callers need their own progress events, so they are not coalesced
+            return self._generate_fullstack_app(user_request, app_type, backend_type, database_type,
+                                                context, on_event, allow_partial, model_name)
+        
+        request_key = make_request_key(user_request, app_type, context.model_name,
+                                       backend_type, database_type)
+        return self._coalesce(request_key, context, lambda shared: self._generate_fullstack_app(
+            user_request, app_type, backend_type, database_type, shared, None, allow_partial, model_name))
+    
+    def resume_fullstack_app(self, run_id: str, on_event: Optional[EventCallback] = None,
+                             deadline: Optional[Deadline] = None,
+                             priority: Optional[str] = None,
+                             tenant: Optional[str] = None,
+                             allow_partial: bool = False) -> Dict[str, Any]:
+        """
+        Finish an earlier generation run that failed or was interrupted
+        
+        Stages whose output was checkpointed are restored (and emitted to
+        on_event like freshly generated ones); only the failed and missing
+        stages run again, with the inputs of the original request.
+        
+        Returns:
+            The same result as generate_fullstack_app(), or a 'not_found'
+            error if the run is unknown
+        """
+        run = checkpoint_store.get_run(run_id) if checkpoint_store.enabled else None
+        if run is None:
+            return {
+                'success': False,
+                'error': f"Generation run {run_id} not found",
+                'not_found': True
+            }
+        
+        inputs = run['inputs']
+        try:
+            context = self.model_manager.create_context(inputs.get('model_name'), fallback=True, deadline=deadline,
+                                                        priority=priority, tenant=tenant)
+        except Exception as e:
+            logger.error(f"Error resuming full-stack generation run {run_id}: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'run_id': run_id,
+                'model_used': {}
+            }
+        
+        logger.info(f"Resuming full-stack generation run {run_id}; "
+                    f"completed stages: {', '.join(run['completed_stages']) or 'none'}")
+        checkpoint_store.start_attempt(run_id)
+        
+        def run(run_context: GenerationContext, on_event: Optional[EventCallback] = None) -> Dict[str, Any]:
+            return self._generate_fullstack_app(inputs['user_request'], inputs['app_type'], inputs['backend_type'],
+                                                inputs['database_type'], run_context, on_event, allow_partial,
+                                                inputs.get('model_name'), run_id)
+        
+        if on_event is not None:
+            return run(context, on_event)
+        return self._coalesce(f"resume:{run_id}", context, run)
+    
+    def _coalesce(self, request_key: str, context: GenerationContext,
+                  run: Callable[[GenerationContext], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Run a generation once for identical concurrent requests
+        
+        The shared run gets a deadline no single caller owns (see SingleFlight);
+        each caller waits for it only until its own deadline.
+        """
+        try:
+            return self.in_flight.do(request_key, lambda deadline: run(replace(context, deadline=deadline)),
+                                     deadline=context.deadline)
+        except DeadlineExceeded as e:
+            logger.warning(f"Full-stack generation stopped: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'deadline_exceeded': True,
+                'model_used': self.model_manager.get_model_info(context=context)
+            }
+    
+    def _generate_fullstack_app(self, user_request: str, app_type: str, backend_type: str,
+                              database_type: str, context: GenerationContext,
+                              on_event: Optional[EventCallback] = None,
+                              allow_partial: bool = False, model_name: Optional[str] = None,
+                              run_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run a single full-stack generation
+        
+        Every stage completed with generated output is checkpointed under the
+        run (a new one unless run_id is given), keyed by a hash of the request
+        inputs; the stages already checkpointed for a given run are restored
+        instead of run.
+        """
+        input_hash = make_request_key(user_request, app_type, model_name, backend_type, database_type)
+        restored: Dict[str, Any] = {}
         try:
-            response = self.model_manager.generate_completion(deployment_prompt)
-            return self._extract_deployment_files(response)
+            if checkpoint_store.enabled and run_id is None:
+                run_id = checkpoint_store.create_run(input_hash, {
+                    'user_request': user_request,
+                    'app_type': app_type,
+                    'backend_type': backend_type,
+                    'database_type': database_type,
+                    'model_name': model_name
+                })
+            elif run_id is not None:
+                restored = checkpoint_store.load_stages(run_id, input_hash)
         except Exception as e:
-            logger.error(f"Error generating deployment configs: {str(e)}")
-            return self._get_fallback_deployment_files()
+            # Generation still works without checkpoints, it just cannot be resumed
+            logger.error(f"Error reading generation checkpoints: {str(e)}")
+            run_id = None
+        
+        result = self._run_stages(user_request, app_type, backend_type, database_type, context,
+                                  on_event, allow_partial, run_id, input_hash, restored)
+        
+        if run_id is not None:
+            result['run_id'] = run_id
+            if restored:
+                result['restored_stages'] = sorted(restored)
+            # Stages that fell back to placeholders count as failed, so a resume runs them again
+            failed_stages = {**result.get('failed_components', {}), **result.get('fallback_components', {})}
+            try:
+                checkpoint_store.finish_run(
+                    run_id, RUN_SUCCEEDED if result.get('success') and not failed_stages else RUN_FAILED,
+                    error=result.get('error') or (f"Placeholder output used for: {', '.join(failed_stages)}"
+                                                  if failed_stages else None),
+                    failed_stages=failed_stages
+                )
+            except Exception as e:
+                logger.error(f"Error recording generation run {run_id}: {str(e)}")
+        return result
+    
+    def _run_stages(self, user_request: str, app_type: str, backend_type: str, database_type: str,
+                    context: GenerationContext, on_event: Optional[EventCallback], allow_partial: bool,
+                    run_id: Optional[str], input_hash: str, restored: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the stages missing from restored and combine all outputs into a project"""
+        try:
+            logger.info(f"Generating full-stack {app_type} app with {backend_type} backend on {context.model_name}")
+            
+            emit = on_event or (lambda event, data: None)
+            
+            def emit_output(stage: str, output: Any):
+                if stage == 'analysis':
+                    emit('project_structure', output)
+                else:
+                    emit('component', {'component': stage, 'files': output})
+            
+            # Without allow_partial, failed stages fall back to placeholder output so the
+            # project is complete; those (and the stages built on them) are not checkpointed
+            fallbacks: Dict[str, str] = {}
+            placeholder_based = set()
+            
+            def on_complete(stage: str, output: Any):
+                if stage in fallbacks or any(dep in placeholder_based for dep in graph.stages[stage].requires):
+                    placeholder_based.add(stage)
+                elif run_id is not None:
+                    try:
+                        checkpoint_store.save_stage(run_id, input_hash, stage, output)
+                    except Exception as e:
+                        logger.error(f"Error checkpointing stage {stage} of run {run_id}: {str(e)}")
+                emit_output(stage, output)
+            
+            failures: Dict[str, BaseException] = {}
+            
+            def on_error(stage: str, error: BaseException):
+                logger.error(f"Full-stack stage {stage} failed: {str(error)}")
+                failures[stage] = error
+                emit('component_error', {'component': stage, 'error': str(error)})
+            
+            # Independent stages run concurrently; components are emitted as each finishes
+            graph = self._build_stage_graph(user_request, app_type, backend_type, database_type,
+                                            context, on_event, emit, None if allow_partial else fallbacks)
+            for stage in graph.order:
+                if stage in restored:
+                    emit_output(stage, restored[stage])
+            outputs = graph.run(generation_executor, on_complete, results=restored,
+                                on_error=on_error if allow_partial else None)
+            project_structure = outputs.get('analysis', {})
+            
+            # Combine all components
+            result = {
+                'success': not failures,
+                'project': {
+                    'name': project_structure.get('name'),
+                    'description': project_structure.get('description'),
+                    'type': app_type,
+                    'architecture': 'full_stack',
+                    'components': {
+                        component: outputs[component] for component in COMPONENTS if component in outputs
+                    },
+                    'features': project_structure.get('features', []),
+                    'tech_stack': {
+                        'frontend': 'Flutter',
+                        'backend': backend_type,
+                        'database': database_type,
+                        'authentication': 'JWT + OAuth2',
+                        'real_time': 'WebSockets',
+                        'file_storage': 'Local/Cloud'
+                    }
+                },
+                'model_used': self.model_manager.get_model_info(context=context),
+                'generation_time': datetime.utcnow().isoformat(),
+                'quality_score': 95
+            }
+            
+            if failures:
+                result['error'] = f"{len(failures)} of {len(graph.stages)} stages failed: {', '.join(failures)}"
+                result['failed_components'] = {stage: str(error) for stage, error in failures.items()}
+                if any(isinstance(error, DeadlineExceeded) for error in failures.values()):
+                    result['deadline_exceeded'] = True
+            if fallbacks:
+                result['fallback_components'] = dict(fallbacks)
+            
+            return result
+        
+        except DeadlineExceeded as e:
+            logger.warning(f"Full-stack generation stopped: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'deadline_exceeded': True,
+                'model_used': self.model_manager.get_model_info(context=context)
+            }
+        
+        except Exception as e:
+            logger.error(f"Error generating full-stack app: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'model_used': self.model_manager.get_model_info(context=context)
+            }
+    
+    def _build_stage_graph(self, user_request: str, app_type: str, backend_type: str, database_type: str,
+                           context: GenerationContext, on_event: Optional[EventCallback],
+                           emit: EventCallback, fallbacks: Optional[Dict[str, str]] = None) -> StageGraph:
+        """
+        Dependency graph of the pipeline stages
+        
+        Frontend, backend and database need the project structure from the
+        requirements analysis; authentication and deployment depend only on
+        the backend type, so they run alongside the analysis.
+        
+        A stage that fails raises to the graph, unless fallbacks is given:
+        then its placeholder output is returned instead and the error is
+        recorded in fallbacks under the stage name.
+        """
+        def staged(stage: str, fn: Callable[..., Any], fallback: Callable[[], Any]) -> Callable[..., Any]:
+            def run(**dependencies):
+                with self._stage(stage, context, emit):
+                    try:
+                        return fn(**dependencies)
+                    except DeadlineExceeded:
+                        raise
+                    except Exception as e:
+                        if fallbacks is None:
+                            raise
+                        logger.error(f"Full-stack stage {stage} failed, using placeholder output: {str(e)}")
+                        fallbacks[stage] = str(e)
+                        return fallback()
+            return run
+        
+        return StageGraph([
+            Stage('analysis', staged('analysis', lambda: self._analyze_requirements(
+                user_request, app_type, context, on_event),
+                lambda: self._get_fallback_structure(user_request, app_type))),
+            Stage('frontend', staged('frontend', lambda analysis: self._generate_flutter_frontend(
+                analysis, user_request, context, on_event), self._get_fallback_flutter_files),
+                requires=['analysis']),
+            Stage('backend', staged('backend', lambda analysis: self._generate_backend_api(
+                analysis, backend_type, database_type, context, on_event), self._get_fallback_flask_files),
+                requires=['analysis']),
+            Stage('database', staged('database', lambda analysis: self._generate_database_schema(
+                analysis, database_type, context, on_event), self._get_fallback_database_files),
+                requires=['analysis']),
+            Stage('authentication', staged('authentication', lambda: self._generate_auth_system(
+                backend_type, context, on_event), self._get_fallback_auth_files)),
+            Stage('deployment', staged('deployment', lambda: self._generate_deployment_configs(
+                backend_type, context, on_event), self._get_fallback_deployment_files))
+        ])
+    
+    @contextmanager
+    def _stage(self, stage: str, context: GenerationContext, emit: EventCallback):
+        """
+        Run one pipeline stage in a scheduler slot
+        
+        Stops the pipeline if the request's deadline has passed, waits for a
+        slot (higher-priority requests get theirs first), then announces the
+        stage. The slot is released when the stage ends, so other requests
+        can run between this request's stages.
+        """
+        if context.deadline is not None:
+            context.deadline.check(stage)
+        with generation_scheduler.slot(context, stage):
+            emit('stage', {'stage': stage})
+            yield
+    
+    def _complete(self, prompt: str, stage: str, context: GenerationContext,
+                  on_event: Optional[EventCallback] = None, hedged: bool = False) -> str:
+        """
+        Run a completion for a pipeline stage, forwarding tokens to on_event if given
+        
+        Hedged stages race a backup model when the primary stalls; their text is
+        forwarded as a single token event once the winner finishes.
+        """
+        if hedged:
+            response = self.model_manager.generate_completion_hedged(prompt, context=context)
+            if on_event is not None:
+                on_event('token', {'stage': stage, 'text': response})
+            return response
+        
+        if on_event is None:
+            return self.model_manager.generate_completion(prompt, context=context)
+        
+        return self.model_manager.generate_completion(
+            prompt,
+            context=context,
+            on_token=lambda text: on_event('token', {'stage': stage, 'text': text})
+        )
+    
+    def _analyze_requirements(self, user_request: str, app_type: str,
+                            context: GenerationContext,
+                            on_event: Optional[EventCallback] = None) -> Dict[str, Any]:
+        """Analyze user requirements and extract project structure"""
+        
+        analysis_prompt = prompt_registry.render('fullstack.analysis', user_request=user_request, app_type=app_type)
+        
+        response = self._complete(analysis_prompt, 'analysis', context, on_event, hedged=True)
+        # Extract JSON from response
+        json_start = response.find('{')
+        json_end = response.rfind('}') + 1
+        if json_start == -1 or json_end == 0:
+            raise ValueError("Requirements analysis returned no JSON project structure")
+        return json.loads(response[json_start:json_end])
+    
+    def _generate_flutter_frontend(self, project_structure: Dict[str, Any], 
+                                 user_request: str, context: GenerationContext,
+                                 on_event: Optional[EventCallback] = None) -> Dict[str, str]:
+        """Generate complete Flutter frontend"""
+        
+        frontend_prompt = prompt_registry.render(
+            'fullstack.frontend',
+            name=project_structure['name'],
+            description=project_structure['description'],
+            features=project_structure['features'],
+            screens=project_structure['screens']
+        )
+        
+        response = self._complete(frontend_prompt, 'frontend', context, on_event)
+        return self._extract_flutter_files(response)
+    
+    def _generate_backend_api(self, project_structure: Dict[str, Any], 
+                            backend_type: str, database_type: str,
+                            context: GenerationContext,
+                            on_event: Optional[EventCallback] = None) -> Dict[str, str]:
+        """Generate backend API"""
+        
+        if backend_type != "flask":
+            raise ValueError(f"Unsupported backend type: {backend_type}")
+        return self._generate_flask_backend(project_structure, database_type, context, on_event)
+    
+    def _generate_flask_backend(self, project_structure: Dict[str, Any], 
+                              database_type: str, context: GenerationContext,
+                              on_event: Optional[EventCallback] = None) -> Dict[str, str]:
+        """Generate Flask backend with APIs"""
+        
+        flask_prompt = prompt_registry.render(
+            'fullstack.flask',
+            name=project_structure['name'],
+            features=project_structure['features'],
+            data_models=project_structure.get('data_models', []),
+            apis=project_structure.get('apis', []),
+            database_type=database_type
+        )
+        
+        response = self._complete(flask_prompt, 'backend', context, on_event)
+        return self._extract_backend_files(response, "flask")
+    
+    def _generate_database_schema(self, project_structure: Dict[str, Any], 
+                                database_type: str, context: GenerationContext,
+                                on_event: Optional[EventCallback] = None) -> Dict[str, str]:
+        """Generate database schema and migrations"""
+        
+        db_prompt = prompt_registry.render(
+            'fullstack.database',
+            name=project_structure['name'],
+            data_models=project_structure.get('data_models', []),
+            database_type=database_type
+        )
+        
+        response = self._complete(db_prompt, 'database', context, on_event)
+        return self._extract_database_files(response, database_type)
+    
+    def _generate_auth_system(self, backend_type: str, context: GenerationContext,
+                            on_event: Optional[EventCallback] = None) -> Dict[str, str]:
+        """Generate authentication system"""
+        
+        auth_prompt = prompt_registry.static('fullstack.auth', backend_type)
+        
+        response = self._complete(auth_prompt, 'authentication', context, on_event)
+        return self._extract_auth_files(response)
+    
+    def _generate_deployment_configs(self, backend_type: str, context: GenerationContext,
+                                   on_event: Optional[EventCallback] = None) -> Dict[str, str]:
+        """Generate deployment configurations"""
+        
+        deployment_prompt = prompt_registry.static('fullstack.deployment', backend_type)
+        
+        response = self._complete(deployment_prompt, 'deployment', context, on_event)
+        return self._extract_deployment_files(response)
     
     def _extract_flutter_files(self, response: str) -> Dict[str, str]:
         """Extract Flutter files from AI response"""
@@ -0,0 +1,141 @@
+"""
+Health Prober - Background health checks for configured models
+Probes every model in parallel on an interval and publishes an immutable snapshot
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from .async_bridge import async_bridge
+
+logger = logging.getLogger(__name__)
+
+class HealthProber:
+    """
+    Periodic, parallel model health checks on the async bridge loop
+    
+    Each round sends a minimal completion to every configured model at once
+    and builds a new snapshot, which replaces the previous one in a single
+    assignment. Readers (the /health endpoint, the router) only ever look at
+    the latest snapshot, so they answer in constant time without calling a
+    provider. A model is reported unhealthy after unhealthy_after consecutive
+    failed probes; models that were never probed count as healthy. Models
+    without an API key (other than the local model) are not probed.
+    
+    Every probe is a billed completion and each process probes on its own,
+    so the background loop should run in one process per deployment.
+    """
+    
+    def __init__(self, manager, interval: float = 60.0, timeout: float = 15.0,
+                 prompt: str = "ping", unhealthy_after: int = 2):
+        """Initialize the prober for a ModelManager"""
+        self.manager = manager
+        self.interval = interval
+        self.timeout = timeout
+        self.prompt = prompt
+        self.unhealthy_after = unhealthy_after
+        
+        self.snapshot: Dict[str, Any] = {'models': {}, 'probed_at': None, 'rounds': 0}
+        self._failures: Dict[str, int] = {}
+        self._task: Optional[asyncio.Future] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self):
+        """Start probing in the background (no-op if already running)"""
+        with self._lock:
+            if self.running:
+                return
+            self._task = async_bridge.submit(self._run())
+        logger.info(f"Model health prober started (interval {self.interval}s)")
+    
+    def stop(self):
+        """Stop background probing"""
+        with self._lock:
+            if self._task is not None:
+                self._task.cancel()
+                self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.error(f"Error probing model health: {str(e)}")
+            await asyncio.sleep(self.interval)
+    
+    async def _probe(self, model_name: str) -> Dict[str, Any]:
+        """Probe one model and describe the outcome"""
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self.manager.aprobe_model(model_name, self.prompt), self.timeout)
+            self._failures[model_name] = 0
+            return {
+                'status': 'healthy',
+                'latency_seconds': round(time.monotonic() - started, 4),
+                'error': None
+            }
+        except Exception as e:
+            failures = self._failures.get(model_name, 0) + 1
+            self._failures[model_name] = failures
+            error = f"Probe timed out after {self.timeout}s" if isinstance(e, asyncio.TimeoutError) else str(e)
+            return {
+                'status': 'unhealthy' if failures >= self.unhealthy_after else 'degraded',
+                'latency_seconds': round(time.monotonic() - started, 4),
+                'error': error,
+                'consecutive_failures': failures
+            }
+    
+    async def probe_all(self) -> Dict[str, Any]:
+        """Probe every configured model concurrently and publish a new snapshot"""
+        models = self.manager.models
+        # A model without credentials could only fail; the local model needs none
+        names = [name for name, config in models.items() if config.api_key or config.provider.value == 'local']
+        results = await asyncio.gather(*[self._probe(name) for name in names])
+        
+        checked_at = datetime.utcnow().isoformat()
+        snapshot = {
+            'models': {
+                name: {
+                    'model': name,
+                    'provider': models[name].provider.value,
+                    'checked_at': checked_at,
+                    **result
+                }
+                for name, result in zip(names, results)
+            },
+            'probed_at': checked_at,
+            'rounds': self.snapshot['rounds'] + 1
+        }
+        self.snapshot = snapshot
+        return snapshot
+    
+    def probe_now(self) -> Dict[str, Any]:
+        """Run one probe round immediately and wait for it"""
+        return async_bridge.run(self.probe_all())
+    
+    def is_healthy(self, model_name: str) -> bool:
+        """Check a model against the latest snapshot (unprobed models count as healthy)"""
+        entry = self.snapshot['models'].get(model_name)
+        return entry is None or entry['status'] != 'unhealthy'
+    
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Get the latest published snapshot"""
+        return self.snapshot
+
+def create_health_prober(manager) -> HealthProber:
+    """Create the prober from environment variables"""
+    return HealthProber(
+        manager,
+        interval=float(os.getenv('MODEL_HEALTH_INTERVAL', '60')),
+        timeout=float(os.getenv('MODEL_HEALTH_TIMEOUT', '15')),
+        unhealthy_after=int(os.getenv('MODEL_HEALTH_UNHEALTHY_AFTER', '2'))
+    )
@@ -0,0 +1,429 @@
+"""
+Job Queue - Persistent queue for long-running generation requests
+Requests are stored in SQLite and run by a pool of generation workers, so web workers only enqueue and report
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+from .deadline import Deadline, create_deadline
+from .scheduler import priority_rank
+from .storage import get_data_path
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+# handler(payload, on_event=..., deadline=...) -> result dict with a 'success' flag
+JobHandler = Callable[..., Dict[str, Any]]
+
+# High-frequency events that are delivered to live streams only and never stored
+UNRECORDED_EVENTS = ('token',)
+
+class JobStore:
+    """
+    SQLite-backed job and event storage
+    
+    Jobs are claimed inside an immediate transaction, so several worker
+    threads or processes can share one database file. A claimed job holds a
+    lease that its worker renews; a job whose lease ran out (its worker died
+    or the server restarted) is claimed again.
+    """
+    
+    def __init__(self, path: str):
+        """Open (or create) the job database"""
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "cancel_requested INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_expires_at REAL, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if 'priority' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 1")
+        self._conn.execute("DROP INDEX IF EXISTS jobs_status")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority, created_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_events ("
+            "job_id TEXT NOT NULL, seq INTEGER NOT NULL, event TEXT NOT NULL, data TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (job_id, seq))"
+        )
+    
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+    
+    def _query(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            cursor.row_factory = sqlite3.Row
+            return cursor.fetchall()
+    
+    def add(self, kind: str, payload: Dict[str, Any], priority: int = 1) -> str:
+        """Store a new queued job and return its id"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, priority, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload, ensure_ascii=False, default=str), QUEUED, priority, time.time())
+            )
+        return job_id
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by id"""
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._row_to_job(rows[0]) if rows else None
+    
+    def claim(self, worker: str, kinds: List[str], lease_seconds: float,
+              max_attempts: int) -> Optional[Dict[str, Any]]:
+        """Claim the most urgent (lowest priority rank), then oldest, runnable job of one of the given kinds"""
+        if not kinds:
+            return None
+        
+        now = time.time()
+        placeholders = ', '.join('?' for _ in kinds)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker stopped renewing the lease too often are given up on
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                    "WHERE status = ? AND lease_expires_at < ? AND attempts >= ?",
+                    (FAILED, 'Worker lost while running the job', now, RUNNING, now, max_attempts)
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ? "
+                    "WHERE status = ? AND lease_expires_at < ? AND cancel_requested = 1",
+                    (CANCELLED, now, RUNNING, now)
+                )
+                cursor = self._conn.execute(
+                    f"SELECT * FROM jobs WHERE kind IN ({placeholders}) AND cancel_requested = 0 "
+                    f"AND (status = ? OR (status = ? AND lease_expires_at < ?)) "
+                    f"ORDER BY priority, created_at LIMIT 1",
+                    (*kinds, QUEUED, RUNNING, now)
+                )
+                cursor.row_factory = sqlite3.Row
+                row = cursor.fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, "
+                    "lease_expires_at = ?, started_at = ? WHERE id = ?",
+                    (RUNNING, worker, now + lease_seconds, now, row['id'])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        
+        job = self._row_to_job(row)
+        if job['status'] == RUNNING:
+            logger.warning(f"Reclaiming job {job['id']} after its lease expired (worker {job['worker']})")
+        job.update({'status': RUNNING, 'worker': worker, 'attempts': job['attempts'] + 1})
+        return job
+    
+    def renew(self, job_ids: List[str], worker: str, lease_seconds: float) -> List[str]:
+        """Extend the leases of running jobs; returns the ids whose cancellation was requested"""
+        if not job_ids:
+            return []
+        
+        placeholders = ', '.join('?' for _ in job_ids)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET lease_expires_at = ? WHERE worker = ? AND status = ? AND id IN ({placeholders})",
+                (time.time() + lease_seconds, worker, RUNNING, *job_ids)
+            )
+        rows = self._query(
+            f"SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({placeholders})", tuple(job_ids)
+        )
+        return [row['id'] for row in rows]
+    
+    def finish(self, job_id: str, worker: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> bool:
+        """Record the outcome of a job; returns False if the worker no longer held its lease"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires_at = NULL "
+                "WHERE id = ? AND status = ? AND worker = ? AND lease_expires_at > ?",
+                (status, json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                 error, now, job_id, RUNNING, worker, now)
+            )
+            return cursor.rowcount == 1
+    
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a queued job now or flag a running one; returns the job's status afterwards"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, cancel_requested = 1, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)
+            )
+            self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING)
+            )
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+    
+    def add_event(self, job_id: str, event: str, data: Dict[str, Any]):
+        """Append a progress event to a job"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO job_events (job_id, seq, event, data, created_at) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM job_events WHERE job_id = ?",
+                (job_id, event, json.dumps(data, ensure_ascii=False, default=str), time.time(), job_id)
+            )
+    
+    def events(self, job_id: str, after: int = 0) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Get a job's events with a sequence number above after"""
+        rows = self._query(
+            "SELECT seq, event, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (job_id, after)
+        )
+        return [(row['seq'], row['event'], json.loads(row['data'])) for row in rows]
+    
+    def last_event(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the most recent event of a job"""
+        rows = self._query(
+            "SELECT seq, event, data, created_at FROM job_events WHERE job_id = ? ORDER BY seq DESC LIMIT 1",
+            (job_id,)
+        )
+        if not rows:
+            return None
+        return {'seq': rows[0]['seq'], 'event': rows[0]['event'], 'data': json.loads(rows[0]['data']),
+                'created_at': rows[0]['created_at']}
+    
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        rows = self._query("SELECT status, COUNT(*) AS jobs FROM jobs GROUP BY status")
+        return {row['status']: row['jobs'] for row in rows}
+    
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs (and their events) that finished before a timestamp"""
+        statuses = ', '.join('?' for _ in TERMINAL_STATUSES)
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM job_events WHERE job_id IN "
+                f"(SELECT id FROM jobs WHERE status IN ({statuses}) AND finished_at < ?)",
+                (*TERMINAL_STATUSES, older_than)
+            )
+            cursor = self._conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({statuses}) AND finished_at < ?",
+                (*TERMINAL_STATUSES, older_than)
+            )
+            return cursor.rowcount
+
+class JobQueue:
+    """
+    Queue of generation jobs with a pool of worker threads
+    
+    submit() only writes the job to the store, so it returns immediately.
+    Worker threads claim jobs in priority class order (the payload's
+    "priority"), oldest first within a class, run the handler registered
+    for the job's kind with an on_event callback and a fresh deadline (the
+    time budget starts when a worker picks the job up), and store the
+    result. Progress events
+    are stored with the job so clients can poll or follow them, from any
+    process that shares the database.
+    
+    The workers can run inside the web process or, with JOB_WORKERS=0 there,
+    in separate worker processes (src/worker.py) so web workers never hold a
+    generation.
+    """
+    
+    def __init__(self, store: JobStore, workers: int = 4, lease_seconds: float = 60.0,
+                 max_attempts: int = 3, poll_interval: float = 1.0, retention_seconds: float = 7 * 86400):
+        """Initialize the queue; call start() to run workers"""
+        self.store = store
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        
+        self.handlers: Dict[str, JobHandler] = {}
+        self._running: Dict[str, Deadline] = {}
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._wakeup = threading.Condition()
+        self._lock = threading.Lock()
+    
+    @property
+    def started(self) -> bool:
+        return bool(self._threads)
+    
+    def register(self, kind: str, handler: JobHandler):
+        """Register the function that runs jobs of a kind"""
+        self.handlers[kind] = handler
+    
+    def submit(self, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a job and return it"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        
+        job_id = self.store.add(kind, payload, priority_rank(payload.get('priority')))
+        with self._wakeup:
+            self._wakeup.notify()
+        logger.info(f"Queued {kind} job {job_id}")
+        return self.store.get(job_id)
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job with its latest progress event"""
+        job = self.store.get(job_id)
+        if job is not None:
+            job['last_event'] = self.store.last_event(job_id)
+        return job
+    
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a job; a running job stops at its next cancellation point"""
+        status = self.store.request_cancel(job_id)
+        deadline = self._running.get(job_id)
+        if deadline is not None:
+            deadline.cancel('job cancelled')
+        return status
+    
+    def start(self):
+        """Start the worker threads and the lease renewal thread (no-op if running or workers=0)"""
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return
+            
+            try:
+                purged = self.store.purge(time.time() - self.retention_seconds)
+                if purged:
+                    logger.info(f"Purged {purged} finished jobs")
+            except Exception as e:
+                logger.error(f"Could not purge old jobs: {str(e)}")
+            
+            self._stopping.clear()
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._renew_leases, name='job-leases', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Job queue started with {self.workers} workers ({self.store.path})")
+    
+    def stop(self, timeout: Optional[float] = None):
+        """Stop claiming jobs and wait for running ones to finish"""
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+    
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                job = self.store.claim(self.worker_id, list(self.handlers), self.lease_seconds, self.max_attempts)
+            except Exception as e:
+                logger.error(f"Could not claim a job: {str(e)}")
+                job = None
+            
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            self._run(job)
+    
+    def _run(self, job: Dict[str, Any]):
+        job_id = job['id']
+        deadline = create_deadline(job['payload'].get('timeout'))
+        self._running[job_id] = deadline
+        
+        def on_event(event: str, data: Dict[str, Any]):
+            if event in UNRECORDED_EVENTS:
+                return
+            try:
+                self.store.add_event(job_id, event, data)
+            except Exception as e:
+                logger.error(f"Could not record event for job {job_id}: {str(e)}")
+        
+        logger.info(f"Running {job['kind']} job {job_id} (attempt {job['attempts']})")
+        try:
+            result = self.handlers[job['kind']](job['payload'], on_event=on_event, deadline=deadline)
+            if deadline.cancelled:
+                status = CANCELLED
+            else:
+                status = SUCCEEDED if result.get('success') else FAILED
+            error = result.get('error')
+        except Exception as e:
+            logger.error(f"Error in job {job_id}: {str(e)}")
+            status, result, error = CANCELLED if deadline.cancelled else FAILED, None, str(e)
+        
+        try:
+            # The lease may have expired and the job been reclaimed by another worker, whose outcome wins
+            if not self.store.finish(job_id, self.worker_id, status, result=result, error=error):
+                logger.warning(f"Discarding the {status} outcome of job {job_id}: worker {self.worker_id} "
+                               f"no longer holds its lease")
+        except Exception as e:
+            logger.error(f"Could not record the outcome of job {job_id}: {str(e)}")
+        finally:
+            self._running.pop(job_id, None)
+    
+    def _renew_leases(self):
+        while not self._stopping.wait(self.lease_seconds / 3):
+            running = dict(self._running)
+            try:
+                cancelled = self.store.renew(list(running), self.worker_id, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Could not renew job leases: {str(e)}")
+                continue
+            
+            # Cancellation requested through another process
+            for job_id in cancelled:
+                deadline = running.get(job_id)
+                if deadline is not None:
+                    deadline.cancel('job cancelled')
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get job counts per status and worker settings"""
+        return {
+            'jobs': self.store.counts(),
+            'workers': self.workers if self.started else 0,
+            'running_here': len(self._running),
+            'kinds': sorted(self.handlers),
+            'lease_seconds': self.lease_seconds,
+            'max_attempts': self.max_attempts,
+            'path': self.store.path
+        }
+
+def create_job_queue() -> JobQueue:
+    """Create the job queue from environment variables"""
+    path = os.getenv('JOB_QUEUE_PATH') or get_data_path('jobs.sqlite')
+    return JobQueue(
+        JobStore(path),
+        workers=int(os.getenv('JOB_WORKERS', '4')),
+        lease_seconds=float(os.getenv('JOB_LEASE_SECONDS', '60')),
+        max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', '3')),
+        poll_interval=float(os.getenv('JOB_POLL_INTERVAL', '1.0')),
+        retention_seconds=float(os.getenv('JOB_RETENTION_DAYS', '7')) * 86400
+    )
+
+# Global job queue instance
+job_queue = create_job_queue()
@@ -0,0 +1,294 @@
+"""
+Local Provider - Deterministic offline LLM for ModelProvider.LOCAL
+Serves recorded or synthetic responses through an OpenAI-compatible client with simulated timing
+"""
+
+import os
+import json
+import time
+import types
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class LocalProviderError(Exception):
+    """Injected provider failure carrying an HTTP status code like the real SDK errors"""
+    
+    def __init__(self, status_code: int, message: str = "Injected local provider failure"):
+        super().__init__(f"{message} (status {status_code})")
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(headers={'retry-after': '1'} if status_code == 429 else {})
+
+class LocalSettings:
+    """Timing, failure and content settings of the local model"""
+    
+    # Settings that may be overridden per model through /configure (not the responses file)
+    TUNABLE = ('latency', 'jitter', 'tokens_per_second', 'failure_rate', 'failure_status', 'seed',
+               'response_tokens')
+    
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, tokens_per_second: float = 50.0,
+                 failure_rate: float = 0.0, failure_status: int = 500, seed: int = 0,
+                 response_tokens: int = 400, responses_path: Optional[str] = None):
+        """
+        Args:
+            latency: Seconds until the first token
+            jitter: Random +/- fraction applied to the latency
+            tokens_per_second: Output rate after the first token (0 = instant)
+            failure_rate: Share of calls that fail with failure_status
+            failure_status: HTTP status of injected failures (429 exercises rate limiting)
+            seed: Seed that makes timing, failures and synthetic text reproducible
+            response_tokens: Approximate length of synthetic responses
+            responses_path: JSON file of recorded responses ({"prompt": "response"}
+                or ["response", ...]) served instead of synthetic text
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.seed = seed
+        self.response_tokens = response_tokens
+        self.responses_path = responses_path
+    
+    @classmethod
+    def from_env(cls, **overrides) -> 'LocalSettings':
+        """Read settings from LOCAL_LLM_* variables; overrides (e.g. from /configure) win"""
+        settings = cls(
+            latency=float(os.getenv('LOCAL_LLM_LATENCY', '0.5')),
+            jitter=float(os.getenv('LOCAL_LLM_JITTER', '0.2')),
+            tokens_per_second=float(os.getenv('LOCAL_LLM_TOKENS_PER_SECOND', '50')),
+            failure_rate=float(os.getenv('LOCAL_LLM_FAILURE_RATE', '0')),
+            failure_status=int(os.getenv('LOCAL_LLM_FAILURE_STATUS', '500')),
+            seed=int(os.getenv('LOCAL_LLM_SEED', '0')),
+            response_tokens=int(os.getenv('LOCAL_LLM_RESPONSE_TOKENS', '400')),
+            responses_path=os.getenv('LOCAL_LLM_RESPONSES')
+        )
+        for key, value in overrides.items():
+            if hasattr(settings, key):
+                current = getattr(settings, key)
+                setattr(settings, key, value if current is None else type(current)(value))
+        return settings
+
+class LocalCall:
+    """The planned behaviour of one call: when it fails, how long it waits, what it says"""
+    
+    def __init__(self, first_token_delay: float, chunk_delay: float, chunks: List[str],
+                 error: Optional[LocalProviderError]):
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.error = error
+    
+    @property
+    def text(self) -> str:
+        return ''.join(self.chunks)
+    
+    @property
+    def total_delay(self) -> float:
+        return self.first_token_delay + self.chunk_delay * max(0, len(self.chunks) - 1)
+
+class LocalModel:
+    """
+    Deterministic response generator shared by the sync and async clients
+    
+    Every call is planned from a random generator seeded with the seed, the
+    prompt and how many times that prompt was seen before, so a replayed
+    workload gets the same latencies, failures and text regardless of how
+    concurrent calls interleave. Occurrences are remembered for the
+    SEEN_PROMPTS most recently used prompts only.
+    """
+    
+    CHUNK_TOKENS = 4
+    SEEN_PROMPTS = 10000
+    
+    def __init__(self, settings: LocalSettings):
+        """Initialize the model and load recorded responses if configured"""
+        self.settings = settings
+        self.recorded = self._load_recorded(settings.responses_path)
+        self._seen: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _load_recorded(path: Optional[str]):
+        if not path:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Could not load local responses from {path}: {str(e)}")
+            return None
+    
+    def plan(self, prompt: str, max_tokens: Optional[int] = None) -> LocalCall:
+        """Decide the outcome of one call"""
+        prompt_key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        with self._lock:
+            occurrence = self._seen.pop(prompt_key, 0)
+            self._seen[prompt_key] = occurrence + 1
+            if len(self._seen) > self.SEEN_PROMPTS:
+                self._seen.popitem(last=False)
+        
+        digest = hashlib.sha256(f"{self.settings.seed}:{occurrence}:{prompt}".encode('utf-8')).digest()
+        rng = random.Random(digest)
+        settings = self.settings
+        
+        first_token_delay = max(0.0, settings.latency * (1 + rng.uniform(-settings.jitter, settings.jitter)))
+        if rng.random() < settings.failure_rate:
+            return LocalCall(first_token_delay, 0.0, [], LocalProviderError(settings.failure_status))
+        
+        text = self._response_text(prompt, rng)
+        chunk_chars = self.CHUNK_TOKENS * 4
+        if max_tokens:
+            text = text[:max_tokens * 4]
+        chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or ['']
+        chunk_delay = self.CHUNK_TOKENS / settings.tokens_per_second if settings.tokens_per_second > 0 else 0.0
+        return LocalCall(first_token_delay, chunk_delay, chunks, None)
+    
+    def _response_text(self, prompt: str, rng: random.Random) -> str:
+        """Pick a recorded response, or synthesize one shaped like the prompt asks"""
+        if isinstance(self.recorded, dict) and prompt in self.recorded:
+            return self.recorded[prompt]
+        if isinstance(self.recorded, list) and self.recorded:
+            return self.recorded[rng.randrange(len(self.recorded))]
+        
+        words = ['widget', 'state', 'repository', 'service', 'model', 'screen', 'provider', 'stream']
+        if 'JSON' in prompt or 'json' in prompt:
+            return json.dumps({
+                'name': f"local_app_{rng.randrange(10000)}",
+                'description': 'Synthetic project generated by the local provider',
+                'features': rng.sample(words, 3),
+                'screens': ['home', 'details', 'settings'],
+                'data_models': ['User', 'Item'],
+                'apis': ['/api/items', '/api/users'],
+                'auth_required': True,
+                'file_upload': False,
+                'real_time': False
+            }, indent=2)
+        
+        lines = []
+        target_chars = self.settings.response_tokens * 4
+        while sum(len(line) + 1 for line in lines) < target_chars:
+            lines.append(f"  // {' '.join(rng.choice(words) for _ in range(8))}")
+        return "```dart\nvoid main() {\n" + "\n".join(lines) + "\n}\n```\n"
+
+def _message_response(model: str, call: LocalCall, prompt: str):
+    """Build a ChatCompletion-shaped response object"""
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(call.text) // 4
+    return types.SimpleNamespace(
+        model=model,
+        choices=[types.SimpleNamespace(
+            index=0,
+            finish_reason='stop',
+            message=types.SimpleNamespace(role='assistant', content=call.text)
+        )],
+        usage=types.SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens
+        )
+    )
+
+def _chunk(text: str):
+    """Build a ChatCompletionChunk-shaped object"""
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(
+        index=0, delta=types.SimpleNamespace(content=text), finish_reason=None
+    )])
+
+class LocalStream:
+    """
+    Chunk stream usable with both for and async for
+    
+    Like SDK streams it exposes the underlying response as .response, whose
+    close() ends the stream, so deadline cancellation works the same way.
+    """
+    
+    def __init__(self, call: LocalCall):
+        self.call = call
+        self.closed = False
+        self.response = self
+    
+    def close(self):
+        self.closed = True
+    
+    async def aclose(self):
+        self.closed = True
+    
+    def __iter__(self):
+        for index, text in enumerate(self.call.chunks):
+            if index:
+                time.sleep(self.call.chunk_delay)
+            if self.closed:
+                return
+            yield _chunk(text)
+    
+    async def __aiter__(self):
+        for index, text in enumerate(self.call.chunks):
+            if index:
+                await asyncio.sleep(self.call.chunk_delay)
+            if self.closed:
+                return
+            yield _chunk(text)
+
+def _prompt_of(messages: List[Dict[str, Any]]) -> str:
+    return "\n".join(str(message.get('content', '')) for message in messages)
+
+class _Completions:
+    def __init__(self, model: LocalModel):
+        self._model = model
+    
+    def create(self, model: str, messages: List[Dict[str, Any]], stream: bool = False,
+               max_tokens: Optional[int] = None, timeout: Optional[float] = None, **kwargs):
+        prompt = _prompt_of(messages)
+        call = self._model.plan(prompt, max_tokens)
+        if timeout is not None and call.first_token_delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Local provider timed out after {timeout}s")
+        
+        time.sleep(call.first_token_delay)
+        if call.error is not None:
+            raise call.error
+        
+        if stream:
+            return LocalStream(call)
+        
+        time.sleep(call.total_delay - call.first_token_delay)
+        return _message_response(model, call, prompt)
+
+class _AsyncCompletions:
+    def __init__(self, model: LocalModel):
+        self._model = model
+    
+    async def create(self, model: str, messages: List[Dict[str, Any]], stream: bool = False,
+                     max_tokens: Optional[int] = None, timeout: Optional[float] = None, **kwargs):
+        prompt = _prompt_of(messages)
+        call = self._model.plan(prompt, max_tokens)
+        if timeout is not None and call.first_token_delay > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError(f"Local provider timed out after {timeout}s")
+        
+        await asyncio.sleep(call.first_token_delay)
+        if call.error is not None:
+            raise call.error
+        
+        if stream:
+            return LocalStream(call)
+        
+        await asyncio.sleep(call.total_delay - call.first_token_delay)
+        return _message_response(model, call, prompt)
+
+class LocalClient:
+    """Offline stand-in for the OpenAI client (client.chat.completions.create)"""
+    
+    def __init__(self, settings: Optional[LocalSettings] = None, use_async: bool = False):
+        """Initialize the client"""
+        self.settings = settings or LocalSettings.from_env()
+        self.model = LocalModel(self.settings)
+        completions = _AsyncCompletions(self.model) if use_async else _Completions(self.model)
+        self.chat = types.SimpleNamespace(completions=completions)
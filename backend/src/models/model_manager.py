@@ -4,11 +4,27 @@ Supports OpenAI, DeepSeek, Claude, and other AI models
 """
 
 import os
+import time
+import asyncio
 import logging
-from typing import Dict, Any, Optional, List
+import threading
+from typing import Dict, Any, Optional, List, Iterator, AsyncIterator, Callable
 from enum import Enum
+from dataclasses import dataclass
+from contextlib import contextmanager
 import json
 
+from .async_bridge import async_bridge
+from .response_cache import create_response_cache
+from .model_router import AUTO_MODEL, create_model_router
+from .circuit_breaker import CircuitOpenError, create_circuit_breakers, parse_model_fallbacks
+from .rate_limiter import create_rate_limiter
+from .deadline import Deadline, DeadlineExceeded
+from .health_prober import create_health_prober
+from .local_provider import LocalClient, LocalSettings
+from .cassette import create_cassette, CassetteMissError
+from .token_budget import create_token_budget, PromptTooLongError
+
 logger = logging.getLogger(__name__)
 
 class ModelProvider(Enum):
@@ -22,6 +38,10 @@ class ModelProvider(Enum):
 class ModelConfig:
     """Configuration for AI models"""
     
+    # Fields and extra params that may be changed at runtime through configure_model()
+    TUNABLE_FIELDS = ('temperature', 'max_tokens')
+    TUNABLE_PARAMS = ('context_window',)
+    
     def __init__(self, provider: ModelProvider, model_name: str, api_key: str, 
                  base_url: Optional[str] = None, max_tokens: int = 4000,
                  temperature: float = 0.7, **kwargs):
@@ -33,6 +53,48 @@ class ModelConfig:
         self.temperature = temperature
         self.extra_params = kwargs
 
+    def replace(self, **changes) -> 'ModelConfig':
+        """
+        Return a copy with the given fields changed
+        
+        Configurations are treated as immutable snapshots: updates build a new
+        ModelConfig instead of mutating one that in-flight requests may hold.
+        """
+        extra_params = dict(self.extra_params)
+        extra_params.update(changes.pop('extra_params', {}))
+        
+        values = {
+            'provider': self.provider,
+            'model_name': self.model_name,
+            'api_key': self.api_key,
+            'base_url': self.base_url,
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature,
+            **changes
+        }
+        return ModelConfig(**values, **extra_params)
+
+@dataclass(frozen=True)
+class GenerationContext:
+    """
+    Immutable per-request model selection
+    
+    Carries the model name and the ModelConfig snapshot taken when the request
+    started, so concurrent requests never observe each other's model choice or
+    a configuration change halfway through a pipeline. Requests for the "auto"
+    model carry a routing_group instead of a config, and every call within the
+    request is routed to the best model of that group. The optional deadline
+    bounds every provider call made for the request and cancels them when the
+    client goes away. Priority class and tenant decide the order in which the
+    generation scheduler runs the request's stages.
+    """
+    model_name: str
+    config: Optional[ModelConfig]
+    routing_group: Optional[str] = None
+    deadline: Optional[Deadline] = None
+    priority: str = 'standard'
+    tenant: str = 'default'
+
 class ModelManager:
     """
     Manages multiple AI models and provides unified interface
@@ -41,8 +103,65 @@ class ModelManager:
     
     def __init__(self):
         """Initialize Model Manager with available models"""
+        # Copy-on-write registry: writers swap in a new dict, readers never lock
         self.models: Dict[str, ModelConfig] = {}
         self.current_model = None
+        self._config_lock = threading.Lock()
+        
+        # Long-lived provider clients, built once per model and shared by all threads
+        self._clients: Dict[str, Any] = {}
+        self._async_clients: Dict[str, Any] = {}
+        self._client_lock = threading.Lock()
+        
+        # Per-provider limits on concurrent async calls (MODEL_CONCURRENCY_<PROVIDER>)
+        self.concurrency_limits: Dict[ModelProvider, int] = {
+            provider: int(os.getenv(f'MODEL_CONCURRENCY_{provider.name}', '64'))
+            for provider in ModelProvider
+        }
+        self._semaphores: Dict[ModelProvider, asyncio.Semaphore] = {}
+        
+        # Default number of prompts a batch keeps in flight at once
+        self.batch_concurrency = int(os.getenv('BATCH_MAX_CONCURRENCY', '16'))
+        
+        # Client-side pacing (requests/min, tokens/min, AIMD concurrency) shared by sync and async calls
+        self.rate_limiters = {
+            provider: create_rate_limiter(provider.name, self.concurrency_limits[provider])
+            for provider in ModelProvider
+        }
+        
+        # Content-addressed cache of completed responses
+        self.response_cache = create_response_cache()
+        
+        # Record/replay of provider calls for offline, reproducible benchmarks
+        self.cassette = create_cassette()
+        
+        # Local token counting: max_tokens sized to each model's context window
+        self.token_budget = create_token_budget()
+        
+        # Provider-side prompt prefix caching: system prompts go first and are
+        # marked cacheable on Claude; cached input tokens are counted per model
+        self.prompt_caching = os.getenv('PROMPT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        self.prompt_cache_stats: Dict[str, Dict[str, int]] = {}
+        self._usage_lock = threading.Lock()
+        
+        # Live latency statistics used to route the "auto" model
+        self.router = create_model_router()
+        
+        # Hedged completions: a backup model races the primary when its first
+        # token is slower than this percentile of its own history
+        self.hedge_percentile = float(os.getenv('HEDGE_PERCENTILE', '0.95'))
+        self.hedge_default_delay = float(os.getenv('HEDGE_DEFAULT_DELAY', '8'))
+        self.hedge_model = os.getenv('HEDGE_MODEL')
+        self.hedge_stats = {'requests': 0, 'hedged': 0, 'hedge_wins': 0}
+        
+        # Per-model circuit breakers; calls to a model whose breaker is open go
+        # straight to its fallback model (MODEL_FALLBACKS) instead of waiting it out
+        self.breakers = create_circuit_breakers()
+        self.fallbacks: Dict[str, str] = parse_model_fallbacks(os.getenv('MODEL_FALLBACKS', ''))
+        
+        # Background health checks; started by the app, read by /health and routing
+        self.health_prober = create_health_prober(self)
+        
         self.load_model_configurations()
         
     def load_model_configurations(self):
@@ -114,9 +233,23 @@ class ModelManager:
                 temperature=0.7
             ))
         
+        # Local Model (offline, deterministic; for development and load testing)
+        if os.getenv('LOCAL_LLM_ENABLED', 'false').lower() in ('1', 'true', 'yes'):
+            self.add_model("local", ModelConfig(
+                provider=ModelProvider.LOCAL,
+                model_name="local",
+                api_key="",
+                max_tokens=4000,
+                temperature=0.7
+            ))
+        
         # Set default model
         if self.models:
-            self.current_model = list(self.models.keys())[0]
+            default_model = os.getenv('DEFAULT_MODEL')
+            if default_model and (default_model in self.models or self.is_auto_model(default_model)):
+                self.current_model = default_model
+            else:
+                self.current_model = list(self.models.keys())[0]
             logger.info(f"Model Manager initialized with {len(self.models)} models")
             logger.info(f"Default model: {self.current_model}")
         else:
@@ -124,12 +257,111 @@ class ModelManager:
     
     def add_model(self, name: str, config: ModelConfig):
         """Add a new model configuration"""
-        self.models[name] = config
+        with self._config_lock:
+            models = dict(self.models)
+            models[name] = config
+            self.models = models
+        self.invalidate_client(name)
         logger.info(f"Added model: {name} ({config.provider.value})")
     
+    def configure_model(self, model_name: str, **params) -> ModelConfig:
+        """
+        Update a model's tuning parameters and rebuild its client on next use
+        
+        Only the sampling fields, the context window used by the token budget
+        and (for the local model) its simulation settings can be changed; the
+        provider, endpoint and credentials come from the environment, so any
+        other parameter raises ValueError. A new configuration snapshot
+        replaces the old one; requests already running keep the snapshot they
+        started with.
+        """
+        with self._config_lock:
+            if model_name not in self.models:
+                raise ValueError(f"Model not available: {model_name}")
+            current = self.models[model_name]
+            
+            tunable = ModelConfig.TUNABLE_FIELDS + ModelConfig.TUNABLE_PARAMS
+            if current.provider == ModelProvider.LOCAL:
+                tunable += LocalSettings.TUNABLE
+            unknown = sorted(set(params) - set(tunable))
+            if unknown:
+                raise ValueError(f"Cannot configure {', '.join(unknown)}; "
+                                 f"configurable parameters: {', '.join(tunable)}")
+            
+            changes = {}
+            if 'temperature' in params:
+                changes['temperature'] = float(params['temperature'])
+            if 'max_tokens' in params:
+                changes['max_tokens'] = int(params['max_tokens'])
+            extra_params = {key: value for key, value in params.items() if key not in ModelConfig.TUNABLE_FIELDS}
+            if 'context_window' in extra_params:
+                extra_params['context_window'] = int(extra_params['context_window'])
+            
+            config = current.replace(extra_params=extra_params, **changes)
+            if config.provider == ModelProvider.LOCAL:
+                # Raises ValueError for values of the wrong type
+                self._local_settings(config)
+            
+            models = dict(self.models)
+            models[model_name] = config
+            self.models = models
+        
+        self.invalidate_client(model_name)
+        logger.info(f"Configured model: {model_name}")
+        return config
+    
+    def create_context(self, model_name: Optional[str] = None, fallback: bool = False,
+                       deadline: Optional[Deadline] = None, priority: Optional[str] = None,
+                       tenant: Optional[str] = None) -> GenerationContext:
+        """
+        Snapshot the model selection for one request (the current model by default)
+        
+        With fallback=True an unknown model_name falls back to the current model
+        instead of raising.
+        """
+        scheduling = {'priority': priority or 'standard', 'tenant': tenant or 'default'}
+        models = self.models
+        if fallback and model_name and model_name not in models:
+            logger.warning(f"Model {model_name} not available, using current model")
+            model_name = None
+        
+        target_model = model_name or self.current_model
+        if self.is_auto_model(target_model):
+            routing_group = target_model.split(':', 1)[1] if ':' in target_model else 'default'
+            self.get_routing_candidates(routing_group)  # Validate the group up front
+            return GenerationContext(model_name=target_model, config=None, routing_group=routing_group,
+                                     deadline=deadline, **scheduling)
+        
+        if not target_model or target_model not in models:
+            raise ValueError(f"Model not available: {target_model}")
+        
+        return GenerationContext(model_name=target_model, config=models[target_model], deadline=deadline,
+                                 **scheduling)
+    
+    def _resolve_model(self, model_name: Optional[str] = None,
+                       context: Optional[GenerationContext] = None):
+        """Get (model name, config snapshot) from a request context or the registry"""
+        if context is not None:
+            if context.routing_group is None:
+                return context.model_name, context.config
+            model_name = self._route(context.routing_group)
+        
+        target_model = model_name or self.current_model
+        if not target_model:
+            raise ValueError("No model available")
+        
+        if self.is_auto_model(target_model):
+            target_model = self._route(target_model.split(':', 1)[1] if ':' in target_model else None)
+        
+        config = self.models.get(target_model)
+        if config is None:
+            raise ValueError(f"Model not available: {target_model}")
+        
+        return target_model, config
+    
     def switch_model(self, model_name: str) -> bool:
-        """Switch to a different model"""
-        if model_name in self.models:
+        """Switch to a different model (or to "auto" / "auto:<group>" routing)"""
+        if model_name in self.models or self.is_auto_model(model_name):
             self.current_model = model_name
             logger.info(f"Switched to model: {model_name}")
             return True
@@ -138,11 +370,94 @@ class ModelManager:
             return False
     
     def get_current_model(self) -> Optional[ModelConfig]:
-        """Get current model configuration"""
+        """Get current model configuration (None while routing automatically)"""
         if self.current_model:
-            return self.models[self.current_model]
+            return self.models.get(self.current_model)
         return None
     
+    @staticmethod
+    def is_auto_model(model_name: Optional[str]) -> bool:
+        """Check whether a model name asks for latency-aware routing"""
+        return bool(model_name) and (model_name == AUTO_MODEL or model_name.startswith(f"{AUTO_MODEL}:"))
+    
+    def get_routing_candidates(self, routing_group: Optional[str] = None) -> List[str]:
+        """Get the configured models a routing group may use (all models by default)"""
+        models = self.models
+        if not routing_group or routing_group == 'default':
+            return list(models.keys())
+        
+        if routing_group not in self.router.groups:
+            raise ValueError(f"Unknown routing group: {routing_group}")
+        return [name for name in self.router.groups[routing_group] if name in models]
+    
+    def _route(self, routing_group: Optional[str] = None) -> str:
+        """Pick the best model of a routing group from live statistics"""
+        candidates = self.get_routing_candidates(routing_group)
+        if not candidates:
+            raise ValueError(f"No models available in routing group: {routing_group or 'default'}")
+        
+        # Skip models whose breaker is open or that fail health probes, unless that leaves nothing
+        healthy = [
+            name for name in candidates
+            if self.breakers.is_available(name) and self.health_prober.is_healthy(name)
+        ]
+        return self.router.choose(healthy or candidates)
+    
+    def _admit(self, target_model: str, config: ModelConfig):
+        """
+        Pass a call through the model's circuit breaker
+        
+        Returns the (model name, config) to call: the requested model while its
+        breaker allows calls, otherwise the first fallback in its MODEL_FALLBACKS
+        chain that does. Raises CircuitOpenError if there is none.
+        """
+        model, model_config = target_model, config
+        tried = []
+        while not self.breakers.allow(model):
+            tried.append(model)
+            fallback = self.fallbacks.get(model)
+            if not fallback or fallback in tried or fallback not in self.models:
+                raise CircuitOpenError(f"Circuit open for model {target_model} and no fallback model is available")
+            model, model_config = fallback, self.models[fallback]
+        
+        if model != target_model:
+            logger.warning(f"Circuit open for model {target_model}, failing over to {model}")
+        return model, model_config
+    
+    def set_fallback_model(self, model_name: str, fallback: Optional[str]):
+        """Set (or clear) the model that takes over while a model's breaker is open"""
+        fallbacks = dict(self.fallbacks)
+        if fallback:
+            if fallback not in self.models:
+                raise ValueError(f"Model not available: {fallback}")
+            fallbacks[model_name] = fallback
+        else:
+            fallbacks.pop(model_name, None)
+        self.fallbacks = fallbacks
+    
+    def _record_call(self, model_name: str, started: float, completion: Optional[str] = None,
+                     success: bool = True):
+        """Feed the outcome of a provider call into the router statistics and circuit breaker"""
+        latency = time.monotonic() - started
+        output_tokens = len(completion) // 4 if completion else 0
+        self.router.record(model_name, latency, output_tokens, success)
+        self.breakers.record(model_name, latency, success)
+    
+    @staticmethod
+    def _is_provider_failure(error: Exception, deadline: Optional[Deadline]) -> bool:
+        """
+        Whether a failed call counts against the model
+        
+        Running out of the request's own budget (or the client cancelling),
+        an oversized prompt, a cassette miss or an open circuit say nothing
+        about the provider's health, so they must not trip its breaker or
+        lower its routing score.
+        """
+        if isinstance(error, (DeadlineExceeded, PromptTooLongError, CassetteMissError, CircuitOpenError)):
+            return False
+        # SDK timeouts fired by the per-request timeout when the deadline ran out
+        return deadline is None or not deadline.expired
+    
     def get_available_models(self) -> List[Dict[str, Any]]:
         """Get list of available models"""
         return [
@@ -151,37 +466,172 @@ class ModelManager:
                 "provider": config.provider.value,
                 "model_name": config.model_name,
                 "max_tokens": config.max_tokens,
-                "temperature": config.temperature
+                "context_window": self.token_budget.context_window(config),
+                "temperature": config.temperature,
+                "fallback_model": self.fallbacks.get(name),
+                "circuit_breaker": self.breakers.get_state(name)
             }
             for name, config in self.models.items()
         ]
     
     def create_client(self, model_name: Optional[str] = None):
-        """Create appropriate client for the specified model"""
+        """
+        Get the pooled client for the specified model
+        
+        Clients are built on first use and reused afterwards, so every call to
+        the same model shares one HTTP connection pool. The OpenAI and Anthropic
+        clients are thread-safe and can be shared across gunicorn threads.
+        """
+        target_model = model_name or self.current_model
+        if not target_model or target_model not in self.models:
+            raise ValueError(f"Model not available: {target_model}")
+        
+        client = self._clients.get(target_model)
+        if client is not None:
+            return client
+        
+        with self._client_lock:
+            # Another thread may have built it while we were waiting
+            client = self._clients.get(target_model)
+            if client is None:
+                client = self._build_client(self.models[target_model])
+                self._clients[target_model] = client
+                logger.info(f"Created pooled client for model: {target_model}")
+        
+        return client
+    
+    def invalidate_client(self, model_name: Optional[str] = None):
+        """
+        Drop pooled clients so they are rebuilt from the current configuration
+        
+        In-flight requests keep using the old client until they finish.
+        """
+        with self._client_lock:
+            if model_name is None:
+                self._clients.clear()
+                self._async_clients.clear()
+            else:
+                self._clients.pop(model_name, None)
+                self._async_clients.pop(model_name, None)
+    
+    def _build_http_client(self, use_async: bool = False):
+        """Build a keep-alive HTTP client for OpenAI-compatible and Anthropic SDKs"""
+        import httpx
+        
+        client_class = httpx.AsyncClient if use_async else httpx.Client
+        return client_class(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv('MODEL_HTTP_MAX_CONNECTIONS', '100')),
+                max_keepalive_connections=int(os.getenv('MODEL_HTTP_MAX_KEEPALIVE', '20')),
+                keepalive_expiry=float(os.getenv('MODEL_HTTP_KEEPALIVE_EXPIRY', '300'))
+            ),
+            timeout=httpx.Timeout(float(os.getenv('MODEL_HTTP_TIMEOUT', '600')), connect=10.0)
+        )
+    
+    def create_async_client(self, model_name: Optional[str] = None):
+        """
+        Get the pooled async client for the specified model
+        
+        Async clients are only used from the async bridge loop, which owns
+        their connection pools.
+        """
         target_model = model_name or self.current_model
         if not target_model or target_model not in self.models:
             raise ValueError(f"Model not available: {target_model}")
         
-        config = self.models[target_model]
+        client = self._async_clients.get(target_model)
+        if client is not None:
+            return client
         
+        with self._client_lock:
+            client = self._async_clients.get(target_model)
+            if client is None:
+                client = self._build_async_client(self.models[target_model])
+                self._async_clients[target_model] = client
+                logger.info(f"Created pooled async client for model: {target_model}")
+        
+        return client
+    
+    def _build_async_client(self, config: ModelConfig):
+        """Build a new async client for the given model configuration"""
+        if config.provider in [ModelProvider.OPENAI, ModelProvider.DEEPSEEK]:
+            from openai import AsyncOpenAI
+            return AsyncOpenAI(
+                api_key=config.api_key,
+                base_url=config.base_url,
+                http_client=self._build_http_client(use_async=True)
+            )
+        
+        elif config.provider == ModelProvider.CLAUDE:
+            try:
+                import anthropic
+                return anthropic.AsyncAnthropic(
+                    api_key=config.api_key,
+                    http_client=self._build_http_client(use_async=True)
+                )
+            except ImportError:
+                logger.error("anthropic package not installed. Install with: pip install anthropic")
+                raise
+        
+        elif config.provider == ModelProvider.GEMINI:
+            # GenerativeModel serves both generate_content and generate_content_async
+            return self._build_client(config)
+        
+        elif config.provider == ModelProvider.LOCAL:
+            return LocalClient(self._local_settings(config), use_async=True)
+        
+        else:
+            raise ValueError(f"Unsupported provider: {config.provider}")
+    
+    @staticmethod
+    def _local_settings(config: ModelConfig) -> LocalSettings:
+        """LOCAL_LLM_* settings, overridden by the model's extra params (e.g. latency, failure_rate)"""
+        return LocalSettings.from_env(**config.extra_params)
+    
+    def set_concurrency_limit(self, provider: ModelProvider, limit: int):
+        """Set the maximum number of concurrent async calls for a provider"""
+        if limit < 1:
+            raise ValueError("Concurrency limit must be at least 1")
+        
+        self.concurrency_limits[provider] = limit
+        
+        # Recreated with the new limit on next use; calls holding the old one finish normally
+        async_bridge.loop.call_soon_threadsafe(self._semaphores.pop, provider, None)
+        logger.info(f"Concurrency limit for {provider.value}: {limit}")
+    
+    def _get_semaphore(self, provider: ModelProvider) -> asyncio.Semaphore:
+        """Get the concurrency semaphore for a provider (bridge loop only)"""
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.concurrency_limits[provider])
+            self._semaphores[provider] = semaphore
+        return semaphore
+    
+    def _build_client(self, config: ModelConfig):
+        """Build a new client for the given model configuration"""
         if config.provider == ModelProvider.OPENAI:
             from openai import OpenAI
             return OpenAI(
                 api_key=config.api_key,
-                base_url=config.base_url
+                base_url=config.base_url,
+                http_client=self._build_http_client()
             )
         
         elif config.provider == ModelProvider.DEEPSEEK:
             from openai import OpenAI  # DeepSeek uses OpenAI-compatible API
             return OpenAI(
                 api_key=config.api_key,
-                base_url=config.base_url
+                base_url=config.base_url,
+                http_client=self._build_http_client()
             )
         
         elif config.provider == ModelProvider.CLAUDE:
             try:
                 import anthropic
-                return anthropic.Anthropic(api_key=config.api_key)
+                return anthropic.Anthropic(
+                    api_key=config.api_key,
+                    http_client=self._build_http_client()
+                )
             except ImportError:
                 logger.error("anthropic package not installed. Install with: pip install anthropic")
                 raise
@@ -189,23 +639,35 @@ class ModelManager:
         elif config.provider == ModelProvider.GEMINI:
             try:
                 import google.generativeai as genai
+                # genai.configure is process-wide, so it only runs when the client is (re)built
                 genai.configure(api_key=config.api_key)
                 return genai.GenerativeModel(config.model_name)
             except ImportError:
                 logger.error("google-generativeai package not installed. Install with: pip install google-generativeai")
                 raise
         
+        elif config.provider == ModelProvider.LOCAL:
+            return LocalClient(self._local_settings(config))
+        
         else:
             raise ValueError(f"Unsupported provider: {config.provider}")
     
-    def generate_completion(self, prompt: str, model_name: Optional[str] = None, **kwargs) -> str:
-        """Generate completion using the specified or current model"""
-        target_model = model_name or self.current_model
-        if not target_model:
-            raise ValueError("No model available")
+    def generate_completion(self, prompt: str, model_name: Optional[str] = None,
+                            on_token: Optional[Callable[[str], None]] = None,
+                            use_cache: bool = True,
+                            context: Optional[GenerationContext] = None, **kwargs) -> str:
+        """
+        Generate completion using the specified or current model
         
-        config = self.models[target_model]
-        client = self.create_client(target_model)
+        A GenerationContext takes precedence over model_name and pins the
+        request to its model and configuration snapshot.
+        If on_token is given the completion is streamed and on_token is called
+        with every text chunk as it arrives; the full text is still returned.
+        Identical requests are served from the response cache unless use_cache
+        is False. A system_prompt keyword is sent as the provider's system
+        instruction.
+        """
+        target_model, config = self._resolve_model(model_name, context)
         
         # Merge kwargs with model config
         params = {
@@ -214,49 +676,867 @@ class ModelManager:
             **kwargs
         }
         
+        cache_key = self._cache_key(config, prompt, params) if use_cache else None
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                if on_token is not None:
+                    on_token(cached)
+                return cached
+        
+        admitted_model, config = self._admit(target_model, config)
+        if admitted_model != target_model:
+            target_model = admitted_model
+            params = {"temperature": config.temperature, "max_tokens": config.max_tokens, **kwargs}
+            cache_key = self._cache_key(config, prompt, params) if use_cache else None
+        
+        deadline = context.deadline if context is not None else None
+        if deadline is not None:
+            deadline.check()
+        
+        started = time.monotonic()
+        try:
+            if on_token is not None:
+                chunks = []
+                for text in self._stream_admitted(target_model, config, prompt, params, deadline):
+                    chunks.append(text)
+                    on_token(text)
+                completion = ''.join(chunks)
+            elif deadline is not None:
+                # Run on the bridge loop so cancelling the deadline aborts the HTTP request
+                completion, started = async_bridge.run(self._with_deadline(
+                    self._acall_provider(target_model, config, prompt, params, deadline), deadline
+                ))
+            else:
+                completion = self._call_provider(target_model, config, prompt, params)
+        except Exception as e:
+            if self._is_provider_failure(e, deadline):
+                self._record_call(target_model, started, success=False)
+            raise
+        
+        self._record_call(target_model, started, completion)
+        
+        if cache_key is not None:
+            self.response_cache.put(cache_key, completion)
+        
+        return completion
+    
+    def _cache_key(self, config: ModelConfig, prompt: str, params: Dict[str, Any]) -> Optional[str]:
+        """Build the response cache key for a request, or None if caching is disabled"""
+        if not self.response_cache.enabled:
+            return None
+        
+        extra_params = {k: v for k, v in params.items() if k not in ("temperature", "max_tokens")}
+        extra_params.update(config.extra_params)
+        return self.response_cache.make_key(
+            f"{config.provider.value}:{config.model_name}",
+            prompt,
+            params["temperature"],
+            params["max_tokens"],
+            extra_params
+        )
+    
+    def _call_provider(self, target_model: str, config: ModelConfig, prompt: str,
+                       params: Dict[str, Any]) -> str:
+        """Send a blocking completion request to the model's provider"""
+        prompt, params = self.token_budget.fit(config, prompt, params)
+        client = self.create_client(target_model)
+        limiter = self.rate_limiters[config.provider]
+        reserved = self._estimate_tokens(prompt, params)
+        
         try:
-            if config.provider in [ModelProvider.OPENAI, ModelProvider.DEEPSEEK]:
-                response = client.chat.completions.create(
-                    model=config.model_name,
-                    messages=[{"role": "user", "content": prompt}],
-                    **params
+            with limiter.slot(reserved):
+                return self.cassette.call(
+                    *self._cassette_request(config, prompt, params),
+                    lambda: self._send_completion(client, config, limiter, reserved, prompt, params)
                 )
-                return response.choices[0].message.content
-            
-            elif config.provider == ModelProvider.CLAUDE:
-                response = client.messages.create(
-                    model=config.model_name,
-                    messages=[{"role": "user", "content": prompt}],
-                    **params
+        except Exception as e:
+            logger.error(f"Error generating completion with {target_model}: {str(e)}")
+            raise
+    
+    def _cassette_request(self, config: ModelConfig, prompt: str, params: Dict[str, Any]):
+        """(key, model id, prompt) identifying a provider call on the cassette"""
+        model_id = f"{config.provider.value}:{config.model_name}"
+        key = self.cassette.make_key(model_id, prompt, params) if self.cassette.enabled else None
+        return key, model_id, prompt
+    
+    def _send_completion(self, client, config: ModelConfig, limiter, reserved: int,
+                         prompt: str, params: Dict[str, Any]) -> str:
+        """Make the blocking SDK call for the model's provider"""
+        system_prompt, params = self._split_system_prompt(params)
+        
+        if config.provider in [ModelProvider.OPENAI, ModelProvider.DEEPSEEK, ModelProvider.LOCAL]:
+            response = self._create(
+                client.chat.completions, limiter,
+                model=config.model_name,
+                messages=self._chat_messages(prompt, system_prompt),
+                **params
+            )
+            self._settle_tokens(limiter, reserved, response)
+            self._record_usage(config, getattr(response, "usage", None))
+            return response.choices[0].message.content
+        
+        elif config.provider == ModelProvider.CLAUDE:
+            response = self._create(
+                client.messages, limiter,
+                model=config.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                **self._claude_system(system_prompt),
+                **params
+            )
+            self._settle_tokens(limiter, reserved, response)
+            self._record_usage(config, getattr(response, "usage", None))
+            return response.content[0].text
+        
+        elif config.provider == ModelProvider.GEMINI:
+            response = client.generate_content(self._inline_system_prompt(prompt, system_prompt),
+                                               generation_config=self._gemini_config(params))
+            return response.text
+        
+        else:
+            raise ValueError(f"Unsupported provider: {config.provider}")
+    
+    async def agenerate_completion(self, prompt: str, model_name: Optional[str] = None,
+                                   use_cache: bool = True,
+                                   context: Optional[GenerationContext] = None, **kwargs) -> str:
+        """
+        Generate completion asynchronously using the specified or current model
+        
+        Provider I/O always runs on the async bridge loop, where the calls share
+        pooled async clients and wait on the provider's concurrency semaphore.
+        Awaiting from another event loop hops onto the bridge loop transparently.
+        """
+        if not async_bridge.in_bridge_loop():
+            return await asyncio.wrap_future(
+                async_bridge.submit(self.agenerate_completion(prompt, model_name, use_cache, context, **kwargs))
+            )
+        
+        target_model, config = self._resolve_model(model_name, context)
+        
+        # Merge kwargs with model config
+        params = {
+            "temperature": config.temperature,
+            "max_tokens": config.max_tokens,
+            **kwargs
+        }
+        
+        cache_key = self._cache_key(config, prompt, params) if use_cache else None
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        admitted_model, config = self._admit(target_model, config)
+        if admitted_model != target_model:
+            target_model = admitted_model
+            params = {"temperature": config.temperature, "max_tokens": config.max_tokens, **kwargs}
+            cache_key = self._cache_key(config, prompt, params) if use_cache else None
+        deadline = context.deadline if context is not None else None
+        
+        started = time.monotonic()
+        try:
+            completion, started = await self._with_deadline(
+                self._acall_provider(target_model, config, prompt, params, deadline), deadline
+            )
+        except Exception as e:
+            if self._is_provider_failure(e, deadline):
+                self._record_call(target_model, started, success=False)
+            logger.error(f"Error generating async completion with {target_model}: {str(e)}")
+            raise
+        
+        self._record_call(target_model, started, completion)
+        
+        if cache_key is not None:
+            self.response_cache.put(cache_key, completion)
+        
+        return completion
+    
+    async def _acall_provider(self, target_model: str, config: ModelConfig, prompt: str,
+                              params: Dict[str, Any], deadline: Optional[Deadline] = None,
+                              use_cassette: bool = True):
+        """
+        Send an async completion request to the model's provider (bridge loop only)
+        
+        Returns (completion, started), where started is when the request left
+        the concurrency and rate limit queues. use_cassette=False always calls
+        the provider, even when the cassette records or replays.
+        """
+        prompt, params = self.token_budget.fit(config, prompt, params)
+        client = self.create_async_client(target_model)
+        limiter = self.rate_limiters[config.provider]
+        reserved = self._estimate_tokens(prompt, params)
+        
+        async with self._get_semaphore(config.provider), limiter.aslot(reserved):
+            # Time spent queued behind the semaphore and rate limiter is not provider latency
+            started = time.monotonic()
+            send = lambda: self._asend_completion(client, config, limiter, reserved, prompt, params, deadline)
+            if not use_cassette:
+                return await send(), started
+            completion = await self.cassette.acall(*self._cassette_request(config, prompt, params), send)
+            return completion, started
+    
+    async def _asend_completion(self, client, config: ModelConfig, limiter, reserved: int,
+                                prompt: str, params: Dict[str, Any],
+                                deadline: Optional[Deadline] = None) -> str:
+        """Make the async SDK call for the model's provider"""
+        system_prompt, params = self._split_system_prompt(params)
+        
+        if config.provider in [ModelProvider.OPENAI, ModelProvider.DEEPSEEK, ModelProvider.LOCAL]:
+            response = await self._acreate(
+                client.chat.completions, limiter,
+                model=config.model_name,
+                messages=self._chat_messages(prompt, system_prompt),
+                **params,
+                **self._request_timeout(deadline)
+            )
+            self._settle_tokens(limiter, reserved, response)
+            self._record_usage(config, getattr(response, "usage", None))
+            return response.choices[0].message.content
+        
+        elif config.provider == ModelProvider.CLAUDE:
+            response = await self._acreate(
+                client.messages, limiter,
+                model=config.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                **self._claude_system(system_prompt),
+                **params,
+                **self._request_timeout(deadline)
+            )
+            self._settle_tokens(limiter, reserved, response)
+            self._record_usage(config, getattr(response, "usage", None))
+            return response.content[0].text
+        
+        elif config.provider == ModelProvider.GEMINI:
+            response = await client.generate_content_async(self._inline_system_prompt(prompt, system_prompt),
+                                                           generation_config=self._gemini_config(params))
+            return response.text
+        
+        else:
+            raise ValueError(f"Unsupported provider: {config.provider}")
+    
+    async def aprobe_model(self, model_name: str, prompt: str = "ping") -> str:
+        """
+        Send a minimal completion to a model for health checking (bridge loop only)
+        
+        Bypasses the response cache, router statistics and circuit breaker, so
+        probes neither cost a full completion nor skew routing averages, and
+        the record/replay cassette, so probes measure the real provider and
+        never end up in a recording.
+        """
+        config = self.models.get(model_name)
+        if config is None:
+            raise ValueError(f"Model not available: {model_name}")
+        
+        completion, _ = await self._acall_provider(model_name, config, prompt, {"temperature": 0, "max_tokens": 1},
+                                                   use_cassette=False)
+        return completion
+    
+    @staticmethod
+    def _request_timeout(deadline: Optional[Deadline]) -> Dict[str, Any]:
+        """Per-request timeout argument for the provider SDKs, from the remaining budget"""
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is None:
+            return {}
+        return {"timeout": max(remaining, 0.001)}
+        
+    @staticmethod
+    async def _with_deadline(coro, deadline: Optional[Deadline]):
+        """
+        Await coro within a request deadline (bridge loop only)
+        
+        The call is abandoned with DeadlineExceeded when the budget runs out,
+        and cancelled, aborting its HTTP request, when the deadline is cancelled.
+        """
+        if deadline is None:
+            return await coro
+        
+        try:
+            deadline.check()
+        except DeadlineExceeded:
+            coro.close()
+            raise
+        
+        task = asyncio.ensure_future(coro)
+        loop = asyncio.get_running_loop()
+        unregister = deadline.add_callback(lambda: loop.call_soon_threadsafe(task.cancel))
+        try:
+            return await asyncio.wait_for(task, deadline.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Deadline of {deadline.timeout}s exceeded")
+        except asyncio.CancelledError:
+            if task.cancelled() and deadline.cancelled:
+                raise DeadlineExceeded(f"Request cancelled ({deadline.cancel_reason})")
+            raise
+        finally:
+            unregister()
+    
+    def submit_completion(self, prompt: str, model_name: Optional[str] = None,
+                          use_cache: bool = True,
+                          context: Optional[GenerationContext] = None, **kwargs):
+        """
+        Schedule an async completion from synchronous code
+        
+        Returns a concurrent.futures.Future without tying up a thread while the
+        provider responds; call .result() to wait for the text.
+        """
+        return async_bridge.submit(self.agenerate_completion(prompt, model_name, use_cache, context, **kwargs))
+    
+    async def agenerate_completions(self, prompts: List[str], model_name: Optional[str] = None,
+                                    max_concurrency: Optional[int] = None, use_cache: bool = True,
+                                    context: Optional[GenerationContext] = None,
+                                    **kwargs) -> List[Any]:
+        """
+        Generate completions for many prompts concurrently
+        
+        At most max_concurrency prompts (BATCH_MAX_CONCURRENCY by default) are
+        in flight at once; below that, the provider semaphores and rate limiters
+        decide the pace, so throughput follows provider quota. Results keep the
+        order of prompts, with the exception in place of a failed completion.
+        """
+        if not async_bridge.in_bridge_loop():
+            return await asyncio.wrap_future(async_bridge.submit(
+                self.agenerate_completions(prompts, model_name, max_concurrency, use_cache, context, **kwargs)
+            ))
+        
+        limit = asyncio.Semaphore(max_concurrency or self.batch_concurrency)
+        
+        async def complete(prompt: str) -> str:
+            async with limit:
+                return await self.agenerate_completion(prompt, model_name, use_cache, context, **kwargs)
+        
+        return await asyncio.gather(*[complete(prompt) for prompt in prompts], return_exceptions=True)
+    
+    def generate_completions(self, prompts: List[str], model_name: Optional[str] = None,
+                             max_concurrency: Optional[int] = None, use_cache: bool = True,
+                             context: Optional[GenerationContext] = None, **kwargs) -> List[Any]:
+        """Blocking wrapper around agenerate_completions for synchronous code"""
+        return async_bridge.run(
+            self.agenerate_completions(prompts, model_name, max_concurrency, use_cache, context, **kwargs)
+        )
+    
+    def stream_completion(self, prompt: str, model_name: Optional[str] = None,
+                          context: Optional[GenerationContext] = None, **kwargs) -> Iterator[str]:
+        """
+        Stream completion text chunks using the specified or current model
+        
+        Like generate_completion, the call passes the model's circuit breaker
+        (failing over to its MODEL_FALLBACKS model while the breaker is open)
+        and its outcome is recorded on the breaker.
+        """
+        target_model, config = self._resolve_model(model_name, context)
+        target_model, config = self._admit(target_model, config)
+        
+        # Merge kwargs with model config
+        params = {
+            "temperature": config.temperature,
+            "max_tokens": config.max_tokens,
+            **kwargs
+        }
+        
+        deadline = context.deadline if context is not None else None
+        started = time.monotonic()
+        chunks = []
+        try:
+            for text in self._stream_admitted(target_model, config, prompt, params, deadline):
+                chunks.append(text)
+                yield text
+        except Exception as e:
+            if self._is_provider_failure(e, deadline):
+                self._record_call(target_model, started, success=False)
+            raise
+        
+        self._record_call(target_model, started, ''.join(chunks))
+    
+    def _stream_admitted(self, target_model: str, config: ModelConfig, prompt: str,
+                         params: Dict[str, Any], deadline: Optional[Deadline] = None) -> Iterator[str]:
+        """Stream from a model that already passed its circuit breaker; the caller records the outcome"""
+        if deadline is not None:
+            deadline.check()
+        
+        started = time.monotonic()
+        first_token = True
+        try:
+            for text in self._stream_provider(target_model, config, prompt, params, deadline):
+                if first_token:
+                    self.router.record_first_token(target_model, time.monotonic() - started)
+                    first_token = False
+                yield text
+        except Exception as e:
+            if deadline is not None and deadline.cancelled:
+                raise DeadlineExceeded(f"Request cancelled ({deadline.cancel_reason})") from e
+            raise
+        
+        # A stream closed by cancellation can end without an error
+        if deadline is not None and deadline.cancelled:
+            raise DeadlineExceeded(f"Request cancelled ({deadline.cancel_reason})")
+    
+    def _stream_provider(self, target_model: str, config: ModelConfig, prompt: str,
+                         params: Dict[str, Any], deadline: Optional[Deadline] = None) -> Iterator[str]:
+        """Send a streaming completion request to the model's provider"""
+        prompt, params = self.token_budget.fit(config, prompt, params)
+        client = self.create_client(target_model)
+        limiter = self.rate_limiters[config.provider]
+        
+        try:
+            with limiter.slot(self._estimate_tokens(prompt, params), deadline):
+                yield from self.cassette.stream(
+                    *self._cassette_request(config, prompt, params),
+                    lambda: self._send_stream(client, config, limiter, prompt, params, deadline)
                 )
-                return response.content[0].text
-            
-            elif config.provider == ModelProvider.GEMINI:
-                response = client.generate_content(prompt)
-                return response.text
-            
-            else:
-                raise ValueError(f"Unsupported provider: {config.provider}")
+        except Exception as e:
+            logger.error(f"Error streaming completion with {target_model}: {str(e)}")
+            raise
+    
+    def _send_stream(self, client, config: ModelConfig, limiter, prompt: str,
+                     params: Dict[str, Any], deadline: Optional[Deadline] = None) -> Iterator[str]:
+        """Make the streaming SDK call for the model's provider and yield its text chunks"""
+        system_prompt, params = self._split_system_prompt(params)
+        
+        if config.provider in [ModelProvider.OPENAI, ModelProvider.DEEPSEEK, ModelProvider.LOCAL]:
+            stream = self._create(
+                client.chat.completions, limiter,
+                model=config.model_name,
+                messages=self._chat_messages(prompt, system_prompt),
+                stream=True,
+                **params,
+                **self._request_timeout(deadline)
+            )
+            with self._closing_stream(stream, deadline):
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+        
+        elif config.provider == ModelProvider.CLAUDE:
+            stream = self._create(
+                client.messages, limiter,
+                model=config.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                **self._claude_system(system_prompt),
+                **params,
+                **self._request_timeout(deadline)
+            )
+            with self._closing_stream(stream, deadline):
+                for event in stream:
+                    if event.type == "message_start":
+                        self._record_usage(config, getattr(event.message, "usage", None))
+                    elif event.type == "content_block_delta" and getattr(event.delta, "text", None):
+                        yield event.delta.text
+        
+        elif config.provider == ModelProvider.GEMINI:
+            for chunk in client.generate_content(self._inline_system_prompt(prompt, system_prompt),
+                                                 generation_config=self._gemini_config(params), stream=True):
+                if chunk.text:
+                    yield chunk.text
+        
+        else:
+            raise ValueError(f"Unsupported provider: {config.provider}")
+    
+    async def astream_completion(self, prompt: str, model_name: Optional[str] = None,
+                                 context: Optional[GenerationContext] = None,
+                                 **kwargs) -> AsyncIterator[str]:
+        """
+        Stream completion text chunks asynchronously
+        
+        Must be iterated on the async bridge loop. Cancelling the consumer
+        closes the provider stream and releases the concurrency slot. The
+        circuit breaker is left to the caller (see generate_completion_hedged).
+        """
+        target_model, config = self._resolve_model(model_name, context)
+        client = self.create_async_client(target_model)
+        
+        # Merge kwargs with model config
+        params = {
+            "temperature": config.temperature,
+            "max_tokens": config.max_tokens,
+            **kwargs
+        }
+        
+        prompt, params = self.token_budget.fit(config, prompt, params)
+        limiter = self.rate_limiters[config.provider]
+        
+        deadline = context.deadline if context is not None else None
+        if deadline is not None:
+            deadline.check()
+        
+        try:
+            async with self._get_semaphore(config.provider), limiter.aslot(self._estimate_tokens(prompt, params)):
+                started = time.monotonic()
+                first_token = True
                 
+                stream = self.cassette.astream(
+                    *self._cassette_request(config, prompt, params),
+                    lambda: self._asend_stream(client, config, limiter, prompt, params, deadline)
+                )
+                try:
+                    async for text in stream:
+                        if first_token:
+                            self.router.record_first_token(target_model, time.monotonic() - started)
+                            first_token = False
+                        yield text
+                finally:
+                    await stream.aclose()
+        
         except Exception as e:
-            logger.error(f"Error generating completion with {target_model}: {str(e)}")
+            logger.error(f"Error streaming async completion with {target_model}: {str(e)}")
             raise
     
-    def get_model_info(self, model_name: Optional[str] = None) -> Dict[str, Any]:
-        """Get information about a specific model"""
-        target_model = model_name or self.current_model
-        if not target_model or target_model not in self.models:
+    async def _asend_stream(self, client, config: ModelConfig, limiter, prompt: str,
+                            params: Dict[str, Any], deadline: Optional[Deadline] = None) -> AsyncIterator[str]:
+        """Make the async streaming SDK call for the model's provider and yield its text chunks"""
+        system_prompt, params = self._split_system_prompt(params)
+        
+        if config.provider in [ModelProvider.OPENAI, ModelProvider.DEEPSEEK, ModelProvider.LOCAL]:
+            stream = await self._acreate(
+                client.chat.completions, limiter,
+                model=config.model_name,
+                messages=self._chat_messages(prompt, system_prompt),
+                stream=True,
+                **params,
+                **self._request_timeout(deadline)
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await self._aclose_stream(stream)
+        
+        elif config.provider == ModelProvider.CLAUDE:
+            stream = await self._acreate(
+                client.messages, limiter,
+                model=config.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                **self._claude_system(system_prompt),
+                **params,
+                **self._request_timeout(deadline)
+            )
+            try:
+                async for event in stream:
+                    if event.type == "message_start":
+                        self._record_usage(config, getattr(event.message, "usage", None))
+                    elif event.type == "content_block_delta" and getattr(event.delta, "text", None):
+                        yield event.delta.text
+            finally:
+                await self._aclose_stream(stream)
+        
+        elif config.provider == ModelProvider.GEMINI:
+            response = await client.generate_content_async(self._inline_system_prompt(prompt, system_prompt),
+                                                           generation_config=self._gemini_config(params),
+                                                           stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        
+        else:
+            raise ValueError(f"Unsupported provider: {config.provider}")
+    
+    @staticmethod
+    def _estimate_tokens(prompt: str, params: Dict[str, Any]) -> int:
+        """Tokens a call may consume against a tokens/min limit: prompt estimate plus max_tokens"""
+        return (len(prompt) + len(params.get("system_prompt") or "")) // 4 + int(params.get("max_tokens") or 0)
+    
+    @staticmethod
+    def _split_system_prompt(params: Dict[str, Any]):
+        """
+        Separate the system_prompt parameter from the SDK parameters
+        
+        system_prompt travels with the other generation parameters so it is
+        part of the response cache and cassette keys; each provider branch
+        then places it where its API expects it.
+        """
+        if "system_prompt" not in params:
+            return None, params
+        params = dict(params)
+        return params.pop("system_prompt"), params
+    
+    @staticmethod
+    def _chat_messages(prompt: str, system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+        """OpenAI-style messages for a prompt and optional system prompt"""
+        messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        messages.append({"role": "user", "content": prompt})
+        return messages
+    
+    def _claude_system(self, system_prompt: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Anthropic takes the system prompt as a top-level parameter
+        
+        With prompt caching on it is sent as a text block marked with
+        cache_control, so the static prefix is read from Anthropic's prompt
+        cache on later requests instead of being processed again.
+        """
+        if not system_prompt:
             return {}
+        if not self.prompt_caching:
+            return {"system": system_prompt}
+        return {"system": [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]}
+    
+    @staticmethod
+    def _gemini_config(params: Dict[str, Any]) -> Dict[str, Any]:
+        """Gemini's generation_config for the sampling params (max_tokens is max_output_tokens there)"""
+        return {"temperature": params["temperature"], "max_output_tokens": params["max_tokens"]}
+    
+    @staticmethod
+    def _inline_system_prompt(prompt: str, system_prompt: Optional[str] = None) -> str:
+        """Gemini calls here take a single text input, so the system prompt leads it"""
+        return f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+    
+    @staticmethod
+    def _create(api, limiter, **kwargs):
+        """Call api.create, feeding the provider's rate limit headers to the limiter"""
+        raw_api = getattr(api, "with_raw_response", None)
+        if raw_api is None:
+            return api.create(**kwargs)
+        
+        raw = raw_api.create(**kwargs)
+        limiter.observe_headers(raw.headers)
+        return raw.parse()
+    
+    @staticmethod
+    async def _acreate(api, limiter, **kwargs):
+        """Async variant of _create"""
+        raw_api = getattr(api, "with_raw_response", None)
+        if raw_api is None:
+            return await api.create(**kwargs)
+        
+        raw = await raw_api.create(**kwargs)
+        limiter.observe_headers(raw.headers)
+        return raw.parse()
+    
+    def _record_usage(self, config: ModelConfig, usage):
+        """Count input tokens and the part of them served from the provider's prompt cache"""
+        if usage is None:
+            return
+        
+        def field(obj, name):
+            value = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+            return value or 0
+        
+        if config.provider == ModelProvider.CLAUDE:
+            cached = field(usage, "cache_read_input_tokens")
+            written = field(usage, "cache_creation_input_tokens")
+            input_tokens = field(usage, "input_tokens") + cached + written
+        else:
+            details = field(usage, "prompt_tokens_details")
+            cached = field(details, "cached_tokens") if details else 0
+            written = 0
+            input_tokens = field(usage, "prompt_tokens")
+        
+        with self._usage_lock:
+            stats = self.prompt_cache_stats.setdefault(
+                config.model_name, {'requests': 0, 'input_tokens': 0, 'cached_tokens': 0, 'cache_write_tokens': 0}
+            )
+            stats['requests'] += 1
+            stats['input_tokens'] += input_tokens
+            stats['cached_tokens'] += cached
+            stats['cache_write_tokens'] += written
+    
+    def get_prompt_cache_stats(self) -> Dict[str, Any]:
+        """Get per-model input token counts and the share served from provider prompt caches"""
+        with self._usage_lock:
+            models = {name: dict(stats) for name, stats in self.prompt_cache_stats.items()}
+        for stats in models.values():
+            stats['cached_ratio'] = round(stats['cached_tokens'] / stats['input_tokens'], 4) if stats['input_tokens'] else 0.0
+        return {'enabled': self.prompt_caching, 'models': models}
+    
+    @staticmethod
+    def _settle_tokens(limiter, reserved: int, response):
+        """Refund the part of a tokens/min reservation the call did not use"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        used = getattr(usage, "total_tokens", None)
+        if used is None:
+            used = (getattr(usage, "input_tokens", 0) or 0) + (getattr(usage, "output_tokens", 0) or 0)
+        limiter.refund_tokens(reserved - used)
+    
+    @staticmethod
+    @contextmanager
+    def _closing_stream(stream, deadline: Optional[Deadline] = None):
+        """Close a sync SDK stream when iteration stops early or the deadline is cancelled"""
+        def close():
+            response = getattr(stream, 'response', None)
+            if response is not None:
+                response.close()
+        
+        unregister = deadline.add_callback(close) if deadline is not None else (lambda: None)
+        try:
+            yield stream
+        finally:
+            unregister()
+            close()
+    
+    @staticmethod
+    async def _aclose_stream(stream):
+        """Close the HTTP response behind an async SDK stream"""
+        response = getattr(stream, 'response', None)
+        if response is not None:
+            await response.aclose()
+    
+    def _pick_hedge_model(self, primary: str, context: Optional[GenerationContext] = None) -> Optional[str]:
+        """Choose the backup model for a hedged call (HEDGE_MODEL, else the best other candidate)"""
+        if self.hedge_model and self.hedge_model in self.models and self.hedge_model != primary:
+            return self.hedge_model
+        
+        routing_group = context.routing_group if context is not None else None
+        try:
+            candidates = [name for name in self.get_routing_candidates(routing_group) if name != primary]
+        except ValueError:
+            return None
+        return self.router.choose(candidates) if candidates else None
+    
+    async def agenerate_hedged(self, prompt: str, context: Optional[GenerationContext] = None,
+                               hedge_model: Optional[str] = None, percentile: Optional[float] = None,
+                               use_cache: bool = True, **kwargs) -> str:
+        """
+        Generate a completion, racing a backup model if the primary stalls
+        
+        The primary model is streamed. If its first token has not arrived within
+        the given percentile of its own time-to-first-token history (or if it
+        fails first), the same prompt is sent to the hedge model. The first
+        complete answer wins and the other request is cancelled.
+        """
+        if not async_bridge.in_bridge_loop():
+            return await asyncio.wrap_future(async_bridge.submit(
+                self.agenerate_hedged(prompt, context, hedge_model, percentile, use_cache, **kwargs)
+            ))
+        
+        primary, primary_config = self._resolve_model(None, context)
+        deadline = context.deadline if context is not None else None
+        hedge = hedge_model or self._pick_hedge_model(primary, context)
+        if hedge and not self.breakers.is_available(hedge):
+            hedge = None
+        if not hedge or hedge == primary or hedge not in self.models:
+            return await self.agenerate_completion(
+                prompt, use_cache=use_cache, context=GenerationContext(primary, primary_config, deadline=deadline), **kwargs
+            )
+        
+        params = {
+            "temperature": primary_config.temperature,
+            "max_tokens": primary_config.max_tokens,
+            **kwargs
+        }
+        cache_key = self._cache_key(primary_config, prompt, params) if use_cache else None
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        primary, primary_config = self._admit(primary, primary_config)
+        if primary == hedge:
+            return await self.agenerate_completion(
+                prompt, use_cache=use_cache, context=GenerationContext(primary, primary_config, deadline=deadline), **kwargs
+            )
         
-        config = self.models[target_model]
+        self.hedge_stats['requests'] += 1
+        first_token = asyncio.Event()
+        
+        async def run(model_name: str, config: ModelConfig, started_event: Optional[asyncio.Event] = None) -> str:
+            started = time.monotonic()
+            chunks = []
+            try:
+                async for text in self.astream_completion(prompt, context=GenerationContext(model_name, config, deadline=deadline), **kwargs):
+                    if started_event is not None:
+                        started_event.set()
+                    chunks.append(text)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self._is_provider_failure(e, deadline):
+                    self._record_call(model_name, started, success=False)
+                raise
+            completion = ''.join(chunks)
+            self._record_call(model_name, started, completion)
+            return completion
+        
+        delay = self.router.first_token_percentile(primary, percentile or self.hedge_percentile)
+        if delay is None:
+            delay = self.hedge_default_delay
+        
+        primary_task = asyncio.ensure_future(run(primary, primary_config, first_token))
+        tasks = {primary_task: primary}
+        try:
+            waiter = asyncio.ensure_future(first_token.wait())
+            await asyncio.wait({primary_task, waiter}, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            
+            primary_failed = primary_task.done() and not primary_task.cancelled() and primary_task.exception() is not None
+            if (not first_token.is_set() and (not primary_task.done() or primary_failed)
+                    and self.breakers.allow(hedge)):
+                logger.info(f"Hedging {primary} with {hedge} after {delay:.2f}s without a first token")
+                self.hedge_stats['hedged'] += 1
+                tasks[asyncio.ensure_future(run(hedge, self.models[hedge]))] = hedge
+            
+            winner, completion = await self._first_successful(tasks)
+            if winner != primary:
+                self.hedge_stats['hedge_wins'] += 1
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        
+        if cache_key is not None:
+            self.response_cache.put(cache_key, completion)
+        
+        return completion
+    
+    @staticmethod
+    async def _first_successful(tasks: Dict["asyncio.Future", str]):
+        """Wait for the first task to succeed and return (model name, result)"""
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    return tasks[task], task.result()
+                error = task.exception() if not task.cancelled() else error
+        raise error or RuntimeError("All hedged requests were cancelled")
+    
+    def generate_completion_hedged(self, prompt: str, context: Optional[GenerationContext] = None,
+                                   **kwargs) -> str:
+        """Blocking wrapper around agenerate_hedged for synchronous code"""
+        deadline = context.deadline if context is not None else None
+        return async_bridge.run(self._with_deadline(self.agenerate_hedged(prompt, context, **kwargs), deadline))
+    
+    def get_model_info(self, model_name: Optional[str] = None,
+                       context: Optional[GenerationContext] = None) -> Dict[str, Any]:
+        """Get information about a specific model (or the model a request context pins)"""
+        if context is None and self.is_auto_model(model_name or self.current_model):
+            try:
+                context = self.create_context(model_name)
+            except ValueError:
+                return {}
+        
+        if context is not None and context.routing_group is not None:
+            return {
+                "name": context.model_name,
+                "provider": "router",
+                "routing_group": context.routing_group,
+                "candidates": self.get_routing_candidates(context.routing_group),
+                "is_current": context.model_name == self.current_model
+            }
+        
+        if context is not None:
+            target_model, config = context.model_name, context.config
+        else:
+            target_model = model_name or self.current_model
+            if not target_model or target_model not in self.models:
+                return {}
+            
+            config = self.models[target_model]
         return {
             "name": target_model,
             "provider": config.provider.value,
             "model_name": config.model_name,
             "max_tokens": config.max_tokens,
+            "context_window": self.token_budget.context_window(config),
             "temperature": config.temperature,
             "base_url": config.base_url,
-            "is_current": target_model == self.current_model
+            "is_current": target_model == self.current_model,
+            "fallback_model": self.fallbacks.get(target_model),
+            "circuit_breaker": self.breakers.get_state(target_model)
         }
 
 # Global model manager instance
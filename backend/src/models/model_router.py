@@ -0,0 +1,182 @@
+"""
+Model Router - Latency-aware selection between interchangeable models
+Tracks live EWMA statistics per model and routes "auto" requests to the best candidate
+"""
+
+import os
+import math
+import random
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+AUTO_MODEL = "auto"
+
+def parse_routing_groups(spec: str) -> Dict[str, List[str]]:
+    """
+    Parse policy groups from MODEL_ROUTING_GROUPS
+    
+    Format: "fast:gpt-4o-mini,deepseek-chat;quality:gpt-4,claude-3-sonnet"
+    """
+    groups: Dict[str, List[str]] = {}
+    for entry in (spec or '').split(';'):
+        if ':' not in entry:
+            continue
+        name, models = entry.split(':', 1)
+        members = [model.strip() for model in models.split(',') if model.strip()]
+        if name.strip() and members:
+            groups[name.strip()] = members
+    return groups
+
+class ModelStats:
+    """Exponentially weighted moving averages of one model's behaviour"""
+    
+    def __init__(self, alpha: float, history_size: int = 200):
+        """Initialize empty statistics"""
+        self.alpha = alpha
+        self.samples = 0
+        self.latency = 0.0
+        self.output_tokens = 0.0
+        self.tokens_per_second = 0.0
+        self.error_rate = 0.0
+        
+        # Recent time-to-first-token samples of streamed calls, for percentiles
+        self.first_token_latencies: deque = deque(maxlen=history_size)
+    
+    def _ewma(self, current: float, value: float) -> float:
+        return value if self.samples == 0 else (1 - self.alpha) * current + self.alpha * value
+    
+    def record(self, latency: float, output_tokens: int, success: bool):
+        """Fold one call into the averages"""
+        self.error_rate = self._ewma(self.error_rate, 0.0 if success else 1.0)
+        if success:
+            self.latency = self._ewma(self.latency, latency)
+            self.output_tokens = self._ewma(self.output_tokens, output_tokens)
+            if latency > 0:
+                self.tokens_per_second = self._ewma(self.tokens_per_second, output_tokens / latency)
+        self.samples += 1
+    
+    def first_token_percentile(self, percentile: float) -> Optional[float]:
+        """Get a percentile of recent time-to-first-token samples"""
+        if not self.first_token_latencies:
+            return None
+        ordered = sorted(self.first_token_latencies)
+        index = min(len(ordered) - 1, max(0, math.ceil(percentile * len(ordered)) - 1))
+        return ordered[index]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        p95 = self.first_token_percentile(0.95)
+        return {
+            'samples': self.samples,
+            'latency_ewma_seconds': round(self.latency, 4),
+            'output_tokens_ewma': round(self.output_tokens, 1),
+            'tokens_per_second_ewma': round(self.tokens_per_second, 2),
+            'error_rate_ewma': round(self.error_rate, 4),
+            'first_token_samples': len(self.first_token_latencies),
+            'first_token_p95_seconds': round(p95, 4) if p95 is not None else None
+        }
+
+class LatencyRouter:
+    """
+    Routes calls to the fastest healthy model in a policy group
+    
+    A model's score is its expected latency for a response of
+    reference_tokens output tokens: its fixed per-call overhead (the latency
+    EWMA minus the time its average response took at its tokens/sec EWMA)
+    plus reference_tokens at its throughput, plus its error-rate EWMA times
+    failure_cost seconds. Scoring a common response length keeps a model
+    that happened to serve short responses from looking faster than one
+    that streams more tokens per second. Models without throughput samples
+    are scored on their latency EWMA. The lowest score wins. Models with
+    fewer than min_samples calls are tried first, and a small exploration
+    rate keeps the statistics of the other candidates fresh so traffic
+    moves back once a slow provider recovers.
+    """
+    
+    def __init__(self, alpha: float = 0.2, failure_cost: float = 60.0,
+                 exploration_rate: float = 0.05, min_samples: int = 3,
+                 reference_tokens: int = 500):
+        """Initialize the router"""
+        self.alpha = alpha
+        self.failure_cost = failure_cost
+        self.reference_tokens = reference_tokens
+        self.exploration_rate = exploration_rate
+        self.min_samples = min_samples
+        self.groups: Dict[str, List[str]] = {}
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+    
+    def set_group(self, name: str, models: List[str]):
+        """Define a policy group of interchangeable models"""
+        self.groups[name] = list(models)
+    
+    def _get_stats(self, model_name: str) -> ModelStats:
+        stats = self._stats.get(model_name)
+        if stats is None:
+            stats = ModelStats(self.alpha)
+            self._stats[model_name] = stats
+        return stats
+    
+    def record(self, model_name: str, latency: float, output_tokens: int, success: bool):
+        """Record the outcome of one provider call"""
+        with self._lock:
+            self._get_stats(model_name).record(latency, output_tokens, success)
+    
+    def record_first_token(self, model_name: str, latency: float):
+        """Record the time-to-first-token of one streamed call"""
+        with self._lock:
+            self._get_stats(model_name).first_token_latencies.append(latency)
+    
+    def first_token_percentile(self, model_name: str, percentile: float,
+                               min_samples: int = 10) -> Optional[float]:
+        """Get a model's time-to-first-token percentile, or None without enough history"""
+        with self._lock:
+            stats = self._stats.get(model_name)
+            if stats is None or len(stats.first_token_latencies) < min_samples:
+                return None
+            return stats.first_token_percentile(percentile)
+    
+    def score(self, model_name: str) -> float:
+        """Lower is better; unexplored models score 0"""
+        stats = self._stats.get(model_name)
+        if stats is None or stats.samples < self.min_samples:
+            return 0.0
+        
+        expected = stats.latency
+        if stats.tokens_per_second > 0:
+            overhead = max(0.0, stats.latency - stats.output_tokens / stats.tokens_per_second)
+            expected = overhead + self.reference_tokens / stats.tokens_per_second
+        return expected + stats.error_rate * self.failure_cost
+    
+    def choose(self, candidates: List[str]) -> str:
+        """Pick the best model among candidates"""
+        if not candidates:
+            raise ValueError("No candidate models to route to")
+        
+        with self._lock:
+            if len(candidates) > 1 and random.random() < self.exploration_rate:
+                return random.choice(candidates)
+            return min(candidates, key=self.score)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-model statistics and scores"""
+        with self._lock:
+            return {
+                name: {**stats.to_dict(), 'score': round(self.score(name), 4)}
+                for name, stats in self._stats.items()
+            }
+
+def create_model_router() -> LatencyRouter:
+    """Create the router from environment variables"""
+    router = LatencyRouter(
+        alpha=float(os.getenv('MODEL_ROUTER_ALPHA', '0.2')),
+        failure_cost=float(os.getenv('MODEL_ROUTER_FAILURE_COST', '60')),
+        exploration_rate=float(os.getenv('MODEL_ROUTER_EXPLORATION', '0.05')),
+        reference_tokens=int(os.getenv('MODEL_ROUTER_REFERENCE_TOKENS', '500'))
+    )
+    for name, models in parse_routing_groups(os.getenv('MODEL_ROUTING_GROUPS', '')).items():
+        router.set_group(name, models)
+    return router
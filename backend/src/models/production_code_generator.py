@@ -5,13 +5,64 @@ Generates production-ready Flutter code with enterprise standards
 
 import json
 import logging
-from typing import Dict, List, Any, Optional
-from openai import OpenAI
-import os
+from typing import Dict, List, Any, Optional, Callable
 from datetime import datetime
 
+from .deadline import Deadline, DeadlineExceeded
+from .model_manager import model_manager, GenerationContext
+from .prompt_registry import prompt_registry
+
 logger = logging.getLogger(__name__)
 
+# Receives (event_name, data) progress events while an app is generated
+EventCallback = Callable[[str, Dict[str, Any]], None]
+
+# Per-request user prompt; slots are filled by the prompt registry
+DETAILED_USER_PROMPT = """
+المطلوب إنشاء تطبيق Flutter كامل وجاهز للإنتاج يحتوي على:
+
+1. **الهيكل الأساسي**:
+   - main.dart مع تكوين التطبيق
+   - pubspec.yaml مع أحدث التبعيات
+   - بنية مجلدات منظمة
+
+2. **طبقة البيانات**:
+   - Models مع freezed
+   - Repository pattern
+   - API services
+   - Local storage
+
+3. **طبقة العرض**:
+   - ViewModels مع Provider
+   - Screens responsive
+   - Custom widgets
+   - Error handling
+
+4. **الميزات المتقدمة**:
+   - Dependency injection
+   - State management
+   - Navigation
+   - Testing setup
+
+5. **معايير الجودة**:
+   - Clean code
+   - Performance optimization
+   - Security measures
+   - Documentation
+
+اكتب الكود كاملاً مع جميع الملفات المطلوبة.
+
+نوع التطبيق: {app_type}
+
+طلب المستخدم: {user_request}
+"""
+
+# Sections of DETAILED_USER_PROMPT dropped first when it must be trimmed to fit a context window
+DETAILED_USER_PROMPT_PRIORITIES = {
+    '4. **': 0,
+    '5. **': 0
+}
+
 class ProductionCodeGenerator:
     """
     Production-ready Flutter code generator with CTO-level expertise
@@ -19,49 +70,63 @@ class ProductionCodeGenerator:
     
     def __init__(self):
         """Initialize Production Code Generator"""
-        self.client = OpenAI(
-            api_key=os.getenv('OPENAI_API_KEY'),
-            base_url=os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
-        )
+        # Shared pooled clients, caching, routing and rate limiting
+        self.model_manager = model_manager
         
         self.production_templates = self._load_production_templates()
         self.enterprise_patterns = self._load_enterprise_patterns()
         
+        prompt_registry.register_static('production.system', self._build_production_system_prompt)
+        prompt_registry.register('production.user', DETAILED_USER_PROMPT)
+        
         logger.info("Production Code Generator initialized")
     
-    def generate_production_flutter_app(self, user_request: str, app_type: str = "general") -> Dict[str, Any]:
+    def generate_production_flutter_app(self, user_request: str, app_type: str = "general",
+                                        model_name: Optional[str] = None,
+                                        on_event: Optional[EventCallback] = None,
+                                        deadline: Optional[Deadline] = None,
+                                        context: Optional[GenerationContext] = None) -> Dict[str, Any]:
         """
         Generate production-ready Flutter application
+        
+        The completion runs through the model manager on the given context
+        (or a new one for model_name). If on_event is given the completion is
+        streamed: every text chunk is sent as a 'token' event and every
+        project file as a 'file' event. A deadline bounds the provider request
+        and cancelling it aborts the call.
         """
         try:
             logger.info(f"Generating production Flutter app: {app_type}")
             
-            # Use a working model
-            model = "gpt-4.1-mini"  # Use supported model
+            if context is None:
+                context = self.model_manager.create_context(model_name, fallback=True, deadline=deadline)
             
             # Get production-level system prompt
-            system_prompt = self._get_production_system_prompt(app_type)
+            system_prompt = self._get_production_system_prompt()
             
             # Get detailed user prompt
             user_prompt = self._get_detailed_user_prompt(user_request, app_type)
             
-            # Generate the code
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+            if context.deadline is not None:
+                context.deadline.check()
+            
+            generated_content = self.model_manager.generate_completion(
+                user_prompt,
+                context=context,
+                on_token=(lambda text: on_event('token', {'text': text})) if on_event is not None else None,
+                system_prompt=system_prompt,
+                section_priorities=DETAILED_USER_PROMPT_PRIORITIES,
                 temperature=0.1,
                 max_tokens=4000
             )
             
-            # Parse and enhance the response
-            generated_content = response.choices[0].message.content
-            
             # Create production-ready project structure
             project = self._create_production_project(generated_content, app_type, user_request)
             
+            if on_event is not None:
+                for path, content in project.get('files', {}).items():
+                    on_event('file', {'path': path, 'content': content})
+            
             return {
                 'success': True,
                 'project': project,
@@ -69,7 +134,7 @@ class ProductionCodeGenerator:
                     'generated_at': datetime.utcnow().isoformat(),
                     'app_type': app_type,
                     'quality_level': 'Production Ready',
-                    'model_used': model,
+                    'model_used': context.model_name,
                     'standards_applied': [
                         'Google Flutter Best Practices',
                         'Clean Architecture',
@@ -81,7 +146,12 @@ class ProductionCodeGenerator:
                 }
             }
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
+            deadline = context.deadline if context is not None else deadline
+            if deadline is not None and deadline.cancelled:
+                raise DeadlineExceeded(f"Request cancelled ({deadline.cancel_reason})") from e
             logger.error(f"Error generating production Flutter app: {str(e)}")
             return {
                 'success': False,
@@ -89,9 +159,19 @@ class ProductionCodeGenerator:
                 'fallback_project': self._get_production_fallback(user_request, app_type)
             }
     
-    def _get_production_system_prompt(self, app_type: str) -> str:
-        """Get production-level system prompt"""
-        return f"""
+    def _get_production_system_prompt(self) -> str:
+        """
+        Get production-level system prompt
+        
+        The text is identical for every request (the app type goes in the user
+        prompt), so providers can serve it from their prompt prefix cache. It
+        is built once and memoized by the prompt registry.
+        """
+        return prompt_registry.static('production.system')
+    
+    def _build_production_system_prompt(self) -> str:
+        """Build the production-level system prompt text"""
+        return """
 أنت CTO خبير في Flutter مع أكثر من 50 سنة خبرة في تطوير التطبيقات على مستوى الإنتاج.
 تتبع جميع أفضل الممارسات الرسمية من Google Flutter Team وتطبق معايير الكود الاحترافية.
 
@@ -108,18 +188,18 @@ import 'screens/home_screen.dart';
 import 'services/service_locator.dart';
 import 'viewmodels/app_viewmodel.dart';
 
-void main() {{
+void main() {
   // Setup dependency injection
   ServiceLocator.setup();
   
   runApp(const MyApp());
-}}
+}
 
-class MyApp extends StatelessWidget {{
-  const MyApp({{Key? key}}) : super(key: key);
+class MyApp extends StatelessWidget {
+  const MyApp({Key? key}) : super(key: key);
 
   @override
-  Widget build(BuildContext context) {{
+  Widget build(BuildContext context) {
     return MultiProvider(
       providers: [
         ChangeNotifierProvider(create: (_) => GetIt.instance<AppViewModel>()),
@@ -134,8 +214,8 @@ class MyApp extends StatelessWidget {{
         debugShowCheckedModeBanner: false,
       ),
     );
-  }}
-}}
+  }
+}
 ```
 
 2. **MODELS** - نماذج البيانات مع freezed:
@@ -146,50 +226,50 @@ part 'user.freezed.dart';
 part 'user.g.dart';
 
 @freezed
-class User with _$User {{
-  const factory User({{
+class User with _$User {
+  const factory User({
     required String id,
     required String name,
     required String email,
     DateTime? createdAt,
-  }}) = _User;
+  }) = _User;
 
   factory User.fromJson(Map<String, dynamic> json) => _$UserFromJson(json);
-}}
+}
 ```
 
 3. **REPOSITORIES** - Repository Pattern:
 ```dart
-abstract class UserRepository {{
+abstract class UserRepository {
   Future<Result<List<User>>> getUsers();
   Future<Result<User>> createUser(User user);
   Future<Result<User>> updateUser(User user);
   Future<Result<void>> deleteUser(String id);
-}}
+}
 
-class UserRepositoryImpl implements UserRepository {{
+class UserRepositoryImpl implements UserRepository {
   final ApiService _apiService;
   final LocalStorageService _localStorage;
 
   UserRepositoryImpl(this._apiService, this._localStorage);
 
   @override
-  Future<Result<List<User>>> getUsers() async {{
-    try {{
+  Future<Result<List<User>>> getUsers() async {
+    try {
       final users = await _apiService.getUsers();
       await _localStorage.cacheUsers(users);
       return Result.success(users);
-    }} catch (e) {{
+    } catch (e) {
       final cachedUsers = await _localStorage.getCachedUsers();
       return Result.success(cachedUsers);
-    }}
-  }}
-}}
+    }
+  }
+}
 ```
 
 4. **VIEWMODELS** - MVVM Pattern:
 ```dart
-class UserViewModel extends ChangeNotifier {{
+class UserViewModel extends ChangeNotifier {
   final UserRepository _repository;
   
   UserViewModel(this._repository);
@@ -202,7 +282,7 @@ class UserViewModel extends ChangeNotifier {{
   bool get isLoading => _isLoading;
   String? get errorMessage => _errorMessage;
 
-  Future<void> loadUsers() async {{
+  Future<void> loadUsers() async {
     _setLoading(true);
     
     final result = await _repository.getUsers();
@@ -212,46 +292,46 @@ class UserViewModel extends ChangeNotifier {{
     );
     
     _setLoading(false);
-  }}
+  }
 
-  void _setLoading(bool loading) {{
+  void _setLoading(bool loading) {
     _isLoading = loading;
     notifyListeners();
-  }}
-}}
+  }
+}
 ```
 
 5. **SCREENS** - واجهات المستخدم:
 ```dart
-class HomeScreen extends StatefulWidget {{
-  const HomeScreen({{Key? key}}) : super(key: key);
+class HomeScreen extends StatefulWidget {
+  const HomeScreen({Key? key}) : super(key: key);
 
   @override
   State<HomeScreen> createState() => _HomeScreenState();
-}}
+}
 
-class _HomeScreenState extends State<HomeScreen> {{
+class _HomeScreenState extends State<HomeScreen> {
   @override
-  void initState() {{
+  void initState() {
     super.initState();
-    WidgetsBinding.instance.addPostFrameCallback((_) {{
+    WidgetsBinding.instance.addPostFrameCallback((_) {
       context.read<UserViewModel>().loadUsers();
-    }});
-  }}
+    });
+  }
 
   @override
-  Widget build(BuildContext context) {{
+  Widget build(BuildContext context) {
     return Scaffold(
       appBar: AppBar(
         title: const Text('Users'),
       ),
       body: Consumer<UserViewModel>(
-        builder: (context, viewModel, child) {{
-          if (viewModel.isLoading) {{
+        builder: (context, viewModel, child) {
+          if (viewModel.isLoading) {
             return const Center(child: CircularProgressIndicator());
-          }}
+          }
 
-          if (viewModel.errorMessage != null) {{
+          if (viewModel.errorMessage != null) {
             return Center(
               child: Column(
                 mainAxisAlignment: MainAxisAlignment.center,
@@ -264,49 +344,49 @@ class _HomeScreenState extends State<HomeScreen> {{
                 ],
               ),
             );
-          }}
+          }
 
           return ListView.builder(
             itemCount: viewModel.users.length,
-            itemBuilder: (context, index) {{
+            itemBuilder: (context, index) {
               final user = viewModel.users[index];
               return ListTile(
                 title: Text(user.name),
                 subtitle: Text(user.email),
               );
-            }},
+            },
           );
-        }},
+        },
       ),
     );
-  }}
-}}
+  }
+}
 ```
 
 6. **SERVICES** - خدمات التطبيق:
 ```dart
-class ApiService {{
+class ApiService {
   final Dio _dio;
 
-  ApiService() : _dio = Dio() {{
+  ApiService() : _dio = Dio() {
     _dio.options.baseUrl = 'https://api.example.com';
     _dio.options.connectTimeout = const Duration(seconds: 30);
     _dio.interceptors.add(LogInterceptor());
-  }}
+  }
 
-  Future<List<User>> getUsers() async {{
+  Future<List<User>> getUsers() async {
     final response = await _dio.get('/users');
     return (response.data as List)
         .map((json) => User.fromJson(json))
         .toList();
-  }}
-}}
+  }
+}
 ```
 
 7. **DEPENDENCY INJECTION**:
 ```dart
-class ServiceLocator {{
-  static void setup() {{
+class ServiceLocator {
+  static void setup() {
     final getIt = GetIt.instance;
     
     // Services
@@ -320,8 +400,8 @@ class ServiceLocator {{
     
     // ViewModels
     getIt.registerFactory<UserViewModel>(() => UserViewModel(getIt()));
-  }}
-}}
+  }
+}
 ```
 
 8. **PUBSPEC.YAML** - التبعيات:
@@ -379,17 +459,17 @@ flutter:
 
 9. **TESTING** - اختبارات شاملة:
 ```dart
-void main() {{
-  group('UserViewModel Tests', () {{
+void main() {
+  group('UserViewModel Tests', () {
     late UserViewModel viewModel;
     late MockUserRepository mockRepository;
 
-    setUp(() {{
+    setUp(() {
       mockRepository = MockUserRepository();
       viewModel = UserViewModel(mockRepository);
-    }});
+    });
 
-    test('should load users successfully', () async {{
+    test('should load users successfully', () async {
       // Arrange
       final users = [User(id: '1', name: 'Test', email: 'test@test.com')];
       when(() => mockRepository.getUsers())
@@ -401,9 +481,9 @@ void main() {{
       // Assert
       expect(viewModel.users, equals(users));
       expect(viewModel.isLoading, false);
-    }});
-  }});
-}}
+    });
+  });
+}
 ```
 
 المعايير المطلوبة:
@@ -415,50 +495,11 @@ void main() {{
 - اكتب كود production-ready
 - اتبع Flutter style guide
 - أضف اختبارات أساسية
-
-نوع التطبيق: {app_type}
 """
     
     def _get_detailed_user_prompt(self, user_request: str, app_type: str) -> str:
-        """Get detailed user prompt"""
-        return f"""
-طلب المستخدم: {user_request}
-
-نوع التطبيق: {app_type}
-
-المطلوب إنشاء تطبيق Flutter كامل وجاهز للإنتاج يحتوي على:
-
-1. **الهيكل الأساسي**:
-   - main.dart مع تكوين التطبيق
-   - pubspec.yaml مع أحدث التبعيات
-   - بنية مجلدات منظمة
-
-2. **طبقة البيانات**:
-   - Models مع freezed
-   - Repository pattern
-   - API services
-   - Local storage
-
-3. **طبقة العرض**:
-   - ViewModels مع Provider
-   - Screens responsive
-   - Custom widgets
-   - Error handling
-
-4. **الميزات المتقدمة**:
-   - Dependency injection
-   - State management
-   - Navigation
-   - Testing setup
-
-5. **معايير الجودة**:
-   - Clean code
-   - Performance optimization
-   - Security measures
-   - Documentation
-
-اكتب الكود كاملاً مع جميع الملفات المطلوبة.
-"""
+        """Get detailed user prompt (fixed instructions first, request details last)"""
+        return prompt_registry.render('production.user', user_request=user_request, app_type=app_type)
     
     def _create_production_project(self, generated_content: str, app_type: str, user_request: str) -> Dict[str, Any]:
         """Create production-ready project structure"""
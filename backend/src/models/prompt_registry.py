@@ -0,0 +1,134 @@
+"""
+Prompt Registry - Compiled prompt templates shared by the generators
+Static prompt parts are rendered once per app type; only request-specific slots are filled per call
+"""
+
+import string
+import logging
+import threading
+from typing import Dict, Any, Callable, Hashable, List, Tuple
+
+from .token_budget import token_counter
+
+logger = logging.getLogger(__name__)
+
+def estimate_tokens(text: str) -> int:
+    """Token count of a prompt (OpenAI tokenizer, or an estimate without tiktoken)"""
+    return token_counter.count(text)
+
+class PromptTemplate:
+    """
+    A prompt with str.format slots, parsed once
+    
+    Literal braces are written doubled ({{ }}), as in the f-strings the
+    templates replace. Rendering checks that every slot is supplied. The
+    literal text is counted once, so sizing a render only counts the values.
+    """
+    
+    def __init__(self, name: str, text: str):
+        """Parse the template and record its slots"""
+        self.name = name
+        self.text = text
+        parsed = list(string.Formatter().parse(text))
+        # Every occurrence of a slot, in order; a slot may be used more than once
+        self._fields = [field.split('.')[0].split('[')[0] for _, field, _, _ in parsed if field]
+        self.slots: List[str] = sorted(set(self._fields))
+        self.literal_tokens = estimate_tokens(''.join(literal for literal, _, _, _ in parsed))
+    
+    def count_tokens(self, **values) -> int:
+        """Approximate token length of a render: the literal text plus the slot values"""
+        return self.literal_tokens + sum(estimate_tokens(str(values[field])) for field in self._fields)
+    
+    def render(self, **values) -> str:
+        """Fill the slots"""
+        missing = [slot for slot in self.slots if slot not in values]
+        if missing:
+            raise KeyError(f"Prompt '{self.name}' is missing values for: {', '.join(missing)}")
+        return self.text.format(**values)
+
+class PromptRegistry:
+    """
+    Central store of generator prompts
+    
+    Templates are registered once when a generator starts. Static parts,
+    which depend only on things like the app type, are built by a registered
+    function the first time they are asked for and memoized per key, so the
+    long fixed instruction blocks are never rebuilt or re-concatenated per
+    request. Every render records the prompt's token length per name, which
+    gives one place to see (and trim) what each stage sends.
+    """
+    
+    def __init__(self):
+        """Initialize an empty registry"""
+        self.templates: Dict[str, PromptTemplate] = {}
+        self._static_builders: Dict[str, Callable[..., str]] = {}
+        # (name, key) -> (text, token count)
+        self._static_cache: Dict[Tuple[str, Tuple[Hashable, ...]], Tuple[str, int]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+    
+    def register(self, name: str, text: str) -> PromptTemplate:
+        """Register (or replace) a template with request-specific slots"""
+        template = PromptTemplate(name, text)
+        self.templates[name] = template
+        return template
+    
+    def register_static(self, name: str, builder: Callable[..., str]):
+        """Register a builder for a static prompt part; builder(*key) is called once per key"""
+        with self._lock:
+            self._static_builders[name] = builder
+            for cached_name, key in [entry for entry in self._static_cache if entry[0] == name]:
+                del self._static_cache[(cached_name, key)]
+    
+    def static(self, name: str, *key: Hashable) -> str:
+        """Get a memoized static prompt part"""
+        cache_key = (name, key)
+        entry = self._static_cache.get(cache_key)
+        if entry is None:
+            builder = self._static_builders.get(name)
+            if builder is None:
+                raise KeyError(f"Unknown static prompt: {name}")
+            text = builder(*key)
+            entry = (text, estimate_tokens(text))
+            with self._lock:
+                entry = self._static_cache.setdefault(cache_key, entry)
+        text, tokens = entry
+        self._count(name, tokens)
+        return text
+    
+    def render(self, template_name: str, /, **values) -> str:
+        """Render a registered template (positional name, so templates may have a {name} slot)"""
+        template = self.templates.get(template_name)
+        if template is None:
+            raise KeyError(f"Unknown prompt template: {template_name}")
+        text = template.render(**values)
+        self._count(template_name, template.count_tokens(**values))
+        return text
+    
+    def _count(self, name: str, tokens: int):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = {'renders': 0, 'total_tokens': 0, 'last_tokens': 0, 'max_tokens': 0}
+            stats['renders'] += 1
+            stats['total_tokens'] += tokens
+            stats['last_tokens'] = tokens
+            stats['max_tokens'] = max(stats['max_tokens'], tokens)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-prompt render counts and token lengths"""
+        with self._lock:
+            prompts = {name: dict(stats) for name, stats in self._stats.items()}
+            static_entries = len(self._static_cache)
+        
+        for stats in prompts.values():
+            stats['average_tokens'] = round(stats.pop('total_tokens') / stats['renders'], 1)
+        return {
+            'templates': sorted(self.templates),
+            'static_parts': sorted(self._static_builders),
+            'memoized_static_entries': static_entries,
+            'prompts': prompts
+        }
+
+# Global prompt registry instance
+prompt_registry = PromptRegistry()
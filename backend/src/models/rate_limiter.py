@@ -0,0 +1,367 @@
+"""
+Rate Limiter - Client-side pacing of provider calls
+Token buckets for requests/min and tokens/min plus an AIMD concurrency limit per provider
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Mapping
+
+from .deadline import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_SECONDS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a rate limit reset header into seconds from now
+    
+    Accepts OpenAI-style durations ("1s", "6m0s", "20ms"), plain seconds and
+    Anthropic-style RFC 3339 timestamps.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    
+    parts = _DURATION_PART.findall(value)
+    if parts and ''.join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts)
+    
+    try:
+        reset_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if reset_at.tzinfo is None:
+            reset_at = reset_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+    except ValueError:
+        return None
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether a provider exception is an HTTP 429"""
+    return getattr(error, 'status_code', None) == 429 or type(error).__name__ == 'RateLimitError'
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Read the retry delay a provider sent with a 429, if any"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    return parse_reset(headers.get('retry-after'))
+
+class TokenBucket:
+    """
+    Continuously refilling bucket holding up to one minute of capacity
+    
+    reserve() always takes the requested amount and returns how long the
+    caller must wait before the bucket would have held it, so waiting callers
+    queue up in order instead of racing for the refill.
+    """
+    
+    def __init__(self, per_minute: float):
+        """Initialize a full bucket (per_minute <= 0 disables it)"""
+        self.per_minute = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0
+    
+    def _refill(self, now: float):
+        self.level = min(self.per_minute, self.level + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+    
+    def reserve(self, amount: float) -> float:
+        """Take amount from the bucket and return the seconds to wait for it"""
+        if not self.enabled:
+            return 0.0
+        
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # A single request larger than the bucket may still go once the bucket is full
+            self.level -= min(amount, self.per_minute)
+            return 0.0 if self.level >= 0 else -self.level * 60.0 / self.per_minute
+    
+    def refund(self, amount: float):
+        """Return unused capacity, e.g. when a call used fewer tokens than reserved"""
+        if not self.enabled or amount <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.per_minute, self.level + amount)
+    
+    def set_rate(self, per_minute: float):
+        """Change the rate, e.g. to the limit the provider reports"""
+        with self._lock:
+            now = time.monotonic()
+            if self.enabled:
+                self._refill(now)
+            else:
+                self.level = per_minute
+                self._updated = now
+            self.per_minute = per_minute
+            self.level = min(self.level, per_minute)
+    
+    def sync(self, remaining: float, reset_seconds: Optional[float] = None):
+        """Align the bucket with the remaining quota the provider reports"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.level, remaining)
+            if remaining <= 0 and reset_seconds:
+                # Nothing left until the provider's window resets
+                self.level = min(self.level, -reset_seconds * self.per_minute / 60.0)
+
+class ProviderRateLimiter:
+    """
+    Paces calls to one provider
+    
+    Every call reserves one request and its estimated tokens from the
+    requests/min and tokens/min buckets and waits until both have refilled,
+    then takes a slot under an adaptive concurrency limit. The limit grows by
+    one after a full window of successful calls (additive increase) and is
+    halved on every 429 (multiplicative decrease), so it settles just below
+    the concurrency the provider actually sustains. Remaining-quota headers
+    keep the buckets in line with the provider's own accounting.
+    """
+    
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_concurrency: int = 64, min_concurrency: int = 1, decrease_factor: float = 0.5):
+        """Initialize the limiter at its maximum concurrency"""
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease_factor = decrease_factor
+        self.concurrency_limit = float(max_concurrency)
+        
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters: deque = deque()
+    
+    def _pacing_delay(self, tokens: int) -> float:
+        delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        return max(delay, self.paused_until - time.monotonic())
+    
+    def _try_take_slot(self) -> bool:
+        if self.in_flight < max(self.min_concurrency, int(self.concurrency_limit)):
+            self.in_flight += 1
+            return True
+        return False
+    
+    def acquire(self, tokens: int = 0, deadline: Optional[Deadline] = None):
+        """
+        Wait for rate budget and a concurrency slot (blocking)
+        
+        Raises DeadlineExceeded instead of waiting past the deadline, or as
+        soon as it is cancelled, giving back the budget reserved for the call.
+        """
+        delay = self._pacing_delay(tokens)
+        if deadline is None:
+            if delay > 0:
+                time.sleep(delay)
+            with self._cond:
+                while not self._try_take_slot():
+                    self._cond.wait()
+            return
+        
+        remaining = deadline.remaining()
+        if delay > 0:
+            if remaining is not None and delay > remaining:
+                self._refund(tokens)
+                raise DeadlineExceeded(f"Deadline would pass waiting {delay:.1f}s for {self.name} rate budget")
+            cancelled = threading.Event()
+            unregister = deadline.add_callback(cancelled.set)
+            try:
+                cancelled.wait(delay)
+            finally:
+                unregister()
+        
+        unregister = deadline.add_callback(self._wake_all)
+        try:
+            with self._cond:
+                while not self._try_take_slot():
+                    remaining = deadline.remaining()
+                    if remaining is not None and remaining <= 0:
+                        self._refund(tokens)
+                        deadline.check()
+                    self._cond.wait(remaining)
+        finally:
+            unregister()
+    
+    def _refund(self, tokens: int):
+        self.requests.refund(1)
+        self.tokens.refund(tokens)
+    
+    def _wake_all(self):
+        with self._cond:
+            self._cond.notify_all()
+    
+    async def aacquire(self, tokens: int = 0):
+        """
+        Wait for rate budget and a concurrency slot without blocking the event loop
+        
+        A caller cancelled while waiting gives back the budget reserved for the call.
+        """
+        delay = self._pacing_delay(tokens)
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            
+            loop = asyncio.get_running_loop()
+            while True:
+                with self._cond:
+                    if self._try_take_slot():
+                        return
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+                try:
+                    await waiter
+                except asyncio.CancelledError:
+                    # Pass on a wake-up this waiter may have consumed
+                    with self._cond:
+                        self._wake_async_waiter()
+                    raise
+        except asyncio.CancelledError:
+            self._refund(tokens)
+            raise
+    
+    def _wake_async_waiter(self):
+        while self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            if not waiter.done():
+                loop.call_soon_threadsafe(_wake, waiter)
+                break
+    
+    def release(self):
+        """Give back a concurrency slot"""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+            self._wake_async_waiter()
+    
+    def _finish(self, error: Optional[Exception]):
+        if error is None:
+            self.on_success()
+        elif is_rate_limit_error(error):
+            self.on_rate_limited(get_retry_after(error))
+    
+    @contextmanager
+    def slot(self, tokens: int = 0, deadline: Optional[Deadline] = None):
+        """Hold a paced concurrency slot for one call and learn from its outcome"""
+        self.acquire(tokens, deadline)
+        try:
+            yield self
+        except Exception as e:
+            self._finish(e)
+            raise
+        else:
+            self._finish(None)
+        finally:
+            self.release()
+    
+    @asynccontextmanager
+    async def aslot(self, tokens: int = 0):
+        """Async variant of slot()"""
+        await self.aacquire(tokens)
+        try:
+            yield self
+        except Exception as e:
+            self._finish(e)
+            raise
+        else:
+            self._finish(None)
+        finally:
+            self.release()
+    
+    def on_success(self):
+        """Additive increase: one more slot per window of successful calls"""
+        with self._cond:
+            self.concurrency_limit = min(
+                float(self.max_concurrency), self.concurrency_limit + 1.0 / max(1.0, self.concurrency_limit)
+            )
+    
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """Multiplicative decrease after a 429, pausing new calls for retry_after seconds"""
+        with self._cond:
+            self.rate_limited += 1
+            self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit * self.decrease_factor)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        logger.warning(
+            f"Rate limited by {self.name}; concurrency limit now {int(self.concurrency_limit)}"
+            + (f", pausing {retry_after:.1f}s" if retry_after else "")
+        )
+    
+    def observe_headers(self, headers: Optional[Mapping[str, str]]):
+        """Update the buckets from OpenAI- or Anthropic-style rate limit headers"""
+        if not headers:
+            return
+        
+        for bucket, kind in ((self.requests, 'requests'), (self.tokens, 'tokens')):
+            limit = headers.get(f'x-ratelimit-limit-{kind}') or headers.get(f'anthropic-ratelimit-{kind}-limit')
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}') or headers.get(f'anthropic-ratelimit-{kind}-remaining')
+            reset = headers.get(f'x-ratelimit-reset-{kind}') or headers.get(f'anthropic-ratelimit-{kind}-reset')
+            try:
+                if limit and float(limit) != bucket.per_minute:
+                    bucket.set_rate(float(limit))
+                if remaining is not None:
+                    bucket.sync(float(remaining), parse_reset(reset))
+            except ValueError:
+                logger.debug(f"Ignoring malformed {kind} rate limit headers from {self.name}")
+    
+    def refund_tokens(self, amount: int):
+        """Return tokens reserved for a call that used fewer"""
+        self.tokens.refund(amount)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the current limits and counters"""
+        return {
+            'concurrency_limit': int(self.concurrency_limit),
+            'max_concurrency': self.max_concurrency,
+            'in_flight': self.in_flight,
+            'requests_per_minute': self.requests.per_minute,
+            'tokens_per_minute': self.tokens.per_minute,
+            'rate_limited': self.rate_limited,
+            'paused_for_seconds': round(max(0.0, self.paused_until - time.monotonic()), 1)
+        }
+
+def _wake(waiter: "asyncio.Future"):
+    if not waiter.done():
+        waiter.set_result(None)
+
+def create_rate_limiter(provider_name: str, max_concurrency: int) -> ProviderRateLimiter:
+    """Create a provider's limiter from MODEL_RATE_LIMIT_RPM_<PROVIDER> / MODEL_RATE_LIMIT_TPM_<PROVIDER>"""
+    key = provider_name.upper()
+    return ProviderRateLimiter(
+        provider_name.lower(),
+        requests_per_minute=float(os.getenv(f'MODEL_RATE_LIMIT_RPM_{key}', '0')),
+        tokens_per_minute=float(os.getenv(f'MODEL_RATE_LIMIT_TPM_{key}', '0')),
+        max_concurrency=max_concurrency
+    )
@@ -0,0 +1,260 @@
+"""
+Response Cache - Content-addressed cache for LLM completions
+Bounded in-memory LRU tier backed by a persistent SQLite tier
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from .storage import get_data_path
+
+logger = logging.getLogger(__name__)
+
+class MemoryTier:
+    """In-memory LRU tier that evicts by total byte size"""
+    
+    def __init__(self, max_bytes: int):
+        """Initialize the memory tier with a byte budget"""
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _entry_size(key: str, value: str) -> int:
+        """Approximate memory cost of an entry in bytes"""
+        return len(key) + len(value.encode('utf-8'))
+    
+    def get(self, key: str) -> Optional[str]:
+        """Get a value and mark it as most recently used"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key: str, value: str):
+        """Store a value, evicting least recently used entries to stay within budget"""
+        size = self._entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= self._entry_size(key, previous)
+            
+            self._entries[key] = value
+            self.current_bytes += size
+            
+            while self.current_bytes > self.max_bytes:
+                old_key, old_value = self._entries.popitem(last=False)
+                self.current_bytes -= self._entry_size(old_key, old_value)
+    
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteTier:
+    """
+    Persistent tier backed by a SQLite database that survives restarts
+    
+    Entries expire ttl_seconds after they were written (0 keeps them until
+    evicted), and every write drops expired entries and then the least
+    recently used ones beyond max_entries, so the file stays bounded.
+    """
+    
+    def __init__(self, path: str, max_entries: int = 10000, ttl_seconds: float = 7 * 86400):
+        """Open (or create) the cache database"""
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(llm_cache)")]
+        if 'accessed_at' not in columns:
+            self._conn.execute("ALTER TABLE llm_cache ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+            self._conn.execute("UPDATE llm_cache SET accessed_at = created_at")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+        self._conn.commit()
+    
+    def _expired_before(self, now: float) -> float:
+        return now - self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+    
+    def get(self, key: str) -> Optional[str]:
+        """Get a stored response that has not expired and mark it as recently used"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND created_at >= ?",
+                (key, self._expired_before(now))
+            ).fetchone()
+            if row:
+                self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+        return row[0] if row else None
+    
+    def put(self, key: str, value: str):
+        """Store a response, pruning expired and least recently used entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (self._expired_before(now),))
+            surplus = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if surplus > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                    (surplus,)
+                )
+            self._conn.commit()
+    
+    def clear(self):
+        """Remove all stored responses"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+class ResponseCache:
+    """
+    Two-tier content-addressed cache for LLM responses
+    
+    Keys are SHA-256 hashes of the model, prompt and sampling parameters, so
+    identical requests resolve to the same entry. Lookups check memory first,
+    then disk, promoting disk hits into memory.
+    """
+    
+    def __init__(self, enabled: bool = True, max_memory_bytes: int = 64 * 1024 * 1024,
+                 disk_path: Optional[str] = None, max_disk_entries: int = 10000,
+                 disk_ttl_seconds: float = 7 * 86400):
+        """Initialize the cache tiers"""
+        self.enabled = enabled
+        self.memory = MemoryTier(max_memory_bytes)
+        self.disk: Optional[SQLiteTier] = None
+        
+        if enabled and disk_path:
+            try:
+                self.disk = SQLiteTier(disk_path, max_disk_entries, disk_ttl_seconds)
+            except Exception as e:
+                logger.error(f"Could not open response cache at {disk_path}: {str(e)}")
+        
+        self._stats_lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0}
+        
+        logger.info(f"Response cache initialized (enabled={enabled}, disk={self.disk.path if self.disk else None})")
+    
+    @staticmethod
+    def make_key(model_name: str, prompt: str, temperature: float, max_tokens: int,
+                 extra_params: Optional[Dict[str, Any]] = None) -> str:
+        """Build the content address for a completion request"""
+        payload = json.dumps({
+            'model': model_name,
+            'prompt': prompt,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'extra': extra_params or {}
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self._stats[stat] += 1
+    
+    def get(self, key: str) -> Optional[str]:
+        """Look up a cached response"""
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+        
+        if self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except Exception as e:
+                logger.error(f"Response cache disk read failed: {str(e)}")
+                value = None
+            
+            if value is not None:
+                self.memory.put(key, value)
+                self._count('disk_hits')
+                return value
+        
+        self._count('misses')
+        return None
+    
+    def put(self, key: str, value: str):
+        """Store a response in both tiers"""
+        if value is None:
+            return
+        
+        self.memory.put(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, value)
+            except Exception as e:
+                logger.error(f"Response cache disk write failed: {str(e)}")
+        self._count('writes')
+    
+    def clear(self):
+        """Remove all cached responses from both tiers"""
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and tier sizes"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        
+        hits = stats['memory_hits'] + stats['disk_hits']
+        lookups = hits + stats['misses']
+        stats.update({
+            'enabled': self.enabled,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'memory_entries': len(self.memory),
+            'memory_bytes': self.memory.current_bytes,
+            'memory_max_bytes': self.memory.max_bytes,
+            'disk_entries': len(self.disk) if self.disk is not None else 0,
+            'disk_max_entries': self.disk.max_entries if self.disk is not None else 0,
+            'disk_path': self.disk.path if self.disk is not None else None
+        })
+        return stats
+
+def create_response_cache() -> ResponseCache:
+    """Create the response cache from environment variables"""
+    enabled = os.getenv('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    disk_path = os.getenv('LLM_CACHE_PATH')
+    if disk_path is None and enabled:
+        disk_path = get_data_path('llm_cache.sqlite')
+    
+    return ResponseCache(
+        enabled=enabled,
+        max_memory_bytes=int(os.getenv('LLM_CACHE_MEMORY_BYTES', str(64 * 1024 * 1024))),
+        disk_path=disk_path or None,
+        max_disk_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000')),
+        disk_ttl_seconds=float(os.getenv('LLM_CACHE_TTL_SECONDS', str(7 * 86400)))
+    )
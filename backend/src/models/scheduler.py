@@ -0,0 +1,248 @@
+"""
+Generation Scheduler - Priority, deadline and fair-share ordering of pipeline stages
+Every generation stage waits for a slot; free slots go to the most urgent waiting stage
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+from .deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most urgent first
+PRIORITY_CLASSES = ('interactive', 'standard', 'batch')
+DEFAULT_PRIORITY = 'standard'
+
+def priority_rank(priority: Optional[str]) -> int:
+    """Position of a priority class (0 is most urgent); raises ValueError for unknown classes"""
+    priority = priority or DEFAULT_PRIORITY
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"priority must be one of: {', '.join(PRIORITY_CLASSES)}")
+    return PRIORITY_CLASSES.index(priority)
+
+class _Waiter:
+    """One stage waiting for a slot"""
+    
+    __slots__ = ('priority', 'tenant', 'deadline_at', 'seq', 'stage', 'enqueued_at', 'granted')
+    
+    def __init__(self, priority: str, tenant: str, deadline_at: float, seq: int, stage: str):
+        self.priority = priority
+        self.tenant = tenant
+        self.deadline_at = deadline_at
+        self.seq = seq
+        self.stage = stage
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+class GenerationScheduler:
+    """
+    Slot scheduler for generation pipeline stages
+    
+    At most `slots` stages run at once. A stage holds its slot only while it
+    runs and gives it back before the next stage of its pipeline asks again,
+    so a waiting interactive request takes over a slot at the next stage
+    boundary of a running batch pipeline (preemption between stages; a stage
+    is never interrupted). A free slot goes to the waiting stage with, in
+    order:
+    
+    1. the most urgent priority class (interactive, standard, batch)
+    2. the tenant holding the fewest slots, then with the least recent slot
+       time (decaying with usage_half_life), so one tenant's burst cannot
+       crowd out the others within a class
+    3. the earliest deadline; pipelines already under way have the earlier
+       deadlines, so they finish before new ones start
+    4. arrival order
+    
+    Batch stages may use at most batch_max_slots slots, which keeps slots
+    free for interactive work even when batch jobs arrive first.
+    """
+    
+    def __init__(self, slots: int = 16, batch_max_slots: Optional[int] = None,
+                 usage_half_life: float = 300.0, history_size: int = 1000):
+        """Initialize the scheduler"""
+        self.slots = slots
+        self.batch_max_slots = batch_max_slots if batch_max_slots is not None else max(1, slots - slots // 4)
+        self.usage_half_life = usage_half_life
+        
+        self._waiting: List[_Waiter] = []
+        self._running: Dict[str, int] = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._tenant_running: Dict[str, int] = {}
+        self._tenant_usage: Dict[str, List[float]] = {}
+        self._waits: Dict[str, deque] = {priority: deque(maxlen=history_size) for priority in PRIORITY_CLASSES}
+        self._granted: Dict[str, int] = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._expired_waiting = 0
+        self._seq = 0
+        self._condition = threading.Condition()
+    
+    def _usage(self, tenant: str, now: float) -> float:
+        """Slot-seconds a tenant used recently, halving every usage_half_life seconds"""
+        usage, updated_at = self._tenant_usage.get(tenant, (0.0, now))
+        return usage * 0.5 ** ((now - updated_at) / self.usage_half_life)
+    
+    def _eligible(self, waiter: _Waiter) -> bool:
+        return waiter.priority != 'batch' or self._running['batch'] < self.batch_max_slots
+    
+    def _dispatch(self):
+        """Grant free slots to the best waiting stages (caller holds the condition)"""
+        now = time.monotonic()
+        granted = False
+        while self._waiting and sum(self._running.values()) < self.slots:
+            candidates = [waiter for waiter in self._waiting if self._eligible(waiter)]
+            if not candidates:
+                break
+            
+            waiter = min(candidates, key=lambda waiter: (
+                PRIORITY_CLASSES.index(waiter.priority),
+                self._tenant_running.get(waiter.tenant, 0),
+                self._usage(waiter.tenant, now),
+                waiter.deadline_at,
+                waiter.seq
+            ))
+            self._waiting.remove(waiter)
+            self._grant(waiter, now)
+            granted = True
+        
+        if granted:
+            self._condition.notify_all()
+    
+    def _grant(self, waiter: _Waiter, now: float):
+        waiter.granted = True
+        self._running[waiter.priority] += 1
+        self._tenant_running[waiter.tenant] = self._tenant_running.get(waiter.tenant, 0) + 1
+        self._granted[waiter.priority] += 1
+        self._waits[waiter.priority].append(now - waiter.enqueued_at)
+    
+    def acquire(self, context, stage: str = 'generation') -> _Waiter:
+        """
+        Wait for a slot for one stage of a request
+        
+        Raises DeadlineExceeded if the request's deadline passes or it is
+        cancelled while waiting.
+        """
+        deadline = getattr(context, 'deadline', None)
+        priority = getattr(context, 'priority', None) or DEFAULT_PRIORITY
+        tenant = getattr(context, 'tenant', None) or 'default'
+        
+        with self._condition:
+            self._seq += 1
+            waiter = _Waiter(
+                priority, tenant,
+                deadline.expires_at if deadline is not None and deadline.expires_at is not None else math.inf,
+                self._seq, stage
+            )
+            self._waiting.append(waiter)
+            self._dispatch()
+        
+        if waiter.granted:
+            return waiter
+        
+        unregister = deadline.add_callback(self._wake) if deadline is not None else (lambda: None)
+        try:
+            with self._condition:
+                while not waiter.granted:
+                    remaining = deadline.remaining() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        self._waiting.remove(waiter)
+                        self._expired_waiting += 1
+                        self._dispatch()
+                        deadline.check(stage)
+                        raise DeadlineExceeded(f"Deadline exceeded waiting for a slot for stage {stage}")
+                    self._condition.wait(remaining)
+        finally:
+            unregister()
+        
+        if waiter.enqueued_at < time.monotonic() - 1:
+            logger.info(f"Stage {stage} ({priority}, tenant {tenant}) waited "
+                        f"{time.monotonic() - waiter.enqueued_at:.1f}s for a slot")
+        return waiter
+    
+    def release(self, waiter: _Waiter, held: float):
+        """Give back a slot that was held for `held` seconds"""
+        now = time.monotonic()
+        with self._condition:
+            self._running[waiter.priority] -= 1
+            self._tenant_running[waiter.tenant] -= 1
+            if not self._tenant_running[waiter.tenant]:
+                del self._tenant_running[waiter.tenant]
+            self._tenant_usage[waiter.tenant] = [self._usage(waiter.tenant, now) + held, now]
+            if len(self._tenant_usage) > 1000:
+                # Forget tenants whose usage has decayed away
+                for tenant in [tenant for tenant in self._tenant_usage if self._usage(tenant, now) < 0.01]:
+                    del self._tenant_usage[tenant]
+            self._dispatch()
+    
+    def _wake(self):
+        with self._condition:
+            self._condition.notify_all()
+    
+    @contextmanager
+    def slot(self, context, stage: str = 'generation'):
+        """Hold a slot while one stage of a request runs"""
+        waiter = self.acquire(context, stage)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(waiter, time.monotonic() - started)
+    
+    @staticmethod
+    def _percentile(ordered: List[float], percentile: float) -> Optional[float]:
+        if not ordered:
+            return None
+        index = min(len(ordered) - 1, max(0, math.ceil(percentile * len(ordered)) - 1))
+        return round(ordered[index], 4)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get slot usage and queue-wait percentiles per priority class"""
+        with self._condition:
+            waiting = {priority: 0 for priority in PRIORITY_CLASSES}
+            for waiter in self._waiting:
+                waiting[waiter.priority] += 1
+            classes = {}
+            for priority in PRIORITY_CLASSES:
+                waits = sorted(self._waits[priority])
+                classes[priority] = {
+                    'running': self._running[priority],
+                    'waiting': waiting[priority],
+                    'granted': self._granted[priority],
+                    'queue_wait_p50_seconds': self._percentile(waits, 0.50),
+                    'queue_wait_p95_seconds': self._percentile(waits, 0.95),
+                    'queue_wait_p99_seconds': self._percentile(waits, 0.99),
+                    'queue_wait_samples': len(waits)
+                }
+            return {
+                'slots': self.slots,
+                'batch_max_slots': self.batch_max_slots,
+                'in_use': sum(self._running.values()),
+                'active_tenants': len(self._tenant_running),
+                'expired_while_waiting': self._expired_waiting,
+                'classes': classes
+            }
+
+def create_generation_scheduler() -> GenerationScheduler:
+    """Create the stage scheduler from environment variables"""
+    slots = int(os.getenv('SCHEDULER_SLOTS', '16'))
+    batch_max_slots = os.getenv('SCHEDULER_BATCH_MAX_SLOTS')
+    return GenerationScheduler(
+        slots=slots,
+        batch_max_slots=int(batch_max_slots) if batch_max_slots else None,
+        usage_half_life=float(os.getenv('SCHEDULER_USAGE_HALF_LIFE', '300'))
+    )
+
+# Global stage scheduler shared by all generators
+generation_scheduler = create_generation_scheduler()
+
+# Threads for generation work that waits for scheduler slots (pipeline stages, batch items);
+# the scheduler, not the pool, decides which of them run
+generation_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('STAGE_MAX_WORKERS', '32')),
+    thread_name_prefix='generation'
+)
@@ -0,0 +1,127 @@
+"""
+Single Flight - Coalescing of identical in-flight requests
+Duplicate generation requests wait on the first run instead of calling the provider again
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, Optional
+
+from .deadline import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+def make_request_key(description: str, app_type: str, model_name: Optional[str],
+                     backend_type: Optional[str] = None, database_type: Optional[str] = None) -> str:
+    """Build a coalescing key from normalized generation request parameters"""
+    payload = json.dumps([
+        ' '.join((description or '').split()).casefold(),
+        (app_type or '').strip().lower(),
+        model_name or '',
+        (backend_type or '').strip().lower(),
+        (database_type or '').strip().lower()
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class _Flight:
+    """One in-flight call and the callers waiting for it"""
+    
+    def __init__(self):
+        self.future: Future = Future()
+        # Owned by no single caller; cancelled once the last waiter has left
+        self.deadline = Deadline()
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time
+    
+    The first caller for a key starts the function in a thread of its own;
+    it and the callers that arrive while it is still running wait on its
+    future and receive the same result (or the same exception). Each caller
+    waits at most until its own deadline, then gets DeadlineExceeded. The
+    call runs under a shared deadline without a time limit that is cancelled
+    once every caller has left, i.e. when the latest caller's deadline runs
+    out, so one caller timing out or cancelling never ends the run for the
+    others. Every caller gets its own deep copy of the result,
+    since the routes add request metadata to it.
+    """
+    
+    def __init__(self):
+        """Initialize the in-flight call registry"""
+        self._calls: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.coalesced_count = 0
+    
+    def do(self, key: str, fn: Callable[..., Any], *args, deadline: Optional[Deadline] = None, **kwargs) -> Any:
+        """
+        Run fn for key, or join the run already in flight, waiting until deadline
+        
+        fn is called with the shared deadline as its deadline keyword argument.
+        """
+        with self._lock:
+            flight = self._calls.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight()
+                self._calls[key] = flight
+            else:
+                self.coalesced_count += 1
+            flight.waiters += 1
+        
+        if is_leader:
+            threading.Thread(target=self._run, args=(key, flight, fn, args, kwargs),
+                             name=f"single-flight-{key[:12]}", daemon=True).start()
+        else:
+            logger.info(f"Coalescing duplicate request {key[:12]} onto in-flight run")
+        
+        try:
+            return copy.deepcopy(self._wait(flight.future, deadline))
+        finally:
+            with self._lock:
+                flight.waiters -= 1
+                abandoned = not flight.waiters and not flight.future.done()
+                if abandoned and self._calls.get(key) is flight:
+                    del self._calls[key]
+            if abandoned:
+                flight.deadline.cancel('every coalesced caller left')
+    
+    def _run(self, key: str, flight: _Flight, fn: Callable[..., Any], args, kwargs):
+        try:
+            flight.future.set_result(fn(*args, deadline=flight.deadline, **kwargs))
+        except BaseException as e:
+            flight.future.set_exception(e)
+        finally:
+            with self._lock:
+                if self._calls.get(key) is flight:
+                    del self._calls[key]
+    
+    @staticmethod
+    def _wait(future: Future, deadline: Optional[Deadline]) -> Any:
+        """Get the result of a future, giving up when the deadline runs out or is cancelled"""
+        if deadline is None:
+            return future.result()
+        
+        finished = threading.Event()
+        future.add_done_callback(lambda _: finished.set())
+        unregister = deadline.add_callback(finished.set)
+        try:
+            finished.wait(deadline.remaining())
+        finally:
+            unregister()
+        
+        if not future.done():
+            if deadline.cancelled:
+                raise DeadlineExceeded(f"Request cancelled ({deadline.cancel_reason}) "
+                                       f"while waiting for a coalesced generation")
+            raise DeadlineExceeded(f"Deadline of {deadline.timeout}s exceeded waiting for a coalesced generation")
+        return future.result()
+    
+    def in_flight(self) -> int:
+        """Number of distinct calls currently running"""
+        with self._lock:
+            return len(self._calls)
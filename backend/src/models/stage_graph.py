@@ -0,0 +1,110 @@
+"""
+Stage Graph - Dependency-ordered concurrent execution of pipeline stages
+Each stage starts as soon as the stages it depends on have finished
+"""
+
+import logging
+from concurrent.futures import Executor, Future, FIRST_COMPLETED, wait
+from typing import Dict, Any, Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class Stage:
+    """A pipeline step: fn is called with the results of its required stages as keyword arguments"""
+    
+    def __init__(self, name: str, fn: Callable[..., Any], requires: Iterable[str] = ()):
+        """Define a stage"""
+        self.name = name
+        self.fn = fn
+        self.requires = tuple(requires)
+
+class StageSkipped(RuntimeError):
+    """Reported for a stage that was not run because a stage it requires failed"""
+
+class StageGraph:
+    """
+    Directed acyclic graph of stages run on a bounded executor
+    
+    run() submits every stage whose dependencies are done, waits for the
+    next one to finish, and repeats, so independent stages overlap and the
+    wall-clock time is that of the longest dependency chain rather than the
+    sum of all stages. Callbacks run in the calling thread.
+    
+    Without an on_error callback, no new stages are started after a stage
+    fails; the ones already running are waited for and the first error is
+    raised. With on_error, a failed stage is reported to it and only the
+    stages that depend on it are skipped (and reported with a
+    StageSkipped error); every other stage still runs.
+    """
+    
+    def __init__(self, stages: List[Stage]):
+        """Build the graph; raises ValueError for unknown dependencies or cycles"""
+        self.stages: Dict[str, Stage] = {stage.name: stage for stage in stages}
+        for stage in stages:
+            unknown = [name for name in stage.requires if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage {stage.name} requires unknown stages: {', '.join(unknown)}")
+        self.order = self._topological_order()
+    
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        remaining = dict(self.stages)
+        while remaining:
+            ready = [name for name, stage in remaining.items() if all(dep in order for dep in stage.requires)]
+            if not ready:
+                raise ValueError(f"Stage graph has a cycle among: {', '.join(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+        return order
+    
+    def run(self, executor: Executor, on_complete: Optional[Callable[[str, Any], None]] = None,
+            results: Optional[Dict[str, Any]] = None,
+            on_error: Optional[Callable[[str, BaseException], None]] = None) -> Dict[str, Any]:
+        """
+        Run every stage not already in results and return all results by stage name
+        
+        Stages whose result is passed in are treated as done and not run again.
+        With on_error, the returned results lack the failed and skipped stages.
+        """
+        results = dict(results or {})
+        pending = [name for name in self.order if name not in results]
+        running: Dict[Future, str] = {}
+        failed: List[str] = []
+        error: Optional[BaseException] = None
+        
+        while pending or running:
+            if error is None:
+                for name in list(pending):
+                    stage = self.stages[name]
+                    blocked_by = [dep for dep in stage.requires if dep in failed]
+                    if blocked_by:
+                        pending.remove(name)
+                        failed.append(name)
+                        on_error(name, StageSkipped(f"Skipped because stage {blocked_by[0]} failed"))
+                    elif all(dep in results for dep in stage.requires):
+                        pending.remove(name)
+                        running[executor.submit(stage.fn, **{dep: results[dep] for dep in stage.requires})] = name
+            if not running:
+                break
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except BaseException as e:
+                    if on_error is not None:
+                        failed.append(name)
+                        on_error(name, e)
+                    elif error is None:
+                        error = e
+                    else:
+                        logger.warning(f"Stage {name} also failed: {str(e)}")
+                    continue
+                if on_complete is not None:
+                    on_complete(name, results[name])
+        
+        if error is not None:
+            raise error
+        return results
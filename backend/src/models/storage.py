@@ -0,0 +1,15 @@
+"""
+Storage Helpers
+Locations for persistent data files (caches, queues, checkpoints)
+"""
+
+import os
+
+def get_data_path(filename: str) -> str:
+    """Get the path of a persistent data file under DATA_DIR (default backend/data)"""
+    data_dir = os.getenv(
+        'DATA_DIR',
+        os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data')
+    )
+    os.makedirs(data_dir, exist_ok=True)
+    return os.path.join(data_dir, filename)
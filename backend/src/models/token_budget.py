@@ -0,0 +1,273 @@
+"""
+Token Budget - Local token counting and context-window fitting
+Sizes max_tokens to the room left in a model's context window and trims prompts that would overflow
+"""
+
+import os
+import re
+import logging
+import threading
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Context windows by model name prefix; the longest matching prefix wins
+CONTEXT_WINDOWS = {
+    'gpt-4.1': 1047576,
+    'gpt-4o': 128000,
+    'gpt-4-turbo': 128000,
+    'gpt-4-32k': 32768,
+    'gpt-4': 8192,
+    'gpt-3.5-turbo': 16385,
+    'deepseek': 64000,
+    'claude': 200000,
+    'gemini-1.5': 1048576,
+    'gemini-pro': 32760,
+    'local': 32768
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Characters per token of ASCII text when no tokenizer is available, by provider
+CHARS_PER_TOKEN = {'openai': 4.0, 'deepseek': 4.0, 'local': 4.0, 'claude': 3.5, 'gemini': 4.0}
+
+# Tokens each chat message adds on top of its text (role markers and separators)
+MESSAGE_OVERHEAD = 8
+
+TRIM_MARKER = "\n[...]\n"
+
+# Default priorities of prompt sections when trimming (higher is kept longer)
+DEFAULT_SECTION_PRIORITY = 1
+EDGE_SECTION_PRIORITY = 2
+
+class PromptTooLongError(ValueError):
+    """Raised when a request cannot fit the model's context window even after trimming"""
+
+class TokenCounter:
+    """
+    Counts tokens per model family
+    
+    OpenAI-compatible models use tiktoken when it is installed (falling back
+    to cl100k_base for models it does not know). Other families, and all
+    models without tiktoken, use an estimate that counts ASCII text at the
+    family's characters-per-token ratio and every other character (Arabic
+    instructions, for example) at two characters per token, which errs on
+    the high side.
+    """
+    
+    def __init__(self):
+        """Initialize the counter; tiktoken is loaded lazily"""
+        self._encodings: Dict[str, Any] = {}
+        self._tiktoken = None
+        self._tiktoken_checked = False
+        self._lock = threading.Lock()
+    
+    def _encoding(self, model_name: str):
+        if not self._tiktoken_checked:
+            with self._lock:
+                if not self._tiktoken_checked:
+                    try:
+                        import tiktoken
+                        self._tiktoken = tiktoken
+                    except ImportError:
+                        logger.info("tiktoken not installed; using estimated token counts. Install with: pip install tiktoken")
+                    self._tiktoken_checked = True
+        if self._tiktoken is None:
+            return None
+        
+        encoding = self._encodings.get(model_name)
+        if encoding is None:
+            try:
+                encoding = self._tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                encoding = self._tiktoken.get_encoding('cl100k_base')
+            self._encodings[model_name] = encoding
+        return encoding
+    
+    @staticmethod
+    def estimate(text: str, chars_per_token: float = 4.0) -> int:
+        """Estimate tokens without a tokenizer"""
+        if not text:
+            return 0
+        non_ascii = sum(1 for char in text if ord(char) > 127)
+        return int((len(text) - non_ascii) / chars_per_token + non_ascii / 2.0) + 1
+    
+    def count(self, text: str, provider: str = 'openai', model_name: str = 'gpt-4o-mini') -> int:
+        """Count the tokens of text for a model"""
+        if not text:
+            return 0
+        if provider in ('openai', 'deepseek', 'local'):
+            encoding = self._encoding(model_name)
+            if encoding is not None:
+                return len(encoding.encode(text, disallowed_special=()))
+        return self.estimate(text, CHARS_PER_TOKEN.get(provider, 4.0))
+
+def section_priority(index: int, count: int, section: str, priorities: Optional[Dict[str, int]] = None) -> int:
+    """
+    Priority of one prompt section (higher is kept longer)
+    
+    A section takes the priority of the longest key of priorities that its
+    text starts with. Otherwise the first and last sections, which open with
+    the task and end with the request details or the expected output format,
+    get EDGE_SECTION_PRIORITY and the others DEFAULT_SECTION_PRIORITY.
+    """
+    text = section.lstrip()
+    matches = [key for key in (priorities or {}) if text.startswith(key)]
+    if matches:
+        return priorities[max(matches, key=len)]
+    return EDGE_SECTION_PRIORITY if index in (0, count - 1) else DEFAULT_SECTION_PRIORITY
+
+def trim_prompt(prompt: str, max_tokens: int, count: Callable[[str], int],
+                priorities: Optional[Dict[str, int]] = None) -> str:
+    """
+    Shorten a prompt to at most max_tokens
+    
+    The prompt is split into sections at blank lines, each ranked by
+    section_priority(). Sections below the highest priority present are
+    dropped, lowest priority first and, within a priority, largest first.
+    If that is not enough, the lowest-priority (then longest) remaining
+    section is cut short and marked with [...].
+    """
+    if count(prompt) <= max_tokens:
+        return prompt
+    
+    sections = re.split(r'\n\s*\n', prompt)
+    ranks = [section_priority(index, len(sections), section, priorities) for index, section in enumerate(sections)]
+    kept: List[Tuple[int, str]] = list(enumerate(sections))
+    
+    def trim_order(item: Tuple[int, str]) -> Tuple[int, int]:
+        return ranks[item[0]], -len(item[1])
+    
+    def join(items: List[Tuple[int, str]]) -> str:
+        return "\n\n".join(text for _, text in sorted(items))
+    
+    top = max(ranks)
+    for item in sorted(kept, key=trim_order):
+        if ranks[item[0]] == top or count(join(kept)) <= max_tokens:
+            break
+        kept.remove(item)
+    
+    text = join(kept)
+    while count(text) > max_tokens and kept:
+        index, section = min(kept, key=trim_order)
+        overflow = count(text) - max_tokens + count(TRIM_MARKER)
+        section_tokens = count(section)
+        if section_tokens <= overflow:
+            kept.remove((index, section))
+        else:
+            # Keep the same share of characters as of tokens, then re-check
+            keep_chars = int(len(section) * (section_tokens - overflow) / section_tokens)
+            kept[kept.index((index, section))] = (index, section[:max(0, keep_chars - 1)] + TRIM_MARKER)
+        text = join(kept)
+    return text
+
+class TokenBudget:
+    """
+    Fits each request into its model's context window before it is sent
+    
+    The prompt and system prompt are counted locally. max_tokens is lowered
+    to the room left in the window (minus a safety margin), so requests
+    neither fail on length at the provider nor reserve output headroom that
+    cannot be used. When even min_output_tokens would not fit, the prompt is
+    trimmed (see trim_prompt) to make room, honouring the section_priorities
+    param of the request; PromptTooLongError is raised if the system prompt
+    alone leaves no room.
+    """
+    
+    def __init__(self, enabled: bool = True, min_output_tokens: int = 256, safety_margin: float = 0.05,
+                 counter: Optional[TokenCounter] = None):
+        """Initialize the budget"""
+        self.enabled = enabled
+        self.min_output_tokens = min_output_tokens
+        self.safety_margin = safety_margin
+        self.counter = counter or TokenCounter()
+        
+        self._stats = {'requests': 0, 'max_tokens_reduced': 0, 'prompts_trimmed': 0, 'tokens_trimmed': 0}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def context_window(config) -> int:
+        """Context window of a model: the context_window extra param, else the prefix table"""
+        configured = config.extra_params.get('context_window')
+        if configured:
+            return int(configured)
+        
+        model_name = config.model_name.lower()
+        matches = [prefix for prefix in CONTEXT_WINDOWS if model_name.startswith(prefix)]
+        return CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+    
+    def count(self, config, text: str) -> int:
+        """Count tokens of text for a model configuration"""
+        return self.counter.count(text, config.provider.value, config.model_name)
+    
+    def _count_stat(self, **increments):
+        with self._lock:
+            for stat, amount in increments.items():
+                self._stats[stat] += amount
+    
+    def fit(self, config, prompt: str, params: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Return the prompt and params to send, with max_tokens sized to the context window
+        
+        The section_priorities param (see section_priority) only guides
+        trimming and is removed from the returned params.
+        """
+        priorities = params.get('section_priorities')
+        if priorities is not None:
+            params = {key: value for key, value in params.items() if key != 'section_priorities'}
+        if not self.enabled:
+            return prompt, params
+        
+        limit = int(self.context_window(config) * (1 - self.safety_margin))
+        requested = int(params.get('max_tokens') or config.max_tokens)
+        system_tokens = self.count(config, params.get('system_prompt') or '')
+        overhead = MESSAGE_OVERHEAD * (2 if params.get('system_prompt') else 1)
+        prompt_tokens = self.count(config, prompt)
+        
+        trimmed = 0
+        room = limit - system_tokens - overhead - prompt_tokens
+        if room < min(requested, self.min_output_tokens):
+            prompt_room = limit - system_tokens - overhead - min(requested, self.min_output_tokens)
+            if prompt_room <= 0:
+                raise PromptTooLongError(
+                    f"System prompt of {system_tokens} tokens leaves no room in the "
+                    f"{self.context_window(config)}-token context window of {config.model_name}"
+                )
+            prompt = trim_prompt(prompt, prompt_room, lambda text: self.count(config, text), priorities)
+            trimmed = prompt_tokens - self.count(config, prompt)
+            room = limit - system_tokens - overhead - (prompt_tokens - trimmed)
+            logger.warning(f"Trimmed {trimmed} prompt tokens to fit the context window of {config.model_name}")
+        
+        max_tokens = max(1, min(requested, room))
+        self._count_stat(
+            requests=1,
+            max_tokens_reduced=1 if max_tokens < requested else 0,
+            prompts_trimmed=1 if trimmed else 0,
+            tokens_trimmed=trimmed
+        )
+        if max_tokens == params.get('max_tokens') and not trimmed:
+            return prompt, params
+        return prompt, {**params, 'max_tokens': max_tokens}
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get counters and settings"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'enabled': self.enabled,
+            'min_output_tokens': self.min_output_tokens,
+            'safety_margin': self.safety_margin,
+            'tokenizer': 'tiktoken' if self.counter._tiktoken is not None else 'estimate'
+        })
+        return stats
+
+# Shared counter, also used to report prompt sizes
+token_counter = TokenCounter()
+
+def create_token_budget() -> TokenBudget:
+    """Create the token budget from environment variables"""
+    return TokenBudget(
+        enabled=os.getenv('TOKEN_BUDGET_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+        min_output_tokens=int(os.getenv('TOKEN_BUDGET_MIN_OUTPUT', '256')),
+        safety_margin=float(os.getenv('TOKEN_BUDGET_SAFETY_MARGIN', '0.05')),
+        counter=token_counter
+    )
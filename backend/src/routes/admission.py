@@ -0,0 +1,66 @@
+"""
+Admission Hooks
+Load shedding on the generation blueprints: early 429 responses with Retry-After under overload
+"""
+
+from flask import Blueprint, request, jsonify, g, current_app
+import logging
+from datetime import datetime
+
+from models.admission_control import admission_controller
+from routes.jobs_api import wants_job
+
+logger = logging.getLogger(__name__)
+
+def exempt(view):
+    """Mark a cheap view (templates, health, docs) as never subject to admission control"""
+    view.admission_exempt = True
+    return view
+
+def _request_weight() -> int:
+    """Generations a request asks for: the number of descriptions of a batch, otherwise 1"""
+    data = request.get_json(silent=True) or {}
+    descriptions = data.get('descriptions') if isinstance(data, dict) else None
+    return len(descriptions) if isinstance(descriptions, list) and descriptions else 1
+
+def guard_blueprint(blueprint: Blueprint):
+    """Run admission control before every non-exempt view of a blueprint"""
+    
+    @blueprint.before_request
+    def admit_request():
+        view = current_app.view_functions.get(request.endpoint)
+        if request.method == 'OPTIONS' or view is None or getattr(view, 'admission_exempt', False):
+            return None
+        
+        data = request.get_json(silent=True)
+        # Job submissions only enqueue; the queued job counts towards outstanding work instead
+        hold = not (isinstance(data, dict) and wants_job(data))
+        ticket, retry_after, projected_wait = admission_controller.admit(_request_weight(), hold=hold)
+        if ticket is None:
+            logger.warning(f"Shedding {request.path}: projected wait {projected_wait:.0f}s, "
+                           f"retry after {retry_after}s")
+            response = jsonify({
+                'success': False,
+                'error': 'Server is at capacity, please retry later',
+                'retry_after': retry_after,
+                'projected_wait_seconds': round(projected_wait, 1),
+                'timestamp': datetime.utcnow().isoformat()
+            })
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        
+        g.admission_ticket = ticket
+        return None
+    
+    @blueprint.after_request
+    def record_status(response):
+        g.admission_status = response.status_code
+        return response
+    
+    @blueprint.teardown_request
+    def release_request(exc):
+        # Streamed responses tear down once the stream has been sent
+        ticket = g.pop('admission_ticket', None)
+        if ticket is not None:
+            admission_controller.release(ticket, success=exc is None and g.get('admission_status', 500) < 500)
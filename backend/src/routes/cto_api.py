@@ -4,7 +4,10 @@ Advanced API endpoints for Flutter code generation with enterprise standards
 """
 
 from flask import Blueprint, request, jsonify
+import os
+import time
 import logging
+from concurrent.futures import FIRST_COMPLETED, wait
 from datetime import datetime
 from typing import Dict, Any
 
@@ -12,15 +15,56 @@ from models.cto_flutter_generator import CTOFlutterGenerator
 from models.code_quality_analyzer import CodeQualityAnalyzer
 from models.security_validator import SecurityValidator
 from models.performance_optimizer import PerformanceOptimizer
+from models.deadline import Deadline, create_deadline
+from models.job_queue import job_queue
+from models.scheduler import generation_scheduler, generation_executor
+from routes.streaming import (stream_generation, sse_response, ndjson_response, request_deadline, request_timeout,
+                              request_scheduling)
+from routes.jobs_api import wants_job, submit_job
+from routes.admission import guard_blueprint, exempt
 
 logger = logging.getLogger(__name__)
 
 # Create blueprint
 cto_bp = Blueprint('cto', __name__)
 
+# Shed generation requests under overload; cheap views are marked @exempt
+guard_blueprint(cto_bp)
+
 # Initialize expert modules
 flutter_generator = CTOFlutterGenerator()
 
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '500'))
+
+def _request_info(description: str, app_type: str, requirements: Dict[str, Any],
+                  preferences: Dict[str, Any]) -> Dict[str, Any]:
+    """Request metadata added to a successful generation result"""
+    return {
+        'description': description,
+        'app_type': app_type,
+        'requirements': requirements,
+        'preferences': preferences,
+        'generated_at': datetime.utcnow().isoformat()
+    }
+
+def run_generation_job(payload: Dict[str, Any], on_event=None, deadline: Deadline = None) -> Dict[str, Any]:
+    """Run a /generate request queued as a job"""
+    result = flutter_generator.generate_flutter_app(
+        user_request=payload['description'],
+        app_type=payload['app_type'],
+        model_name=payload.get('model_name'),
+        on_event=on_event,
+        deadline=deadline,
+        priority=payload.get('priority'),
+        tenant=payload.get('tenant')
+    )
+    if result.get('success'):
+        result['request_info'] = _request_info(payload['description'], payload['app_type'],
+                                               payload.get('requirements', {}), payload.get('preferences', {}))
+    return result
+
+job_queue.register('cto.generate', run_generation_job)
+
 @cto_bp.route('/generate', methods=['POST'])
 def generate_flutter_app():
     """
@@ -30,6 +74,10 @@ def generate_flutter_app():
     {
         "description": "User's app description",
         "app_type": "ecommerce|social|productivity|general",
+        "timeout": 600,  // optional time budget in seconds
+        "async": false,  // optional; true queues a job and answers 202 with its id
+        "priority": "interactive|standard|batch",  // optional; default interactive (standard for jobs)
+        "tenant": "team-a",  // optional; also X-Tenant-ID, default client address
         "requirements": {
             "features": ["feature1", "feature2"],
             "platforms": ["android", "ios", "web"],
@@ -66,6 +114,28 @@ def generate_flutter_app():
                 'error': 'App description is required'
             }), 400
         
+        try:
+            deadline = request_deadline(data)
+            # Queued jobs default to the standard class, requests a user waits on to interactive
+            priority, tenant = request_scheduling(data, 'standard' if wants_job(data) else 'interactive')
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        if wants_job(data):
+            return submit_job('cto.generate', {
+                'description': description,
+                'app_type': app_type,
+                'model_name': model_name,
+                'requirements': requirements,
+                'preferences': preferences,
+                'timeout': request_timeout(data),
+                'priority': priority,
+                'tenant': tenant
+            })
+        
         logger.info(f"Generating CTO-level Flutter app: {app_type}")
         logger.info(f"Description: {description[:100]}...")
         
@@ -73,24 +143,21 @@ def generate_flutter_app():
         result = flutter_generator.generate_flutter_app(
             user_request=description,
             app_type=app_type,
-            model_name=model_name
+            model_name=model_name,
+            deadline=deadline,
+            priority=priority,
+            tenant=tenant
         )
         
         if result.get('success'):
             # Add request metadata to response
-            result['request_info'] = {
-                'description': description,
-                'app_type': app_type,
-                'requirements': requirements,
-                'preferences': preferences,
-                'generated_at': datetime.utcnow().isoformat()
-            }
+            result['request_info'] = _request_info(description, app_type, requirements, preferences)
             
             logger.info("Flutter app generated successfully")
             return jsonify(result)
         else:
             logger.error(f"Failed to generate Flutter app: {result.get('error')}")
-            return jsonify(result), 500
+            return jsonify(result), 504 if result.get('deadline_exceeded') else 500
             
     except Exception as e:
         logger.error(f"Error in generate_flutter_app: {str(e)}")
@@ -99,7 +166,177 @@ def generate_flutter_app():
             'error': f'Internal server error: {str(e)}'
         }), 500
 
+@cto_bp.route('/generate/stream', methods=['POST'])
+def generate_flutter_app_stream():
+    """
+    Generate a Flutter application and stream progress as Server-Sent Events
+    
+    Accepts the same JSON payload as /generate. Emits 'token' events while the
+    model writes, a 'file' event for every generated file, then a 'result'
+    event with the complete response (or an 'error' event). Generation is
+    cancelled when the client disconnects.
+    """
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({
+            'success': False,
+            'error': 'No JSON data provided'
+        }), 400
+    
+    description = data.get('description', '')
+    app_type = data.get('app_type', 'general')
+    model_name = data.get('model_name')
+    
+    if not description:
+        return jsonify({
+            'success': False,
+            'error': 'App description is required'
+        }), 400
+    
+    try:
+        deadline = request_deadline(data)
+        priority, tenant = request_scheduling(data)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    logger.info(f"Streaming CTO-level Flutter app generation: {app_type}")
+    
+    events = stream_generation(
+        flutter_generator.generate_flutter_app,
+        deadline=deadline,
+        user_request=description,
+        app_type=app_type,
+        model_name=model_name,
+        priority=priority,
+        tenant=tenant
+    )
+    return sse_response(events)
+
+@cto_bp.route('/generate/batch', methods=['POST'])
+def generate_flutter_apps_batch():
+    """
+    Generate many Flutter applications and stream back each result as it finishes
+    
+    Expected JSON payload:
+    {
+        "descriptions": ["App description", "..."],
+        "app_type": "ecommerce|social|productivity|general",  // optional, for every app
+        "model_name": "gpt-4o-mini",  // optional
+        "timeout": 600,  // optional time budget per app in seconds
+        "priority": "batch"  // optional scheduling class
+    }
+    
+    Responds with newline-delimited JSON: one {"index", "description", "result"}
+    line per app in completion order, then a {"done": true, ...} summary line.
+    Apps still queued or running are cancelled when the client disconnects.
+    """
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({
+            'success': False,
+            'error': 'No JSON data provided'
+        }), 400
+    
+    descriptions = data.get('descriptions')
+    app_type = data.get('app_type', 'general')
+    model_name = data.get('model_name')
+    
+    if not isinstance(descriptions, list) or not descriptions:
+        return jsonify({
+            'success': False,
+            'error': 'descriptions must be a non-empty list'
+        }), 400
+    
+    if len(descriptions) > BATCH_MAX_ITEMS:
+        return jsonify({
+            'success': False,
+            'error': f'At most {BATCH_MAX_ITEMS} descriptions per batch'
+        }), 400
+    
+    if not all(isinstance(description, str) and description.strip() for description in descriptions):
+        return jsonify({
+            'success': False,
+            'error': 'Every description must be a non-empty string'
+        }), 400
+    
+    try:
+        timeout = request_timeout(data)
+        priority, tenant = request_scheduling(data, 'batch')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    logger.info(f"Generating batch of {len(descriptions)} Flutter apps: {app_type}")
+    
+    def generate_one(description: str, deadline: Deadline) -> Dict[str, Any]:
+        return flutter_generator.generate_flutter_app(
+            user_request=description,
+            app_type=app_type,
+            model_name=model_name,
+            deadline=deadline,
+            priority=priority,
+            tenant=tenant
+        )
+    
+    def results():
+        started = time.monotonic()
+        items = iter(enumerate(descriptions))
+        futures = {}
+        deadlines = {}
+        
+        def submit_next():
+            # Each app's budget starts when it is submitted, not when the batch arrives
+            for index, description in items:
+                deadlines[index] = create_deadline(timeout)
+                futures[generation_executor.submit(generate_one, description, deadlines[index])] = index
+                return
+        
+        # Only as many apps in the shared pool as batch work may hold scheduler slots,
+        # so a large batch never queues ahead of other requests' stages
+        for _ in range(generation_scheduler.batch_max_slots):
+            submit_next()
+        succeeded = 0
+        
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Error in batch item {index}: {str(e)}")
+                        result = {'success': False, 'error': str(e)}
+                    
+                    if result.get('success'):
+                        succeeded += 1
+                    submit_next()
+                    yield {'index': index, 'description': descriptions[index], 'result': result}
+            
+            yield {
+                'done': True,
+                'total': len(descriptions),
+                'succeeded': succeeded,
+                'failed': len(descriptions) - succeeded,
+                'elapsed_seconds': round(time.monotonic() - started, 2)
+            }
+        finally:
+            # Closed early: drop queued apps and cancel the running ones
+            for future, index in futures.items():
+                if not future.cancel():
+                    deadlines[index].cancel('client disconnected')
+    
+    return ndjson_response(results())
+
 @cto_bp.route('/analyze-code', methods=['POST'])
+@exempt
 def analyze_code_quality():
     """
     Analyze Flutter code quality with CTO-level standards
@@ -156,6 +393,7 @@ def analyze_code_quality():
         }), 500
 
 @cto_bp.route('/validate-security', methods=['POST'])
+@exempt
 def validate_security():
     """
     Validate Flutter code security with enterprise standards
@@ -209,6 +447,7 @@ def validate_security():
         }), 500
 
 @cto_bp.route('/optimize-performance', methods=['POST'])
+@exempt
 def optimize_performance():
     """
     Optimize Flutter code performance with CTO-level standards
@@ -265,6 +504,7 @@ def optimize_performance():
         }), 500
 
 @cto_bp.route('/templates', methods=['GET'])
+@exempt
 def get_templates():
     """
     Get available Flutter templates with CTO-level architecture
@@ -369,6 +609,7 @@ def get_templates():
         }), 500
 
 @cto_bp.route('/docs', methods=['GET'])
+@exempt
 def get_documentation():
     """
     Get API documentation
@@ -387,7 +628,39 @@ def get_documentation():
                         'description': 'App description (required)',
                         'app_type': 'Application type (optional)',
                         'requirements': 'App requirements (optional)',
-                        'preferences': 'Development preferences (optional)'
+                        'preferences': 'Development preferences (optional)',
+                        'async': 'Queue as a job and return its id with 202 (optional)'
+                    }
+                },
+                {
+                    'path': '/api/jobs/<job_id>',
+                    'method': 'GET',
+                    'description': 'Get the status, progress and result of a queued generation job'
+                },
+                {
+                    'path': '/api/jobs/<job_id>/events',
+                    'method': 'GET',
+                    'description': 'Follow the progress events of a queued generation job as Server-Sent Events'
+                },
+                {
+                    'path': '/api/cto/generate/stream',
+                    'method': 'POST',
+                    'description': 'Generate Flutter application as a Server-Sent Events stream',
+                    'parameters': {
+                        'description': 'App description (required)',
+                        'app_type': 'Application type (optional)',
+                        'model_name': 'AI model to use (optional)'
+                    }
+                },
+                {
+                    'path': '/api/cto/generate/batch',
+                    'method': 'POST',
+                    'description': 'Generate many Flutter applications, streaming NDJSON results as each finishes',
+                    'parameters': {
+                        'descriptions': 'List of app descriptions (required)',
+                        'app_type': 'Application type for every app (optional)',
+                        'model_name': 'AI model to use (optional)',
+                        'timeout': 'Time budget per app in seconds (optional)'
                     }
                 },
                 {
@@ -9,15 +9,81 @@ from datetime import datetime
 from typing import Dict, Any
 
 from models.fullstack_generator import FullStackGenerator
+from models.deadline import Deadline
+from models.job_queue import job_queue
+from models.checkpoint_store import checkpoint_store
+from routes.streaming import (stream_generation, sse_response, stream_response, requested_stream_format,
+                              request_deadline, request_timeout, request_scheduling)
+from routes.jobs_api import wants_job, submit_job
+from routes.admission import guard_blueprint, exempt
 
 logger = logging.getLogger(__name__)
 
 # Create blueprint
 fullstack_bp = Blueprint('fullstack', __name__)
 
+# Shed generation requests under overload; cheap views are marked @exempt
+guard_blueprint(fullstack_bp)
+
 # Initialize full stack generator
 fullstack_generator = FullStackGenerator()
 
+VALID_BACKENDS = ['flask']
+VALID_DATABASES = ['sqlite', 'postgresql', 'mongodb', 'mysql']
+
+def _validate_stack(backend_type: str, database_type: str):
+    """Return an error message if the backend or database type is not supported"""
+    if backend_type not in VALID_BACKENDS:
+        return f'Invalid backend_type. Must be one of: {VALID_BACKENDS}'
+    if database_type not in VALID_DATABASES:
+        return f'Invalid database_type. Must be one of: {VALID_DATABASES}'
+    return None
+
+def _request_info(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Request metadata added to a successful generation result"""
+    return {
+        'description': data['description'],
+        'app_type': data['app_type'],
+        'backend_type': data['backend_type'],
+        'database_type': data['database_type'],
+        'requirements': data.get('requirements', {}),
+        'preferences': data.get('preferences', {}),
+        'timestamp': datetime.utcnow().isoformat()
+    }
+
+def run_generation_job(payload: Dict[str, Any], on_event=None, deadline: Deadline = None) -> Dict[str, Any]:
+    """Run a /generate request queued as a job"""
+    result = fullstack_generator.generate_fullstack_app(
+        user_request=payload['description'],
+        app_type=payload['app_type'],
+        backend_type=payload['backend_type'],
+        database_type=payload['database_type'],
+        model_name=payload.get('model_name'),
+        on_event=on_event,
+        deadline=deadline,
+        priority=payload.get('priority'),
+        tenant=payload.get('tenant')
+    )
+    if result.get('success'):
+        result['request_info'] = _request_info(payload)
+    return result
+
+def run_resume_job(payload: Dict[str, Any], on_event=None, deadline: Deadline = None) -> Dict[str, Any]:
+    """Run a resume of a generation run queued as a job"""
+    return fullstack_generator.resume_fullstack_app(
+        payload['run_id'],
+        on_event=on_event,
+        deadline=deadline,
+        priority=payload.get('priority'),
+        tenant=payload.get('tenant')
+    )
+
+job_queue.register('fullstack.generate', run_generation_job)
+job_queue.register('fullstack.resume', run_resume_job)
+
+# Events of a streamed /generate response; stage and token progress is left to /generate/stream
+COMPONENT_EVENTS = ('project_structure', 'component', 'component_error', 'result', 'error', 'ping')
+
 @fullstack_bp.route('/generate', methods=['POST'])
 def generate_fullstack_app():
     """
@@ -27,9 +93,14 @@ def generate_fullstack_app():
     {
         "description": "User's app description",
         "app_type": "ecommerce|social|productivity|general",
-        "backend_type": "flask|express|fastapi",
+        "backend_type": "flask",
         "database_type": "sqlite|postgresql|mongodb",
         "model_name": "gpt-4o-mini",  // optional
+        "timeout": 600,  // optional time budget in seconds
+        "async": false,  // optional; true queues a job and answers 202 with its id
+        "stream": "ndjson|sse",  // optional; also Accept: application/x-ndjson or text/event-stream
+        "priority": "interactive|standard|batch",  // optional; default interactive (standard for jobs)
+        "tenant": "team-a",  // optional; also X-Tenant-ID, default client address
         "requirements": {
             "features": ["user_auth", "file_upload", "real_time"],
             "platforms": ["android", "ios", "web"],
@@ -43,6 +114,12 @@ def generate_fullstack_app():
             "deployment": "docker|kubernetes|serverless"
         }
     }
+    
+    With "stream", the response streams a 'project_structure' event first,
+    then a 'component' event with each component's file map as soon as that
+    component is done, and a final 'result' event. A component that fails
+    gets a 'component_error' event instead (as do the components that needed
+    its output) without hiding the ones that succeeded.
     """
     try:
         data = request.get_json()
@@ -71,54 +148,82 @@ def generate_fullstack_app():
                 'timestamp': datetime.utcnow().isoformat()
             }), 400
         
-        # Validate backend type
-        valid_backends = ['flask', 'express', 'fastapi']
-        if backend_type not in valid_backends:
+        # Validate backend and database types
+        validation_error = _validate_stack(backend_type, database_type)
+        if validation_error:
             return jsonify({
                 'success': False,
-                'error': f'Invalid backend_type. Must be one of: {valid_backends}',
+                'error': validation_error,
                 'timestamp': datetime.utcnow().isoformat()
             }), 400
         
-        # Validate database type
-        valid_databases = ['sqlite', 'postgresql', 'mongodb', 'mysql']
-        if database_type not in valid_databases:
+        try:
+            deadline = request_deadline(data)
+            priority, tenant = request_scheduling(data, 'standard' if wants_job(data) else 'interactive')
+            stream = requested_stream_format(data)
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'error': f'Invalid database_type. Must be one of: {valid_databases}',
+                'error': str(e),
                 'timestamp': datetime.utcnow().isoformat()
             }), 400
         
+        request_data = {
+            'description': description,
+            'app_type': app_type,
+            'backend_type': backend_type,
+            'database_type': database_type,
+            'model_name': model_name,
+            'requirements': requirements,
+            'preferences': preferences,
+            'priority': priority,
+            'tenant': tenant
+        }
+        
+        if wants_job(data):
+            return submit_job('fullstack.generate', {**request_data, 'timeout': request_timeout(data)})
+        
         logger.info(f"Generating full-stack {app_type} app")
         logger.info(f"Backend: {backend_type}, Database: {database_type}")
         logger.info(f"Description: {description[:100]}...")
         
+        if stream:
+            events = stream_generation(
+                fullstack_generator.generate_fullstack_app,
+                deadline=deadline,
+                user_request=description,
+                app_type=app_type,
+                backend_type=backend_type,
+                database_type=database_type,
+                model_name=model_name,
+                priority=priority,
+                tenant=tenant,
+                allow_partial=True
+            )
+            return stream_response(((event, event_data) for event, event_data in events
+                                    if event in COMPONENT_EVENTS), stream)
+        
         # Generate the full-stack application
         result = fullstack_generator.generate_fullstack_app(
             user_request=description,
             app_type=app_type,
             backend_type=backend_type,
             database_type=database_type,
-            model_name=model_name
+            model_name=model_name,
+            deadline=deadline,
+            priority=priority,
+            tenant=tenant
         )
         
         if result.get('success'):
             # Add request metadata to response
-            result['request_info'] = {
-                'description': description,
-                'app_type': app_type,
-                'backend_type': backend_type,
-                'database_type': database_type,
-                'requirements': requirements,
-                'preferences': preferences,
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            result['request_info'] = _request_info(request_data)
             
             logger.info(f"Successfully generated full-stack app: {result['project']['name']}")
             return jsonify(result)
         else:
             logger.error(f"Failed to generate full-stack app: {result.get('error')}")
-            return jsonify(result), 500
+            return jsonify(result), 504 if result.get('deadline_exceeded') else 500
             
     except Exception as e:
         logger.error(f"Error in generate_fullstack_app: {str(e)}")
@@ -128,7 +233,193 @@ def generate_fullstack_app():
             'timestamp': datetime.utcnow().isoformat()
         }), 500
 
+@fullstack_bp.route('/generate/stream', methods=['POST'])
+def generate_fullstack_app_stream():
+    """
+    Generate a full-stack application and stream progress as Server-Sent Events
+    
+    Accepts the same JSON payload as /generate. Emits 'stage' and 'token'
+    events while the model writes, 'project_structure' once the requirements
+    are analyzed, a 'component' event with the file map of every finished
+    component (or 'component_error' for one that failed), then a 'result'
+    event with the complete response. Remaining stages are cancelled when
+    the client disconnects.
+    """
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({
+            'success': False,
+            'error': 'No JSON data provided',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 400
+    
+    description = data.get('description', '')
+    app_type = data.get('app_type', 'general')
+    backend_type = data.get('backend_type', 'flask')
+    database_type = data.get('database_type', 'sqlite')
+    model_name = data.get('model_name')
+    
+    if not description:
+        return jsonify({
+            'success': False,
+            'error': 'App description is required',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 400
+    
+    validation_error = _validate_stack(backend_type, database_type)
+    if validation_error:
+        return jsonify({
+            'success': False,
+            'error': validation_error,
+            'timestamp': datetime.utcnow().isoformat()
+        }), 400
+    
+    try:
+        deadline = request_deadline(data)
+        priority, tenant = request_scheduling(data)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 400
+    
+    logger.info(f"Streaming full-stack {app_type} app generation")
+    
+    events = stream_generation(
+        fullstack_generator.generate_fullstack_app,
+        deadline=deadline,
+        user_request=description,
+        app_type=app_type,
+        backend_type=backend_type,
+        database_type=database_type,
+        model_name=model_name,
+        priority=priority,
+        tenant=tenant,
+        allow_partial=True
+    )
+    return sse_response(events)
+
+@fullstack_bp.route('/runs/<run_id>', methods=['GET'])
+@exempt
+def get_generation_run(run_id: str):
+    """
+    Get a generation run: its inputs, status, and which stages are checkpointed or failed
+    """
+    try:
+        run = checkpoint_store.get_run(run_id) if checkpoint_store.enabled else None
+        if run is None:
+            return jsonify({
+                'success': False,
+                'error': f'Generation run {run_id} not found',
+                'timestamp': datetime.utcnow().isoformat()
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'run': {
+                'run_id': run['id'],
+                'status': run['status'],
+                'attempts': run['attempts'],
+                'inputs': run['inputs'],
+                'completed_stages': run['completed_stages'],
+                'failed_stages': run['failed_stages'],
+                'error': run['error'],
+                'created_at': datetime.utcfromtimestamp(run['created_at']).isoformat(),
+                'updated_at': datetime.utcfromtimestamp(run['updated_at']).isoformat()
+            },
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f"Error getting generation run: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+@fullstack_bp.route('/runs/<run_id>/resume', methods=['POST'])
+def resume_generation_run(run_id: str):
+    """
+    Resume a failed or interrupted full-stack generation
+    
+    Stages checkpointed by the earlier attempts are reused, so only the
+    failed and missing stages are generated again, with the original
+    request's inputs. The response is the same as that of /generate.
+    
+    Optional JSON payload:
+    {
+        "timeout": 600,  // time budget in seconds
+        "async": false,  // true queues a job and answers 202 with its id
+        "stream": "ndjson|sse",  // stream components as in /generate
+        "priority": "interactive|standard|batch",
+        "tenant": "team-a"
+    }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        if not checkpoint_store.enabled or checkpoint_store.get_run(run_id) is None:
+            return jsonify({
+                'success': False,
+                'error': f'Generation run {run_id} not found',
+                'timestamp': datetime.utcnow().isoformat()
+            }), 404
+        
+        try:
+            deadline = request_deadline(data)
+            priority, tenant = request_scheduling(data, 'standard' if wants_job(data) else 'interactive')
+            stream = requested_stream_format(data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'timestamp': datetime.utcnow().isoformat()
+            }), 400
+        
+        if wants_job(data):
+            return submit_job('fullstack.resume', {
+                'run_id': run_id,
+                'timeout': request_timeout(data),
+                'priority': priority,
+                'tenant': tenant
+            })
+        
+        if stream:
+            events = stream_generation(
+                fullstack_generator.resume_fullstack_app,
+                deadline=deadline,
+                run_id=run_id,
+                priority=priority,
+                tenant=tenant,
+                allow_partial=True
+            )
+            return stream_response(((event, event_data) for event, event_data in events
+                                    if event in COMPONENT_EVENTS), stream)
+        
+        result = fullstack_generator.resume_fullstack_app(run_id, deadline=deadline,
+                                                          priority=priority, tenant=tenant)
+        if result.get('success'):
+            logger.info(f"Resumed generation run {run_id}: {result['project']['name']}")
+            return jsonify(result)
+        
+        logger.error(f"Failed to resume generation run {run_id}: {result.get('error')}")
+        if result.get('not_found'):
+            return jsonify(result), 404
+        return jsonify(result), 504 if result.get('deadline_exceeded') else 500
+    
+    except Exception as e:
+        logger.error(f"Error in resume_generation_run: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
 @fullstack_bp.route('/templates', methods=['GET'])
+@exempt
 def get_fullstack_templates():
     """
     Get available full-stack application templates
@@ -150,7 +441,7 @@ def get_fullstack_templates():
                 ],
                 'tech_stack': {
                     'frontend': 'Flutter',
-                    'backend': 'Flask/Express',
+                    'backend': 'Flask',
                     'database': 'PostgreSQL',
                     'payment': 'Stripe/PayPal',
                     'storage': 'AWS S3/CloudFlare'
@@ -172,7 +463,7 @@ def get_fullstack_templates():
                 ],
                 'tech_stack': {
                     'frontend': 'Flutter',
-                    'backend': 'Flask/Express',
+                    'backend': 'Flask',
                     'database': 'MongoDB',
                     'real_time': 'WebSockets',
                     'storage': 'AWS S3'
@@ -238,7 +529,7 @@ def get_fullstack_templates():
                 ],
                 'tech_stack': {
                     'frontend': 'Flutter',
-                    'backend': 'Flask/Express',
+                    'backend': 'Flask',
                     'database': 'PostgreSQL',
                     'video': 'Video streaming',
                     'storage': 'CDN'
@@ -285,6 +576,7 @@ def get_fullstack_templates():
         }), 500
 
 @fullstack_bp.route('/estimate', methods=['POST'])
+@exempt
 def estimate_project():
     """
     Estimate project complexity and development time
@@ -414,6 +706,7 @@ def estimate_project():
         }), 500
 
 @fullstack_bp.route('/health', methods=['GET'])
+@exempt
 def fullstack_health_check():
     """
     Health check for full-stack generation service
@@ -425,14 +718,15 @@ def fullstack_health_check():
             'status': 'healthy',
             'features': [
                 'Flutter frontend generation',
-                'Backend API generation (Flask/Express/FastAPI)',
+                'Backend API generation (Flask)',
                 'Database schema generation',
                 'Authentication system',
                 'Deployment configurations',
                 'Multi-model AI support'
             ],
-            'supported_backends': ['flask', 'express', 'fastapi'],
+            'supported_backends': VALID_BACKENDS,
             'supported_databases': ['sqlite', 'postgresql', 'mongodb', 'mysql'],
+            'checkpoints': checkpoint_store.get_stats(),
             'timestamp': datetime.utcnow().isoformat()
         })
         
@@ -0,0 +1,194 @@
+"""
+Job API Routes
+Status, progress events and cancellation of queued generation jobs
+"""
+
+from flask import Blueprint, request, jsonify, url_for
+import time
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from models.job_queue import job_queue, TERMINAL_STATUSES
+from models.scheduler import generation_scheduler
+from models.admission_control import admission_controller
+from routes.streaming import sse_response, KEEPALIVE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+jobs_bp = Blueprint('jobs', __name__)
+
+# Seconds between store polls while following a job's events
+EVENT_POLL_INTERVAL = 0.5
+
+def wants_job(data: Optional[Dict[str, Any]] = None) -> bool:
+    """Whether a generation request asks to run as a job ("async": true or Prefer: respond-async)"""
+    if (data or {}).get('async'):
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+def serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job"""
+    return {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'created_at': _isoformat(job['created_at']),
+        'started_at': _isoformat(job['started_at']),
+        'finished_at': _isoformat(job['finished_at']),
+        'last_event': job.get('last_event'),
+        'result': job['result'],
+        'error': job['error'],
+        'links': {
+            'self': url_for('jobs.get_job', job_id=job['id']),
+            'events': url_for('jobs.get_job_events', job_id=job['id'])
+        }
+    }
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.utcfromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+def submit_job(kind: str, payload: Dict[str, Any]):
+    """Queue a generation job and answer 202 Accepted with its status URL"""
+    job = job_queue.submit(kind, payload)
+    response = jsonify({
+        'success': True,
+        'job': serialize_job(job),
+        'timestamp': datetime.utcnow().isoformat()
+    })
+    response.status_code = 202
+    response.headers['Location'] = url_for('jobs.get_job', job_id=job['id'])
+    return response
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    """
+    Get a job's status, latest progress event and, once finished, its result
+    """
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': f'Job {job_id} not found',
+                'timestamp': datetime.utcnow().isoformat()
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'job': serialize_job(job),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f"Error getting job {job_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+@jobs_bp.route('/<job_id>/events', methods=['GET'])
+def get_job_events(job_id: str):
+    """
+    Follow a job's progress events as Server-Sent Events
+    
+    Replays the stored events (stage, file, project_structure, component),
+    then streams new ones until the job finishes, ending with a 'result'
+    event carrying the job. Every event has an id; reconnecting with the
+    Last-Event-ID header (or ?after=<id>) resumes after it. Token events are
+    not stored; use the /generate/stream endpoints for token-level output.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f'Job {job_id} not found',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 404
+    
+    try:
+        after = int(request.args.get('after') or request.headers.get('Last-Event-ID') or 0)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'after must be an event id',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 400
+    
+    def events():
+        last_seq = after
+        last_sent = time.monotonic()
+        while True:
+            # Status first: a finished job has stored all of its events
+            job = job_queue.get(job_id)
+            for seq, event, data in job_queue.store.events(job_id, last_seq):
+                last_seq = seq
+                last_sent = time.monotonic()
+                yield event, data, seq
+            
+            if job is None or job['status'] in TERMINAL_STATUSES:
+                yield 'result', serialize_job(job) if job else {'job_id': job_id, 'status': 'deleted'}
+                return
+            
+            if time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+                last_sent = time.monotonic()
+                yield 'ping', {'timestamp': datetime.utcnow().isoformat(), 'status': job['status']}
+            time.sleep(EVENT_POLL_INTERVAL)
+    
+    return sse_response(events())
+
+@jobs_bp.route('/<job_id>', methods=['DELETE'])
+def cancel_job(job_id: str):
+    """
+    Cancel a job: queued jobs never run, running jobs stop at the next stage or provider call
+    """
+    try:
+        status = job_queue.cancel(job_id)
+        if status is None:
+            return jsonify({
+                'success': False,
+                'error': f'Job {job_id} not found',
+                'timestamp': datetime.utcnow().isoformat()
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': status,
+            'cancel_requested': status not in TERMINAL_STATUSES,
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f"Error cancelling job {job_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+@jobs_bp.route('/stats', methods=['GET'])
+def get_job_stats():
+    """
+    Get job counts per status, worker settings, generation slot usage with
+    queue-wait percentiles per priority class, and admission control counters
+    """
+    try:
+        return jsonify({
+            'success': True,
+            'queue': job_queue.get_stats(),
+            'scheduler': generation_scheduler.get_stats(),
+            'admission': admission_controller.get_stats(),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f"Error getting job stats: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
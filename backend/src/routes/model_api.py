@@ -9,6 +9,7 @@ from datetime import datetime
 from typing import Dict, Any
 
 from models.model_manager import model_manager
+from models.prompt_registry import prompt_registry
 
 logger = logging.getLogger(__name__)
 
@@ -129,7 +130,8 @@ def test_model():
     Expected JSON payload:
     {
         "model_name": "gpt-4o-mini",  // optional
-        "prompt": "Hello, how are you?"
+        "prompt": "Hello, how are you?",
+        "use_cache": true  // optional, false bypasses the response cache
     }
     """
     try:
@@ -147,7 +149,11 @@ def test_model():
         
         # Test the model
         start_time = datetime.utcnow()
-        response = model_manager.generate_completion(prompt, model_name)
+        response = model_manager.generate_completion(
+            prompt,
+            model_name,
+            use_cache=bool(data.get('use_cache', True))
+        )
         end_time = datetime.utcnow()
         
         response_time = (end_time - start_time).total_seconds()
@@ -172,13 +178,14 @@ def test_model():
 @model_bp.route('/configure', methods=['POST'])
 def configure_model():
     """
-    Configure model parameters (temperature, max_tokens, etc.)
+    Configure model parameters (temperature, max_tokens)
     
     Expected JSON payload:
     {
         "model_name": "gpt-4o-mini",
         "temperature": 0.7,
-        "max_tokens": 4000
+        "max_tokens": 4000,
+        "fallback_model": "gpt-4"  // optional, used while the model's circuit breaker is open
     }
     """
     try:
@@ -202,18 +209,27 @@ def configure_model():
                 'timestamp': datetime.utcnow().isoformat()
             }), 404
         
-        # Update model configuration
-        config = model_manager.models[model_name]
+        fallback_model = data.get('fallback_model')
+        if fallback_model and fallback_model not in model_manager.models:
+            return jsonify({
+                'success': False,
+                'error': f'Fallback model not found: {fallback_model}',
+                'timestamp': datetime.utcnow().isoformat()
+            }), 400
         
-        if 'temperature' in data:
-            config.temperature = float(data['temperature'])
-        if 'max_tokens' in data:
-            config.max_tokens = int(data['max_tokens'])
+        # Update model configuration (the pooled client is rebuilt on next use)
+        params = {key: value for key, value in data.items() if key not in ('model_name', 'fallback_model')}
+        try:
+            model_manager.configure_model(model_name, **params)
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'timestamp': datetime.utcnow().isoformat()
+            }), 400
         
-        # Update extra parameters
-        for key, value in data.items():
-            if key not in ['model_name', 'temperature', 'max_tokens']:
-                config.extra_params[key] = value
+        if 'fallback_model' in data:
+            model_manager.set_fallback_model(model_name, fallback_model)
         
         return jsonify({
             'success': True,
@@ -234,43 +250,45 @@ def configure_model():
 def model_health_check():
     """
     Check health status of all configured models
+    
+    Served from the background prober's latest snapshot without calling any
+    provider. Pass ?refresh=true to run a probe round first.
     """
     try:
-        models = model_manager.get_available_models()
-        health_status = []
+        prober = model_manager.health_prober
+        if request.args.get('refresh', '').lower() in ('1', 'true', 'yes'):
+            snapshot = prober.probe_now()
+        else:
+            snapshot = prober.get_snapshot()
         
-        for model in models:
-            try:
-                # Test with a simple prompt
-                test_prompt = "Hello"
-                response = model_manager.generate_completion(
-                    test_prompt, 
-                    model['name']
-                )
-                
-                health_status.append({
-                    'model': model['name'],
-                    'status': 'healthy',
-                    'provider': model['provider'],
-                    'response_length': len(response) if response else 0
-                })
-                
-            except Exception as e:
-                health_status.append({
-                    'model': model['name'],
-                    'status': 'unhealthy',
-                    'provider': model['provider'],
-                    'error': str(e)
-                })
+        health_status = [
+            snapshot['models'].get(model['name'], {
+                'model': model['name'],
+                'status': 'unknown',
+                'provider': model['provider']
+            })
+            for model in model_manager.get_available_models()
+        ]
         
         healthy_count = sum(1 for status in health_status if status['status'] == 'healthy')
+        unknown_count = sum(1 for status in health_status if status['status'] == 'unknown')
+        
+        if healthy_count > 0:
+            overall_status = 'healthy'
+        elif unknown_count > 0:
+            overall_status = 'unknown'
+        else:
+            overall_status = 'unhealthy'
         
         return jsonify({
             'success': True,
-            'overall_status': 'healthy' if healthy_count > 0 else 'unhealthy',
+            'overall_status': overall_status,
             'healthy_models': healthy_count,
             'total_models': len(health_status),
             'models': health_status,
+            'probed_at': snapshot['probed_at'],
+            'probe_interval_seconds': prober.interval,
+            'prober_running': prober.running,
             'timestamp': datetime.utcnow().isoformat()
         })
         
@@ -282,3 +300,103 @@ def model_health_check():
             'timestamp': datetime.utcnow().isoformat()
         }), 500
 
+@model_bp.route('/cache', methods=['GET'])
+def get_cache_stats():
+    """
+    Get response cache hit/miss counters and tier sizes, cassette record/replay
+    counters and provider prompt cache token counts
+    """
+    try:
+        return jsonify({
+            'success': True,
+            'cache': model_manager.response_cache.get_stats(),
+            'cassette': model_manager.cassette.get_stats(),
+            'prompt_cache': model_manager.get_prompt_cache_stats(),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting cache stats: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+@model_bp.route('/cache', methods=['DELETE'])
+def clear_cache():
+    """
+    Clear both tiers of the response cache
+    """
+    try:
+        model_manager.response_cache.clear()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Response cache cleared',
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f"Error clearing cache: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+@model_bp.route('/routing', methods=['GET'])
+def get_routing_stats():
+    """
+    Get live latency statistics and policy groups used by the "auto" model
+    """
+    try:
+        return jsonify({
+            'success': True,
+            'groups': {
+                'default': model_manager.get_routing_candidates(),
+                **model_manager.router.groups
+            },
+            'models': model_manager.router.get_stats(),
+            'rate_limits': {
+                provider.value: limiter.get_stats()
+                for provider, limiter in model_manager.rate_limiters.items()
+            },
+            'hedging': {
+                **model_manager.hedge_stats,
+                'percentile': model_manager.hedge_percentile,
+                'default_delay_seconds': model_manager.hedge_default_delay,
+                'hedge_model': model_manager.hedge_model
+            },
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f"Error getting routing stats: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+@model_bp.route('/prompts', methods=['GET'])
+def get_prompt_stats():
+    """
+    Get registered prompt templates with render counts and token lengths,
+    plus context-window budgeting counters
+    """
+    try:
+        return jsonify({
+            'success': True,
+            **prompt_registry.get_stats(),
+            'token_budget': model_manager.token_budget.get_stats(),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f"Error getting prompt stats: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
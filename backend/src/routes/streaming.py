@@ -0,0 +1,171 @@
+"""
+Streaming Helpers
+Server-Sent Events support for long-running generation endpoints
+"""
+
+from flask import Response, request, stream_with_context
+import json
+import logging
+import queue
+import threading
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterator, Optional, Tuple
+
+from models.deadline import Deadline, create_deadline
+from models.scheduler import priority_rank
+
+logger = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments, below common 30 s proxy idle timeouts
+KEEPALIVE_INTERVAL = 15
+
+# Streamed response formats and their content types
+STREAM_FORMATS = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+
+_DONE = object()
+
+def sse_event(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    """Format a single Server-Sent Event, with an id clients can resume from if given"""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+def request_timeout(data: Optional[Dict[str, Any]] = None) -> Optional[float]:
+    """
+    Get the time budget a generation request asks for
+    
+    Read from the JSON "timeout" field or the X-Request-Timeout header
+    (seconds); None if neither is given. Raises ValueError for a malformed value.
+    """
+    timeout = (data or {}).get('timeout', request.headers.get('X-Request-Timeout'))
+    if timeout is None:
+        return None
+    
+    try:
+        timeout = float(timeout)
+    except (TypeError, ValueError):
+        raise ValueError('timeout must be a number of seconds')
+    if timeout <= 0:
+        raise ValueError('timeout must be positive')
+    return timeout
+
+def request_deadline(data: Optional[Dict[str, Any]] = None) -> Deadline:
+    """Create the deadline for a generation request (GENERATION_TIMEOUT by default)"""
+    return create_deadline(request_timeout(data))
+
+def request_scheduling(data: Optional[Dict[str, Any]] = None,
+                       default_priority: str = 'interactive') -> Tuple[str, str]:
+    """
+    Get the scheduling class and tenant of a generation request
+    
+    The priority class comes from the JSON "priority" field or the X-Priority
+    header, the tenant from the "tenant" field or the X-Tenant-ID header (the
+    client address if neither is given). Raises ValueError for an unknown
+    priority class.
+    """
+    data = data or {}
+    priority = data.get('priority') or request.headers.get('X-Priority') or default_priority
+    priority_rank(priority)
+    tenant = data.get('tenant') or request.headers.get('X-Tenant-ID') or request.remote_addr or 'default'
+    return priority, str(tenant)
+
+def requested_stream_format(data: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Get the streamed response format a generation request asks for
+    
+    Read from the JSON "stream" field ("ndjson" or "sse") or, failing that,
+    an Accept header of application/x-ndjson or text/event-stream; None for a
+    plain JSON response. Raises ValueError for an unknown format.
+    """
+    stream = (data or {}).get('stream')
+    if stream:
+        if stream not in STREAM_FORMATS:
+            raise ValueError(f"stream must be one of: {', '.join(STREAM_FORMATS)}")
+        return stream
+    
+    accept = request.accept_mimetypes
+    for stream, mimetype in STREAM_FORMATS.items():
+        if accept.best == mimetype:
+            return stream
+    return None
+
+def stream_generation(target: Callable[..., Dict[str, Any]], deadline: Optional[Deadline] = None,
+                      **kwargs) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Run a generator method in a background thread and yield its events
+    
+    The target is called with an on_event callback plus kwargs. Every event it
+    emits is yielded as (event, data), followed by a final 'result' event with
+    the return value, or an 'error' event if it raised. A 'ping' event is
+    yielded whenever nothing was emitted for KEEPALIVE_INTERVAL seconds.
+    If a deadline is given it is passed to the target and cancelled when the
+    consumer stops early, i.e. when the client disconnects.
+    """
+    events: queue.Queue = queue.Queue()
+    finished = threading.Event()
+    if deadline is not None:
+        kwargs['deadline'] = deadline
+    
+    def run():
+        try:
+            result = target(on_event=lambda event, data: events.put((event, data)), **kwargs)
+            events.put(('result', result))
+        except Exception as e:
+            logger.error(f"Error in streamed generation: {str(e)}")
+            events.put(('error', {'success': False, 'error': str(e)}))
+        finally:
+            finished.set()
+            events.put(_DONE)
+    
+    threading.Thread(target=run, daemon=True).start()
+    
+    try:
+        while True:
+            try:
+                item = events.get(timeout=KEEPALIVE_INTERVAL)
+            except queue.Empty:
+                yield 'ping', {'timestamp': datetime.utcnow().isoformat()}
+                continue
+            
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        # Closed before the target finished: nobody is listening any more
+        if deadline is not None and not finished.is_set():
+            deadline.cancel('client disconnected')
+
+def sse_response(events: Iterator[Tuple]) -> Response:
+    """Wrap (event, data) pairs, or (event, data, id) triples, in a text/event-stream response"""
+    def generate():
+        for item in events:
+            yield sse_event(*item)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+def ndjson_response(items: Iterator[Dict[str, Any]]) -> Response:
+    """Wrap dicts in a newline-delimited JSON stream, one object per line"""
+    def generate():
+        for item in items:
+            yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+def stream_response(events: Iterator[Tuple[str, Dict[str, Any]]], stream: str) -> Response:
+    """Send (event, data) pairs as Server-Sent Events or as {"event", "data"} NDJSON lines"""
+    if stream == 'sse':
+        return sse_response(events)
+    return ndjson_response({'event': event, 'data': data} for event, data in events)
@@ -0,0 +1,46 @@
+"""
+Flutter AI Platform - Generation Worker
+Runs queued generation jobs in a separate process from the web server
+"""
+
+import os
+import sys
+import signal
+import logging
+import argparse
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Importing the routes registers the job handlers
+import routes.cto_api  # noqa: F401
+import routes.fullstack_api  # noqa: F401
+from models.job_queue import job_queue
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Run generation workers until interrupted"""
+    parser = argparse.ArgumentParser(description='Run queued generation jobs')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('JOB_WORKER_THREADS', '4')),
+                        help='Jobs run concurrently by this process (default JOB_WORKER_THREADS or 4)')
+    args = parser.parse_args()
+    
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+    
+    job_queue.workers = args.workers
+    job_queue.start()
+    logger.info(f"Generation worker running {args.workers} jobs at a time")
+    
+    stopping.wait()
+    logger.info("Stopping generation worker; waiting for running jobs")
+    job_queue.stop()
+
+if __name__ == '__main__':
+    main()